@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, send_file
-from flask import Flask, request, jsonify, send_file, abort
-from werkzeug.utils import safe_join
+from flask import Flask, request, jsonify, send_file, abort, Request, Response, stream_with_context, has_request_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
@@ -8,46 +7,358 @@ import re
 import traceback
 from pathlib import Path
 from elevenlabs.client import ElevenLabs
+from PIL import Image, ImageOps
 from dotenv import load_dotenv
-import uuid
 from google import genai
 from google.genai import types
+import httpx
+import requests
+from pydantic import BaseModel
 from datetime import datetime
-import pickle
+import contextvars
+import gzip
 import hashlib
+import json
 import math
-from collections import Counter
+import mimetypes
+import io
+import numpy as np
+import heapq
+import mmap
+import random
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from functools import lru_cache, wraps
+from itertools import combinations, count
 from uuid import uuid4
 
 load_dotenv()
+TRUTHY = ("1", "true", "yes", "on")
+
+
+def env_flag(name, default=""):
+    """Boolean setting from the environment; TRUTHY spellings are on, anything else off."""
+    return os.getenv(name, default).strip().lower() in TRUTHY
+
+
 # Configure APIs (set env vars)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVEN_VOICE_ID = os.getenv("ELEVEN_VOICE_ID", "TRnaQb7q41oL7sV0w6Bu")
+# Optional endpoint overrides (proxies, local stand-ins for load tests)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL")
 
 if not GEMINI_API_KEY or not ELEVENLABS_API_KEY:
     raise RuntimeError("Please set GEMINI_API_KEY and ELEVENLABS_API_KEY in .env")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+client = genai.Client(api_key=GEMINI_API_KEY, http_options={"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None)
 MODEL_NAME = "gemini-2.5-flash"
+GEMINI_ERROR_TEXT = "Sorry, I couldn't process that request."
+
+# Gemini response cache: in-memory LRU tier plus an optional on-disk tier (set LLM_CACHE_DIR)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_DIR_MAX_BYTES = int(os.getenv("LLM_CACHE_DIR_MAX_BYTES", str(256 * 1024 * 1024)))  # disk tier quota
+LLM_CACHE_SWEEP_SECONDS = int(os.getenv("LLM_CACHE_SWEEP_SECONDS", "300"))  # disk tier sweep interval
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", "3600"))  # seconds, 0 disables
+LLM_CACHE_TTLS = {  # per-endpoint TTLs (Flask endpoint name -> seconds, 0 = never cache)
+    "ask": 600,
+    "ask_doc": 3600,
+    "writing_assistant": 24 * 3600,
+    "writing_assistant_spelling": 24 * 3600,
+    "upload_pdf": 7 * 24 * 3600,
+    "upload_pdf_notes": 7 * 24 * 3600,
+    "verify_object": 7 * 24 * 3600,
+}
 
 # configure ElevenLabs
-eleven = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+eleven = ElevenLabs(api_key=ELEVENLABS_API_KEY, base_url=ELEVENLABS_BASE_URL)
 ELEVEN_OUTPUT_FORMAT = "mp3_44100_128"  # valid output format
+ELEVEN_MODEL_ID = "eleven_multilingual_v2"
+
+# Content-addressed TTS cache: tts_<hash>.mp3 files kept by the storage manager (below)
+TTS_CACHE_LOCK = threading.Lock()
+TTS_CACHE_STATS = {"hits": 0, "misses": 0, "joined": 0}
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TTS_CACHE_MAX_FILES = int(os.getenv("TTS_CACHE_MAX_FILES", "5000"))
+TTS_STREAM_CHUNK = 16 * 1024  # replay chunk size for cached files
+AUDIO_MAX_AGE = 365 * 24 * 3600  # tts_<hash>.mp3 never changes under its name: browsers may keep it for good
+AUDIO_ETAG_MEMO = 4096  # content hashes remembered per (name, size, mtime)
+SENTENCE_MIN_CHARS = 20  # shortest sentence sent to TTS on its own in pipelined mode
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", "4"))  # per-sentence syntheses in flight for pipelined /api/ask
+SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+# Syntheses handed out by filename but not started yet are <filename>.pending records in storage (every
+# worker sees them); the first GET /api/audio/<filename> streams them, later ones follow its .part file
+PENDING_TTS_TTL = 3600  # seconds a reserved filename stays playable
+TTS_FOLLOW_POLL = 0.05  # seconds between reads of another request's in-progress synthesis
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))  # seconds a coalesced caller waits for the shared call
+
+# Outbound scheduler: per-vendor concurrency, calls/second (0 = unlimited) and retry policy
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "16"))
+GEMINI_RATE = float(os.getenv("GEMINI_RATE", "10"))
+ELEVEN_CONCURRENCY = int(os.getenv("ELEVEN_CONCURRENCY", "4"))  # ElevenLabs plans cap concurrent requests
+ELEVEN_RATE = float(os.getenv("ELEVEN_RATE", "0"))
+OUTBOUND_RETRIES = int(os.getenv("OUTBOUND_RETRIES", "4"))
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", "0.5"))  # seconds, doubled per attempt
+OUTBOUND_BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", "8"))
+OUTBOUND_QUEUE_TIMEOUT = float(os.getenv("OUTBOUND_QUEUE_TIMEOUT", "30"))  # seconds a call may wait for a slot
+OUTBOUND_PRIORITIES = {  # Flask endpoint name -> priority (lower is admitted first)
+    "ask": 0,
+    "ask_doc": 0,
+    "verify_object": 0,
+    "tts_endpoint": 0,
+    "serve_audio": 0,
+    "upload_image": 0,
+    "upload_pdf": 2,
+    "upload_pdf_notes": 2,
+}
+OUTBOUND_DEFAULT_PRIORITY = 1
+
+# Uploads are kept in memory up to this size and handed to Gemini straight from the request
+UPLOAD_SPOOL_MAX = int(os.getenv("UPLOAD_SPOOL_MAX", str(16 * 1024 * 1024)))
+UPLOAD_PERSIST = env_flag("UPLOAD_PERSIST")  # also keep a copy in UPLOAD_FOLDER
+
+# Storage manager for UPLOAD_FOLDER: files live in <2 hex of sha1(name)>/<name> shards and a
+# background sweeper evicts them by per-category TTL (since last access), then least recently
+# used first past the category caps and the overall quota (down to STORAGE_LOW_WATER of it)
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+STORAGE_SWEEP_SECONDS = int(os.getenv("STORAGE_SWEEP_SECONDS", "300"))  # full rescan interval
+STORAGE_LOW_WATER = 0.9
+STORAGE_TTLS = {  # category -> seconds since last access, 0 = no expiry
+    "tts": int(os.getenv("STORAGE_TTL_TTS", str(30 * 24 * 3600))),
+    "upload": int(os.getenv("STORAGE_TTL_UPLOAD", str(24 * 3600))),
+    "doc_index": int(os.getenv("STORAGE_TTL_DOC_INDEX", str(7 * 24 * 3600))),
+    "partial": 3600,  # temp files left behind by interrupted writes
+    "pending": PENDING_TTS_TTL,
+}
+STORAGE_CAPS = {"tts": (TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_FILES)}  # category -> (max bytes, max files)
+
+# Handwriting/OCR image normalization: grayscale, cropped to the ink, downscaled, re-encoded
+IMAGE_NORMALIZE = env_flag("IMAGE_NORMALIZE", "true")
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))  # longest side sent to Gemini
+IMAGE_JPEG_QUALITY = 80
+IMAGE_INK_CONTRAST = 40   # ink is at least this much darker (0-255) than the paper
+IMAGE_INK_MARGIN = 0.05   # padding around the ink bounding box, as a fraction of its size
+IMAGE_ANALYSIS_SIDE = 512  # ink detection runs on a copy this size
+
+
+class SpooledRequest(Request):
+    """Spools each multipart file in memory below UPLOAD_SPOOL_MAX, on disk above it."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX)
+
+    def _load_form_data(self):
+        t0 = time.perf_counter()
+        try:
+            super()._load_form_data()
+        finally:
+            observe_stage("parse_upload", time.perf_counter() - t0)
+
+
+# Reading-test audio preprocessing (decodable WAV uploads only; other containers go to Gemini as-is)
+AUDIO_PREPROCESS = env_flag("AUDIO_PREPROCESS", "true")
+AUDIO_TARGET_RATE = int(os.getenv("AUDIO_TARGET_RATE", "16000"))
+AUDIO_TRIM_DB = -40.0     # edge frames this far below the loudest frame count as silence
+AUDIO_NOISE_MARGIN_DB = 10.0  # ...or not this far above the noise floor (10th-percentile frame)
+AUDIO_TRIM_PAD_MS = 150   # silence kept around the speech
+AUDIO_FRAME_MS = 20
+
+# Reading fluency: "llm" (Gemini scores and writes feedback), "hybrid" (local score, Gemini
+# writes feedback) or "local" (no Gemini call). Silent or empty recordings never reach Gemini.
+FLUENCY_MODE = os.getenv("FLUENCY_MODE", "llm")
+FLUENCY_MIN_UPLOAD_BYTES = 1024
+FLUENCY_SILENCE_DB = -50.0     # loudest frame quieter than this (dBFS): nothing was said
+FLUENCY_MIN_SPEECH_S = 0.5     # ...or less voiced audio than this
+FLUENCY_VAD_DB = -30.0         # voiced frames are within this of the loud (95th percentile) speech
+FLUENCY_PAUSE_MS = 250         # unvoiced gap inside the reading that counts as a pause
+FLUENCY_LONG_PAUSE_MS = 1000
+FLUENCY_WINDOW_S = 10          # window for the reading-rate steadiness measure
+FLUENCY_RATE_LOW = 2.5         # comfortable articulation rate band, syllables per second
+FLUENCY_RATE_HIGH = 5.5
+SYLLABLES_PER_WORD = 1.45      # English average, turns syllables into words per minute
+FLUENCY_SILENT_FEEDBACK = "I couldn't hear any reading in that recording. Please check your microphone and try again."
+
+# Spelling-test scores per test session: "sqlite" (WAL database shared by every worker on the host)
+# or "memory" (single-process stand-in for development)
+SCORE_STORE = os.getenv("SCORE_STORE", "sqlite")
+SCORE_DB = os.getenv("SCORE_DB", "/tmp/lexi_scores.sqlite3")
+SCORE_SESSION_TTL = int(os.getenv("SCORE_SESSION_TTL", str(24 * 3600)))  # unfinished sessions are dropped after this
+
+# Typed-text spell-check: "local" (symmetric-delete dictionary lookup) or "llm" (Gemini lists the mistakes).
+# Images always go to Gemini; a local check can ask Gemini to explain the mistakes with explain=true.
+SPELLCHECK_MODE = os.getenv("SPELLCHECK_MODE", "local")
+SPELL_DICTIONARY = Path(os.getenv("SPELL_DICTIONARY", Path(__file__).parent / "data" / "frequency_dictionary_en_82_765.txt.gz"))
+# Delete-key arrays precomputed from that dictionary (scripts/build_spell_index.py), memory-mapped on first use
+SPELL_INDEX_DIR = Path(os.getenv("SPELL_INDEX_DIR", Path(__file__).parent / "data" / "spell_index"))
+SPELL_MAX_EDIT = 2        # suggestions at most this many edits (insert/delete/substitute/swap) away
+SPELL_PREFIX_LENGTH = 7   # deletes are precomputed on word prefixes of this length
+SPELL_MAX_SUGGESTIONS = 3
+SPELL_MEMO_SIZE = 20000   # unknown words remembered with their suggestions
 
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
+app.request_class = SpooledRequest
+CORS(app, supports_credentials=True, expose_headers=["X-Audio-Filename", "X-Trace-Id"], resources={r"/api/*": {"origins": "*"}})
+# Behind Apache/lighttpd (mod_xsendfile) let the front server send audio files itself
+app.config["USE_X_SENDFILE"] = env_flag("AUDIO_X_SENDFILE")
+
+# Request tracing and per-stage latency histograms, exposed in Prometheus text format at /api/metrics
+METRICS_ENABLED = env_flag("METRICS_ENABLED", "true")
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+METRICS_LOCK = threading.Lock()
+STAGE_HISTOGRAMS = {}       # (endpoint, stage) -> [per-bucket counts (last is +Inf), sum of seconds]
+REQUEST_COUNTS = Counter()  # (endpoint, status) -> requests
+UPSTREAM_BYTES = Counter()  # (vendor, "sent" | "received") -> bytes
+# {"id", "endpoint", "start", "stages": [(stage, seconds)]} of the current request; stage and
+# map pool tasks run in copies of the request's context and so add to the same trace
+TRACE = contextvars.ContextVar("trace", default=None)
+TRACE_ID_RE = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+def start_trace(endpoint, trace_id=None):
+    """Begin the trace of a request, keeping a well-formed X-Request-Id from the caller."""
+    if not trace_id or not TRACE_ID_RE.fullmatch(trace_id):
+        trace_id = uuid4().hex[:16]
+    trace = {"id": trace_id, "endpoint": endpoint or "-", "start": time.perf_counter(), "stages": []}
+    TRACE.set(trace)
+    return trace
+
+def observe_stage(stage, seconds):
+    """Add one timing to the current request's trace and to the (endpoint, stage) histogram."""
+    if not METRICS_ENABLED:
+        return
+    trace = TRACE.get()
+    if trace is not None:
+        trace["stages"].append((stage, seconds))
+    key = (trace["endpoint"] if trace else "-", stage)
+    i = bisect_left(METRIC_BUCKETS, seconds)
+    with METRICS_LOCK:
+        hist = STAGE_HISTOGRAMS.get(key)
+        if hist is None:
+            hist = STAGE_HISTOGRAMS[key] = [[0] * (len(METRIC_BUCKETS) + 1), 0.0]
+        hist[0][i] += 1
+        hist[1] += seconds
+
+def timed_stage(stage):
+    """Decorator: observe every call of the function as `stage`."""
+    def decorate(fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe_stage(stage, time.perf_counter() - t0)
+        return timed
+    return decorate
+
+def count_upstream(vendor, sent=0, received=0):
+    if METRICS_ENABLED:
+        with METRICS_LOCK:
+            UPSTREAM_BYTES[(vendor, "sent")] += sent
+            UPSTREAM_BYTES[(vendor, "received")] += received
+
+def server_timing(stages):
+    """Server-Timing header value: total milliseconds per stage, in order of first use."""
+    totals = {}
+    for stage, seconds in stages:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+@app.before_request
+def begin_trace():
+    if METRICS_ENABLED:
+        start_trace(request.endpoint, request.headers.get("X-Request-Id"))
+
+@app.after_request
+def finish_trace(response):
+    """Time to response headers as stage "request" (streamed bodies continue past it)."""
+    trace = TRACE.get() if METRICS_ENABLED else None
+    if trace is None:
+        return response
+    observe_stage("request", time.perf_counter() - trace["start"])
+    with METRICS_LOCK:
+        REQUEST_COUNTS[(trace["endpoint"], response.status_code)] += 1
+    response.headers["X-Trace-Id"] = trace["id"]
+    response.headers["Server-Timing"] = server_timing(trace["stages"])
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    # after a streamed body has been sent too, so stages it runs are still attributed to the request
+    TRACE.set(None)
 
 UPLOAD_FOLDER = Path("/tmp/uploads")
     
-# Simple in-memory index store
-DOCUMENT_STORE = {}  # doc_id -> { 'chunks': [...], 'vectorizer': ..., 'matrix': ..., 'text': ..., 'title': ... }
+# Bounded in-memory LRU of document indexes, backed by <doc_id>.lxi files in the storage manager
+# doc_id -> { 'text': utf-8 bytes, 'starts'/'ends': chunk byte offsets,
+#             'vocab'/'vocab_offsets': the document's own terms, utf-8 sorted (row i of the postings is term i),
+#             'post_offsets'/'post_chunks'/'post_tfs': CSR postings, 'idf', 'norms', 'title': ..., 'created_at': ... }
+DOCUMENT_STORE = OrderedDict()
+DOC_STORE_LOCK = threading.Lock()
+DOC_STORE_STATS = {"bytes": 0, "hits": 0, "disk_loads": 0, "misses": 0, "evictions": 0, "deduplicated": 0}
+DOC_CACHE_MAX_DOCS = int(os.getenv("DOC_CACHE_MAX_DOCS", "64"))
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Shared index directory (e.g. a volume mounted by every worker/instance); files are <2 chars>/<doc_id>.lxi.
+# Unset: indexes live in UPLOAD_FOLDER under the storage manager, shared by the workers of one host.
+DOC_INDEX_DIR = os.getenv("DOC_INDEX_DIR", "")
+# The storage sweeper also keeps DOC_INDEX_DIR bounded: STORAGE_TTLS["doc_index"] since last access, then
+# least recently used first past this quota; temp files of writers that died go after DOC_INDEX_TMP_TTL
+DOC_INDEX_DIR_MAX_BYTES = int(os.getenv("DOC_INDEX_DIR_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+DOC_INDEX_TMP_TTL = 600
+
+# On-disk index format: magic, u32 version, u32 header length, JSON header, 8-byte aligned sections
+DOC_INDEX_MAGIC = b"LXIDX\0\0\0"
+DOC_INDEX_VERSION = 2
+DOC_INDEX_SECTIONS = (
+    ("text", "B"), ("vocab", "B"), ("vocab_offsets", "I"), ("starts", "I"), ("ends", "I"),
+    ("post_offsets", "I"), ("post_chunks", "I"), ("post_tfs", "H"),
+    ("idf", "f"), ("norms", "f"),
+)
 
 # Configurable params
 CHUNK_SIZE = 800          # characters per chunk (adjust)
 CHUNK_OVERLAP = 150       # overlap chars
 TOP_K = 3                 # how many chunks to retrieve
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "8"))  # shared pool for concurrent pipeline stages
+NOTES_MODE = os.getenv("NOTES_MODE", "structured")  # "structured" (one schema call) or "multi" (one call per field)
+MAP_SECTION_CHARS = int(os.getenv("MAP_SECTION_CHARS", "4000"))  # characters of document per map (per-section) model call
+MAP_WORKERS = int(os.getenv("MAP_WORKERS", "8"))  # model calls in flight across all documents being simplified
+KEY_POINTS = 5            # mind-map points kept after the reduce pass
+SECTION_CUT_MASK = 15     # a sentence whose hash & mask == 0 may end a section (about 1 in 16)
+SECTION_MEMO_TTL = int(os.getenv("SECTION_MEMO_TTL", str(30 * 24 * 3600)))  # seconds, 0 disables
+BM25_K1 = 1.5             # term-frequency saturation
+BM25_B = 0.75             # length normalization strength
+
+# \w misses the combining marks most Indic (and some other) scripts spell words with, so the BMP's
+# non-word marks are allowed inside a token: "नमस्ते" stays one term instead of four pieces.
+WORD_MARKS = "".join(
+    re.escape(chr(cp)) for cp in range(0x10000)
+    if unicodedata.category(chr(cp)).startswith("M") and not re.match(r"\w", chr(cp))
+)
+TOKEN_RE = re.compile(rf"\w[\w{WORD_MARKS}]*(?:'\w[\w{WORD_MARKS}]*)?")
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for
+from further had has have having he her here hers herself him himself his how i if in
+into is it its itself just me more most my myself no nor not now of off on once only or
+other our ours ourselves out over own same she should so some such than that the their
+theirs them themselves then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your
+yours yourself yourselves
+""".split())
 
 def ensure_upload_dir():
     try:
@@ -55,34 +366,279 @@ def ensure_upload_dir():
     except Exception:
         pass
 
-def cosine_similarity_counter(a: Counter, b: Counter) -> float:
-    common = set(a.keys()) & set(b.keys())
-    numerator = sum(a[x] * b[x] for x in common)
-
-    sum_a = sum(v * v for v in a.values())
-    sum_b = sum(v * v for v in b.values())
-    denominator = math.sqrt(sum_a) * math.sqrt(sum_b)
+# name -> [category, size, last access], least recently used first
+STORAGE = OrderedDict()
+STORAGE_LOCK = threading.Lock()
+STORAGE_STATS = {"bytes": 0, "evicted_ttl": 0, "evicted_cap": 0, "evicted_quota": 0, "evicted_bytes": 0, "sweeps": 0}
+STORAGE_USAGE = {}  # category -> [files, bytes]
+STORAGE_WAKE = threading.Event()
+STORAGE_SWEEPER = []
+
+def storage_category(name):
+    if name.endswith(".pending"):
+        return "pending"
+    if name.startswith("tts_"):
+        return "tts"
+    if name.endswith(".lxi"):
+        return "doc_index"
+    if name.endswith((".part", ".tmp")):
+        return "partial"
+    return "upload"
+
+def storage_path(name, create=False):
+    """Sharded location of a managed file: UPLOAD_FOLDER/<first 2 hex of sha1(name)>/<name>."""
+    path = UPLOAD_FOLDER / hashlib.sha1(name.encode('utf-8')).hexdigest()[:2] / name
+    if create:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _storage_pop(name):
+    entry = STORAGE.pop(name, None)
+    if entry is not None:
+        usage = STORAGE_USAGE[entry[0]]
+        usage[0] -= 1
+        usage[1] -= entry[1]
+        STORAGE_STATS["bytes"] -= entry[1]
+    return entry
+
+def _storage_set(name, size, last_access):
+    _storage_pop(name)
+    category = storage_category(name)
+    STORAGE[name] = [category, size, last_access]
+    usage = STORAGE_USAGE.setdefault(category, [0, 0])
+    usage[0] += 1
+    usage[1] += size
+    STORAGE_STATS["bytes"] += size
+
+def _storage_over_limits():
+    if STORAGE_STATS["bytes"] > STORAGE_MAX_BYTES:
+        return True
+    for category, (max_bytes, max_files) in STORAGE_CAPS.items():
+        files, size = STORAGE_USAGE.get(category, (0, 0))
+        if files > max_files or size > max_bytes:
+            return True
+    return False
+
+def storage_add(name, size):
+    """Register a file just written at storage_path(name)."""
+    _start_storage_sweeper()
+    with STORAGE_LOCK:
+        _storage_set(name, size, time.time())
+        over = _storage_over_limits()
+    if over:
+        STORAGE_WAKE.set()
+
+def touch_access(path):
+    """
+    Record a read of path in its atime, for the sweepers of every worker; returns its stat.
+    mtime is left alone: it stays the write time, which Last-Modified and the ETag memo rely on.
+    """
+    st = path.stat()
+    os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    return st
 
-    if not denominator:
-        return 0.0
-    return numerator / denominator
+def storage_touch(name):
+    """Mark a managed file as just used (LRU order, and atime for other workers); False if it is gone."""
+    _start_storage_sweeper()
+    try:
+        size = touch_access(storage_path(name)).st_size
+    except FileNotFoundError:
+        with STORAGE_LOCK:
+            _storage_pop(name)
+        return False
+    with STORAGE_LOCK:
+        _storage_set(name, size, time.time())
+    return True
+
+def storage_remove(name):
+    with STORAGE_LOCK:
+        entry = _storage_pop(name)
+    try:
+        storage_path(name).unlink()
+    except FileNotFoundError:
+        pass
+    return entry
 
-def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
-    """Chunk text into overlapping chunks by character count (simple and fast)."""
+def scan_storage():
+    """(name, size, last access) of every sharded file; files left flat in UPLOAD_FOLDER or doc_index/ are moved in."""
+    found = []
+    try:
+        top = list(os.scandir(UPLOAD_FOLDER))
+    except FileNotFoundError:
+        return found
+    legacy = [e for e in top if e.is_file()]
+    for entry in top:
+        if not entry.is_dir():
+            continue
+        if entry.name == "doc_index":
+            legacy.extend(sub for sub in os.scandir(entry.path) if sub.is_file())
+        elif re.fullmatch(r"[0-9a-f]{2}", entry.name):
+            for sub in os.scandir(entry.path):
+                if sub.is_file():
+                    st = sub.stat()
+                    found.append((sub.name, st.st_size, max(st.st_atime, st.st_mtime)))
+    for entry in legacy:
+        try:
+            st = entry.stat()
+            os.replace(entry.path, storage_path(entry.name, create=True))
+            found.append((entry.name, st.st_size, max(st.st_atime, st.st_mtime)))
+        except OSError as e:
+            print("Storage migration error:", e)
+    return found
+
+def sweep_storage(rescan=True, now=None):
+    """Evict expired files, then least recently used ones until under every cap; returns the names removed."""
+    now = time.time() if now is None else now
+    started = time.time()
+    files = scan_storage() if rescan else None
+    with STORAGE_LOCK:
+        if files is not None:
+            # disk is the source of truth (other workers write here too); keep our fresher access
+            # times, and the files registered while the scan was running
+            known = {name: (entry[1], entry[2]) for name, entry in STORAGE.items()}
+            found = {name: (size, max(mtime, known.get(name, (0, 0))[1])) for name, size, mtime in files}
+            for name, (size, last_access) in known.items():
+                if name not in found and last_access >= started:
+                    found[name] = (size, last_access)
+            STORAGE.clear()
+            STORAGE_USAGE.clear()
+            STORAGE_STATS["bytes"] = 0
+            for name, (size, last_access) in sorted(found.items(), key=lambda f: f[1][1]):
+                _storage_set(name, size, last_access)
+
+        victims = []
+        for name, (category, size, last_access) in STORAGE.items():
+            ttl = STORAGE_TTLS.get(category, 0)
+            if ttl and now - last_access > ttl:
+                victims.append((name, "evicted_ttl"))
+        doomed = {name for name, _ in victims}
+        for category, (max_bytes, max_files) in STORAGE_CAPS.items():
+            count, total = STORAGE_USAGE.get(category, (0, 0))
+            if count <= max_files and total <= max_bytes:
+                continue
+            for name, size in [(n, e[1]) for n, e in STORAGE.items() if e[0] == category and n not in doomed]:
+                if count <= max_files * STORAGE_LOW_WATER and total <= max_bytes * STORAGE_LOW_WATER:
+                    break
+                victims.append((name, "evicted_cap"))
+                doomed.add(name)
+                count -= 1
+                total -= size
+        total = STORAGE_STATS["bytes"] - sum(STORAGE[name][1] for name in doomed)
+        if total > STORAGE_MAX_BYTES:
+            for name, entry in STORAGE.items():
+                if total <= STORAGE_MAX_BYTES * STORAGE_LOW_WATER:
+                    break
+                if name not in doomed and entry[0] != "partial":  # may still be being written
+                    victims.append((name, "evicted_quota"))
+                    doomed.add(name)
+                    total -= entry[1]
+        STORAGE_STATS["sweeps"] += 1
+
+    for name, reason in victims:
+        entry = storage_remove(name)
+        if entry is not None:
+            STORAGE_STATS[reason] += 1
+            STORAGE_STATS["evicted_bytes"] += entry[1]
+    return [name for name, _ in victims]
+
+def sweep_doc_index_dir(now=None):
+    """
+    The storage sweep for the shared DOC_INDEX_DIR (which every worker/instance writes to, so it
+    is rescanned each time): expired indexes, then least recently used ones past the quota, and
+    temp files left by writers that died. Returns the paths removed.
+    """
+    now = time.time() if now is None else now
+    indexes, victims = [], []
+    root = Path(DOC_INDEX_DIR)
+    for shard in (os.scandir(root) if root.is_dir() else ()):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - st.st_mtime > DOC_INDEX_TMP_TTL:
+                    victims.append((entry.path, st.st_size, "evicted_ttl"))
+            elif entry.name.endswith(".lxi"):
+                indexes.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+    ttl = STORAGE_TTLS.get("doc_index", 0)
+    kept, total = [], 0
+    for last_access, size, path in sorted(indexes):
+        if ttl and now - last_access > ttl:
+            victims.append((path, size, "evicted_ttl"))
+        else:
+            kept.append((size, path))
+            total += size
+    if total > DOC_INDEX_DIR_MAX_BYTES:
+        for size, path in kept:
+            if total <= DOC_INDEX_DIR_MAX_BYTES * STORAGE_LOW_WATER:
+                break
+            victims.append((path, size, "evicted_quota"))
+            total -= size
+    for path, size, reason in victims:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
+        with STORAGE_LOCK:
+            STORAGE_STATS[reason] += 1
+            STORAGE_STATS["evicted_bytes"] += size
+    return [path for path, _, _ in victims]
+
+def _storage_sweeper():
+    rescan = True
+    while True:
+        try:
+            sweep_storage(rescan=rescan)
+            if rescan and DOC_INDEX_DIR:
+                sweep_doc_index_dir()
+        except Exception as e:
+            print("Storage sweep error:", e)
+            traceback.print_exc()
+        # quota pressure wakes us early: registry-only sweep; the timer brings a full rescan
+        rescan = not STORAGE_WAKE.wait(STORAGE_SWEEP_SECONDS)
+        STORAGE_WAKE.clear()
+
+def _start_storage_sweeper():
+    if STORAGE_SWEEPER:
+        return
+    with STORAGE_LOCK:
+        if not STORAGE_SWEEPER:
+            thread = threading.Thread(target=_storage_sweeper, name="storage-sweeper", daemon=True)
+            STORAGE_SWEEPER.append(thread)
+            thread.start()
+
+def storage_stats():
+    with STORAGE_LOCK:
+        categories = {c: {"files": files, "bytes": size} for c, (files, size) in STORAGE_USAGE.items()}
+        return dict(STORAGE_STATS, files=len(STORAGE), max_bytes=STORAGE_MAX_BYTES, categories=categories)
+
+def chunk_spans(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Overlapping (start, end) character spans over text, whitespace-trimmed."""
     if not text:
         return []
-    chunks = []
+    spans = []
     start = 0
     L = len(text)
     while start < L:
-        end = start + size
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
+        end = min(start + size, L)
+        s, e = start, end
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            spans.append((s, e))
         if end >= L:
             break
         start = end - overlap
-    return chunks
+    return spans
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Chunk text into overlapping chunks by character count (simple and fast)."""
+    return [text[s:e] for s, e in chunk_spans(text, size, overlap)]
 
 def make_doc_id(text):
     """Stable-ish id from text content (or use uuid4 for always new)."""
@@ -90,67 +646,293 @@ def make_doc_id(text):
     h = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
     return h
 
+def tokenize(text):
+    """Casefold, strip punctuation and drop stopwords; any script. Used for documents and queries alike."""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(unicodedata.normalize("NFC", text).casefold()) if t not in STOPWORDS]
+
+def find_term(vocab, vocab_offsets, term):
+    """Row of a utf-8 encoded term in a document's sorted term table (binary search), or -1."""
+    lo, hi = 0, len(vocab_offsets) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if bytes(vocab[vocab_offsets[mid]:vocab_offsets[mid + 1]]) < term:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(vocab_offsets) - 1 and bytes(vocab[vocab_offsets[lo]:vocab_offsets[lo + 1]]) == term:
+        return lo
+    return -1
+
+def build_bm25_index(text, spans):
+    """
+    Build a compact inverted index over the chunk spans of text.
+    Postings are stored CSR-style in flat arrays, one row per term:
+      vocab[vocab_offsets[row]:vocab_offsets[row+1]] -> the term, utf-8 (rows sorted by these bytes)
+      post_chunks/post_tfs[post_offsets[row]:post_offsets[row+1]] -> (chunk_idx, tf) pairs
+    along with per-row BM25 idf and per-chunk length norms k1 * (1 - b + b * dl / avgdl).
+    """
+    postings = {}
+    doc_lens = []
+    for idx, (s, e) in enumerate(spans):
+        tf = Counter(tokenize(text[s:e]))
+        doc_lens.append(sum(tf.values()))
+        for term, count in tf.items():
+            postings.setdefault(term.encode('utf-8'), []).append((idx, count))
+
+    n = len(spans)
+    avgdl = (sum(doc_lens) / n) if n else 0.0
+
+    terms = sorted(postings)  # utf-8 byte order is code point order
+    vocab_offsets = array('I', [0])
+    for term in terms:
+        vocab_offsets.append(vocab_offsets[-1] + len(term))
+    post_offsets = array('I', [0])
+    post_chunks = array('I')
+    post_tfs = array('H')
+    idf = array('f')
+    for term in terms:
+        plist = postings[term]
+        for idx, count in plist:
+            post_chunks.append(idx)
+            post_tfs.append(min(count, 0xFFFF))
+        post_offsets.append(len(post_chunks))
+        idf.append(math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5)))
+
+    norms = array('f', (
+        BM25_K1 * (1 - BM25_B + BM25_B * (dl / avgdl if avgdl else 0.0))
+        for dl in doc_lens
+    ))
+    return {
+        "vocab": b"".join(terms),
+        "vocab_offsets": vocab_offsets,
+        "post_offsets": post_offsets,
+        "post_chunks": post_chunks,
+        "post_tfs": post_tfs,
+        "idf": idf,
+        "norms": norms,
+    }
+
+def byte_offsets(text, positions):
+    """Map ascending character positions in text to utf-8 byte offsets."""
+    out = array('I')
+    last_pos = last_byte = 0
+    for pos in positions:
+        last_byte += len(text[last_pos:pos].encode('utf-8'))
+        last_pos = pos
+        out.append(last_byte)
+    return out
+
+@timed_stage("index_document")
 def index_document(text, title=None, doc_id=None):
     if doc_id is None:
         doc_id = make_doc_id(text)
+    if get_document(doc_id) is not None:  # an unreadable (e.g. older format) file is rebuilt below
+        DOC_STORE_STATS["deduplicated"] += 1  # same content: some worker already indexed it
+        return doc_id
 
-    chunks = chunk_text(text)
-    if not chunks:
+    spans = chunk_spans(text)
+    if not spans:
         raise ValueError("No chunks to index")
 
-    chunk_vectors = [Counter(chunk.lower().split()) for chunk in chunks]
-
-    DOCUMENT_STORE[doc_id] = {
-        "chunks": chunks,
-        "chunk_vectors": chunk_vectors,
-        "text": text,
+    doc = build_bm25_index(text, spans)
+    doc.update({
+        "text": text.encode('utf-8'),
+        "starts": byte_offsets(text, (s for s, _ in spans)),
+        "ends": byte_offsets(text, (e for _, e in spans)),
         "title": title or f"doc_{doc_id}",
         "created_at": datetime.utcnow().isoformat()
-    }
+    })
+    try:
+        save_index(doc_id, doc)
+    except Exception as e:
+        print("Failed to persist index:", e)
+    cache_document(doc_id, doc)
 
     return doc_id
 
+def doc_chunk(doc, idx):
+    """Materialize a chunk string from its byte offsets."""
+    return bytes(doc["text"][doc["starts"][idx]:doc["ends"][idx]]).decode('utf-8', 'replace')
+
+def doc_nbytes(doc):
+    """Approximate footprint of a document index (mmapped sections included)."""
+    total = 0
+    for value in doc.values():
+        if isinstance(value, array):
+            total += value.itemsize * len(value)
+        elif isinstance(value, memoryview):
+            total += value.nbytes
+        elif isinstance(value, (bytes, bytearray)):
+            total += len(value)
+    return total
+
+def cache_document(doc_id, doc):
+    """Insert into the LRU, evicting the least recently used entries past the count/byte bounds."""
+    size = doc_nbytes(doc)
+    with DOC_STORE_LOCK:
+        old = DOCUMENT_STORE.pop(doc_id, None)
+        if old is not None:
+            DOC_STORE_STATS["bytes"] -= old["nbytes"]
+        doc["nbytes"] = size
+        DOCUMENT_STORE[doc_id] = doc
+        DOC_STORE_STATS["bytes"] += size
+        while len(DOCUMENT_STORE) > 1 and (
+            len(DOCUMENT_STORE) > DOC_CACHE_MAX_DOCS or DOC_STORE_STATS["bytes"] > DOC_CACHE_MAX_BYTES
+        ):
+            evicted_id, evicted = DOCUMENT_STORE.popitem(last=False)
+            DOC_STORE_STATS["bytes"] -= evicted["nbytes"]
+            DOC_STORE_STATS["evictions"] += 1
+            if not doc_index_exists(evicted_id):
+                try:
+                    save_index(evicted_id, evicted)
+                except Exception as e:
+                    print("Failed to spill evicted index:", e)
+
+def get_document(doc_id):
+    """Return a document index from this process's LRU, reading through to the shared index files on a miss."""
+    with DOC_STORE_LOCK:
+        doc = DOCUMENT_STORE.get(doc_id)
+        if doc is not None:
+            DOCUMENT_STORE.move_to_end(doc_id)
+            DOC_STORE_STATS["hits"] += 1
+            return doc
+    return load_index_if_missing(doc_id)
+
+def doc_index_path(doc_id, create=False):
+    name = f"{secure_filename(doc_id)}.lxi"
+    if not DOC_INDEX_DIR:
+        return storage_path(name, create)
+    path = Path(DOC_INDEX_DIR) / name[:2] / name
+    if create:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def doc_index_exists(doc_id):
+    path = doc_index_path(doc_id)
+    if not DOC_INDEX_DIR:
+        return storage_touch(path.name)
+    _start_storage_sweeper()
+    try:
+        touch_access(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+@timed_stage("save_index")
+def save_index(doc_id, doc):
+    """Write a document index in the versioned, mmap-friendly on-disk format."""
+    sections = {}
+    offset = 0
+    for name, typecode in DOC_INDEX_SECTIONS:
+        data = memoryview(doc[name]).cast('B')
+        sections[name] = [offset, data.nbytes, typecode]
+        offset += (data.nbytes + 7) & ~7
+    header = json.dumps({
+        "doc_id": doc_id,
+        "title": doc["title"],
+        "created_at": doc["created_at"],
+        "byteorder": sys.byteorder,
+        "sections": sections,
+    }).encode('utf-8')
+    header += b" " * (-(len(DOC_INDEX_MAGIC) + 8 + len(header)) % 8)
+
+    path = doc_index_path(doc_id, create=True)
+    if DOC_INDEX_DIR:
+        tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+    else:
+        tmp = storage_path(f"{path.name}.{uuid4().hex}.tmp", create=True)
+    with open(tmp, "wb") as f:
+        f.write(DOC_INDEX_MAGIC)
+        f.write(struct.pack("<II", DOC_INDEX_VERSION, len(header)))
+        f.write(header)
+        for name, _ in DOC_INDEX_SECTIONS:
+            data = memoryview(doc[name]).cast('B')
+            f.write(data)
+            f.write(b"\0" * (-data.nbytes % 8))
+        size = f.tell()
+    os.replace(tmp, path)
+    if not DOC_INDEX_DIR:
+        storage_add(path.name, size)
+    return path
+
+@timed_stage("load_index")
 def load_index_if_missing(doc_id):
-    """Try to load pickled index from uploads folder."""
-    if doc_id in DOCUMENT_STORE:
-        return DOCUMENT_STORE[doc_id]
-    path = UPLOAD_FOLDER / f"doc_index_{doc_id}.pkl"
-    if path.exists():
-        try:
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
-            DOCUMENT_STORE[doc_id] = {
-                'chunks': data['chunks'],
-                'vectorizer': data['vectorizer'],
-                'matrix': data['matrix'],
-                'text': data.get('text', ''),
-                'title': data.get('title', ''),
-                'created_at': datetime.utcnow().isoformat()
-            }
-            return DOCUMENT_STORE[doc_id]
-        except Exception as e:
-            print("Failed to load persisted index:", e)
-    return None
+    """Memory-map a persisted index from the shared index files into the LRU."""
+    path = doc_index_path(doc_id)
+    if not doc_index_exists(doc_id):
+        DOC_STORE_STATS["misses"] += 1
+        return None
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        magic_len = len(DOC_INDEX_MAGIC)
+        if bytes(view[:magic_len]) != DOC_INDEX_MAGIC:
+            raise ValueError("not a document index")
+        version, header_len = struct.unpack_from("<II", view, magic_len)
+        if version != DOC_INDEX_VERSION:
+            raise ValueError(f"unsupported index version {version}")
+        base = magic_len + 8
+        header = json.loads(bytes(view[base:base + header_len]))
+        base += header_len
+
+        doc = {"title": header["title"], "created_at": header["created_at"]}
+        for name, (offset, nbytes, typecode) in header["sections"].items():
+            section = view[base + offset:base + offset + nbytes]
+            if typecode == "B":
+                doc[name] = section
+            elif header["byteorder"] == sys.byteorder:
+                doc[name] = section.cast(typecode)
+            else:
+                doc[name] = array(typecode, section)
+                doc[name].byteswap()
+    except Exception as e:
+        print("Failed to load persisted index:", e)
+        DOC_STORE_STATS["misses"] += 1
+        return None
 
+    DOC_STORE_STATS["disk_loads"] += 1
+    cache_document(doc_id, doc)
+    return doc
+
+def bm25_scores(doc, query_terms):
+    """Accumulate BM25 scores touching only the postings of the query terms."""
+    vocab = doc["vocab"]
+    vocab_offsets = doc["vocab_offsets"]
+    post_offsets = doc["post_offsets"]
+    post_chunks = doc["post_chunks"]
+    post_tfs = doc["post_tfs"]
+    idf = doc["idf"]
+    norms = doc["norms"]
+    k1 = BM25_K1 + 1
+    scores = {}
+    for term in set(query_terms):
+        row = find_term(vocab, vocab_offsets, term.encode('utf-8'))
+        if row < 0:
+            continue
+        w = idf[row]
+        for p in range(post_offsets[row], post_offsets[row + 1]):
+            idx = post_chunks[p]
+            tf = post_tfs[p]
+            scores[idx] = scores.get(idx, 0.0) + w * tf * k1 / (tf + norms[idx])
+    return scores
+
+@timed_stage("retrieve")
 def retrieve_top_k(doc_id, question, top_k=TOP_K):
-    doc = DOCUMENT_STORE.get(doc_id)
+    doc = get_document(doc_id)
     if not doc:
         return []
 
-    question_vec = Counter(question.lower().split())
+    scores = bm25_scores(doc, tokenize(question))
+    best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
 
-    scored = []
-    for idx, chunk_vec in enumerate(doc["chunk_vectors"]):
-        score = cosine_similarity_counter(question_vec, chunk_vec)
-        if score > 0:
-            scored.append({
-                "chunk": doc["chunks"][idx],
-                "score": score,
-                "index": idx
-            })
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:top_k]
+    return [
+        {"chunk": doc_chunk(doc, idx), "score": score, "index": idx}
+        for idx, score in best
+        if score > 0
+    ]
 
 @app.route('/api/save-reading-results', methods=['POST'])
 def save_reading_results():
@@ -167,18 +949,18 @@ def upload_audio():
     if 'audio' not in request.files:
         return jsonify(message='No audio file provided!'), 400
 
-    audio_file = request.files['audio']
-    audio_path = os.path.join('uploads', 'reading_test.wav')
-    audio_file.save(audio_path)
+    audio = upload_part(request.files['audio'], 'reading_test')
 
     # TEMP values (frontend already computes these)
     speed = float(request.form.get("readingSpeed", 0))
     time_taken = float(request.form.get("timeTaken", 0))
 
-    fluency_score, feedback_text = assess_fluency_and_feedback(
-        audio_path,
+    conditioned, metrics = analyze_reading(audio, speed)
+    fluency_score, feedback_text, score_source = assess_fluency_and_feedback(
+        preprocess_audio(audio, conditioned),
         speed,
-        time_taken
+        time_taken,
+        metrics
     )
 
     # Convert feedback → speech
@@ -187,23 +969,48 @@ def upload_audio():
     return jsonify(
         fluency_rating=fluency_score,
         feedback_text=feedback_text,
-        feedback_audio=feedback_audio
+        feedback_audio=feedback_audio,
+        fluency_metrics=metrics,
+        score_source=score_source
     ), 200
 
 
-def assess_fluency_and_feedback(audio_path, speed, time_taken):
-    with open(audio_path, "rb") as f:
-        audio_bytes = f.read()
+def assess_fluency_and_feedback(audio, speed, time_taken, metrics=None):
+    """
+    (score, feedback, score_source) for a reading attempt. audio is a (bytes, mime_type) pair from
+    upload_part; metrics come from fluency_metrics and are None if the recording couldn't be decoded.
+    FLUENCY_MODE decides whether Gemini scores the attempt, only writes the feedback, or isn't called.
+    """
+    audio_bytes, audio_mime = audio
+
+    # nothing to assess: don't spend a model call on it
+    if len(audio_bytes) < FLUENCY_MIN_UPLOAD_BYTES or (metrics and metrics["silent"]):
+        return 0, FLUENCY_SILENT_FEEDBACK, "local"
 
-    prompt = f"""
-You are a kind reading coach helping a learner with dyslexia.
+    mode = FLUENCY_MODE if metrics else "llm"
+    if mode == "local":
+        return metrics["score"], local_fluency_feedback(metrics), "local"
 
-Evaluate the reading based on the audio.
+    if mode == "hybrid":
+        task = f"""
+Measured from the recording: {metrics['articulation_rate']} syllables per second,
+{metrics['pause_count']} pauses ({metrics['long_pause_count']} longer than a second),
+speaking {round(metrics['speech_ratio'] * 100)}% of the time.
 
+Return ONLY a short spoken feedback (max 4 sentences), no score.
+"""
+    else:
+        task = """
 Return:
 1. A fluency score from 0 to 100 (number only)
 2. A short spoken feedback (max 4 sentences)
+"""
 
+    prompt = f"""
+You are a kind reading coach helping a learner with dyslexia.
+
+Evaluate the reading based on the audio.
+{task}
 Rules:
 - Use very simple language
 - Be encouraging
@@ -213,37 +1020,278 @@ Rules:
 - Do NOT be harsh
 """
 
-    response = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=[
-            types.Part.from_bytes(
-                data=audio_bytes,
-                mime_type="audio/wav"
-            ),
-            f"""
+    response = gemini_generate_content([
+        (audio_bytes, audio_mime),
+        f"""
 Reading speed: {speed} words per minute
 Time taken: {time_taken:.2f} seconds
 
 {prompt}
 """
-        ],
-    )
+    ])
 
     text = response.text.strip()
+    if mode == "hybrid":
+        return metrics["score"], text, "local"
 
     # --- Extract fluency score ---
     score = 0
     feedback = text
 
-    import re
     match = re.search(r"(\d{1,3})", text)
     if match:
-        score = int(match.group(1))
+        score = min(100, int(match.group(1)))
+    elif metrics:
+        # no number in the reply: fall back to the acoustic score
+        return metrics["score"], feedback, "local"
 
-    return score, feedback
+    return score, feedback, "gemini"
 
 
 
+def decode_wav(data):
+    """
+    (samples, rate) for a PCM or float WAV, samples as float32 of shape (frames, channels) in [-1, 1].
+    Returns None for anything else (compressed WAVs, webm/ogg recordings, truncated files).
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt " and size >= 16 and body + 16 <= len(data):
+            code, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if code == 0xFFFE and size >= 26 and body + 26 <= len(data):  # WAVE_FORMAT_EXTENSIBLE: real code leads the subformat GUID
+                code = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (code, channels, rate, bits)
+        elif chunk_id == b"data" and fmt:
+            # streaming writers leave the size at 0 or 0xFFFFFFFF: take the rest of the file
+            end = len(data) if size in (0, 0xFFFFFFFF) else min(len(data), body + size)
+            return _wav_samples(memoryview(data)[body:end], *fmt)
+        pos = body + size + (size & 1)
+    return None
+
+def _wav_samples(raw, code, channels, rate, bits):
+    width = bits // 8
+    if not channels or not rate or width not in (1, 2, 3, 4, 8):
+        return None
+    usable = len(raw) - len(raw) % (width * channels)
+    raw = raw[:usable]
+    if code == 3 and width in (4, 8):
+        x = np.frombuffer(raw, dtype="<f4" if width == 4 else "<f8").astype(np.float32)
+    elif code == 1 and width == 1:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif code == 1 and width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608.0
+    elif code == 1 and width in (2, 4):
+        x = np.frombuffer(raw, dtype="<i2" if width == 2 else "<i4").astype(np.float32) / float(1 << (bits - 1))
+    else:
+        return None
+    return x.reshape(-1, channels), rate
+
+def trim_silence(x, rate):
+    """Drop leading and trailing frames that are near the noise floor or far below the loudest frame."""
+    frame = max(1, rate * AUDIO_FRAME_MS // 1000)
+    n = len(x) // frame
+    if n == 0:
+        return x
+    rms = np.sqrt(np.mean(np.square(x[:n * frame].reshape(n, frame), dtype=np.float64), axis=1))
+    db = 20 * np.log10(rms + 1e-10)
+    threshold = max(db.max() + AUDIO_TRIM_DB, np.percentile(db, 10) + AUDIO_NOISE_MARGIN_DB)
+    voiced = np.flatnonzero(db > threshold)
+    if len(voiced) == 0:
+        return x
+    pad = rate * AUDIO_TRIM_PAD_MS // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(x), (voiced[-1] + 1) * frame + pad)
+    return x[start:end]
+
+def resample(x, src_rate, dst_rate):
+    """Band-limited (FFT) resampling of a mono signal; also acts as the anti-aliasing filter."""
+    if src_rate == dst_rate or len(x) == 0:
+        return x
+    g = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    n_out = int(round(len(x) * dst_rate / src_rate))
+    # zero-pad to a length that maps exactly onto the output rate and factors well for the FFT
+    block = down * 1024
+    padded = -(-len(x) // block) * block
+    spectrum = np.fft.rfft(x, padded)
+    m = padded * up // down
+    y = np.fft.irfft(spectrum[:m // 2 + 1], m) * (m / padded)
+    return y[:n_out].astype(np.float32)
+
+@timed_stage("condition_audio")
+def condition_audio(data):
+    """Mono, AUDIO_TARGET_RATE, edge-trimmed float32 samples for a WAV upload, or None if it can't be decoded."""
+    decoded = decode_wav(data)
+    if decoded is None:
+        return None
+    x, rate = decoded
+    x = x.mean(axis=1) if x.shape[1] > 1 else x[:, 0]
+    x = trim_silence(x, rate)
+    return resample(x, rate, AUDIO_TARGET_RATE), AUDIO_TARGET_RATE
+
+def pcm16(x):
+    return (np.clip(x, -1.0, 1.0) * 32767.0).round().astype("<i2")
+
+def encode_wav(pcm, rate):
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + pcm.nbytes, b"WAVE", b"fmt ", 16, 1, 1, rate, rate * 2, 2, 16, b"data", pcm.nbytes,
+    )
+    return header + pcm.tobytes()
+
+def preprocess_audio(audio, conditioned=None):
+    """
+    Shrink a (bytes, mime_type) reading-test upload before it goes to Gemini:
+    mono, AUDIO_TARGET_RATE, silence trimmed, re-encoded as 16-bit PCM WAV.
+    Anything that isn't a decodable WAV is returned unchanged. Pass conditioned
+    if condition_audio already ran on this upload.
+    """
+    data, mime = audio
+    if not AUDIO_PREPROCESS or mime != "audio/wav":
+        return audio
+    try:
+        conditioned = conditioned or condition_audio(data)
+        if conditioned is None:
+            return audio
+        return encode_wav(pcm16(conditioned[0]), AUDIO_TARGET_RATE), "audio/wav"
+    except Exception as e:
+        print("Audio preprocessing error:", e)
+        traceback.print_exc()
+        return audio
+
+
+def _runs(mask):
+    """[start, end) index pairs of the True runs in a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+def fluency_metrics(samples, rate, reading_speed=0.0):
+    """
+    Energy-based fluency measures for a mono recording from condition_audio: voice activity,
+    pauses, articulation rate (syllable nuclei per second of speaking) and words-per-minute
+    steadiness, checked against the client's readingSpeed. Deterministic for a given recording.
+    """
+    frame = max(1, rate * AUDIO_FRAME_MS // 1000)
+    n = len(samples) // frame
+    metrics = {"duration_s": round(len(samples) / rate, 2), "speech_s": 0.0, "silent": True, "score": 0}
+    if n < 3:
+        return metrics
+    rms = np.sqrt(np.mean(np.square(samples[:n * frame].reshape(n, frame), dtype=np.float64), axis=1))
+    db = 20 * np.log10(rms + 1e-10)
+    p5, p95 = np.percentile(db, [5, 95])
+    # between the noise floor and the loud speech, but never more than 12 dB under the loud speech
+    threshold = min(max(p95 + FLUENCY_VAD_DB, p5 + AUDIO_NOISE_MARGIN_DB), p95 - 12)
+    voiced = db > threshold
+
+    starts, ends = _runs(voiced)
+    if len(starts) == 0 or db.max() < FLUENCY_SILENCE_DB:
+        return metrics
+    gaps_ms = (starts[1:] - ends[:-1]) * AUDIO_FRAME_MS
+    pauses_ms = gaps_ms[gaps_ms >= FLUENCY_PAUSE_MS]
+    span_s = (ends[-1] - starts[0]) * AUDIO_FRAME_MS / 1000
+    speaking_s = span_s - pauses_ms.sum() / 1000
+    if voiced.sum() * AUDIO_FRAME_MS / 1000 < FLUENCY_MIN_SPEECH_S:
+        return metrics
+
+    # syllable nuclei: voiced peaks of the 100 ms smoothed envelope separated by a dip of 2 dB or more
+    env = np.convolve(db, np.ones(5) / 5, mode="same")
+    peaks = 1 + np.flatnonzero(
+        (env[1:-1] > env[:-2]) & (env[1:-1] >= env[2:]) & voiced[1:-1]
+    )
+    if len(peaks):
+        dips = np.minimum.reduceat(env, peaks)[:-1]
+        distinct = np.minimum(env[peaks[:-1]], env[peaks[1:]]) - dips >= 2.0
+        peaks = np.concatenate((peaks[:1], peaks[1:][distinct]))
+    syllables = len(peaks)
+    articulation_rate = syllables / speaking_s if speaking_s > 0 else 0.0
+    acoustic_wpm = syllables / SYLLABLES_PER_WORD / (span_s / 60) if span_s > 0 else 0.0
+
+    # steadiness: spread of the syllable rate across FLUENCY_WINDOW_S windows of the reading
+    window = FLUENCY_WINDOW_S * 1000 // AUDIO_FRAME_MS
+    full = (ends[-1] - starts[0]) // window
+    counts = np.bincount((peaks - starts[0]) // window, minlength=full + 1)[:full]
+    wpm_cv = float(counts.std() / counts.mean()) if full >= 2 and counts.mean() > 0 else 0.0
+
+    speech_ratio = speaking_s / span_s if span_s > 0 else 0.0
+    metrics.update({
+        "speech_s": round(float(speaking_s), 2),
+        "silent": False,
+        "speech_ratio": round(float(speech_ratio), 3),
+        "pause_count": int(len(pauses_ms)),
+        "long_pause_count": int((pauses_ms >= FLUENCY_LONG_PAUSE_MS).sum()),
+        "mean_pause_ms": int(pauses_ms.mean()) if len(pauses_ms) else 0,
+        "max_pause_ms": int(pauses_ms.max()) if len(pauses_ms) else 0,
+        "syllables": syllables,
+        "articulation_rate": round(float(articulation_rate), 2),
+        "acoustic_wpm": round(float(acoustic_wpm), 1),
+        "wpm_cv": round(wpm_cv, 3),
+        "wpm_agreement": (
+            round(float(min(acoustic_wpm, reading_speed) / max(acoustic_wpm, reading_speed)), 3)
+            if acoustic_wpm > 0 and reading_speed > 0 else None
+        ),
+    })
+    metrics["score"] = local_fluency_score(metrics)
+    return metrics
+
+def _fluency_parts(m):
+    """Pace, continuity and steadiness of a reading, each in [0, 1]."""
+    rate = m["articulation_rate"]
+    if rate < FLUENCY_RATE_LOW:
+        pace = rate / FLUENCY_RATE_LOW
+    else:
+        pace = max(0.0, 1 - max(0.0, rate - FLUENCY_RATE_HIGH) / FLUENCY_RATE_HIGH)
+    continuity = min(1.0, max(0.0, (m["speech_ratio"] - 0.4) / 0.4))
+    steadiness = min(1.0, max(0.0, 1 - m["wpm_cv"]))
+    return {"pace": pace, "continuity": continuity, "steadiness": steadiness}
+
+def local_fluency_score(m):
+    parts = _fluency_parts(m)
+    return int(round(100 * (0.4 * parts["pace"] + 0.35 * parts["continuity"] + 0.25 * parts["steadiness"])))
+
+def local_fluency_feedback(m):
+    """Short, encouraging spoken feedback built from fluency_metrics alone."""
+    parts = _fluency_parts(m)
+    best = max(parts, key=parts.get)
+    worst = min(parts, key=parts.get)
+    praise = {
+        "pace": "You read at a nice, comfortable pace.",
+        "continuity": "You read smoothly without stopping much.",
+        "steadiness": "You kept your speed steady from start to finish.",
+    }
+    if parts[worst] >= 0.9:
+        tip = "Keep practising like this every day."
+    elif worst == "pace" and m["articulation_rate"] > FLUENCY_RATE_HIGH:
+        tip = "Next time, try slowing down a little so every word is clear."
+    else:
+        tip = {
+            "pace": "Next time, try reading a little faster, one phrase at a time.",
+            "continuity": "Try to keep going to the end of each sentence before you pause.",
+            "steadiness": "Try to keep the same speed all the way through.",
+        }[worst]
+    return f"Well done for reading out loud! {praise[best]} {tip}"
+
+def analyze_reading(audio, reading_speed):
+    """(conditioned samples, fluency metrics) for a reading-test upload; (None, None) if it isn't a decodable WAV."""
+    if audio[1] != "audio/wav":
+        return None, None
+    try:
+        conditioned = condition_audio(audio[0])
+        if conditioned is None:
+            return None, None
+        return conditioned, fluency_metrics(*conditioned, reading_speed=reading_speed)
+    except Exception as e:
+        print("Audio analysis error:", e)
+        traceback.print_exc()
+        return None, None
+
+
 # --- Updated endpoints using handle_gemini_prompt ---
 
 @app.route('/api/writing-assistant', methods=['POST'])
@@ -261,9 +1309,9 @@ def writing_assistant():
             return jsonify(message='Text improved successfully!', improved_text=improved_text), 200
 
         # image path branch
-        image_path = save_file(image_file, 'user_image')
+        image = normalize_image(upload_part(image_file, 'user_image'))
         prompt = "Improve the coherence for the text contained in this image. Return only the improved text, short and easy to understand for a dyslexic person."
-        improved_text = handle_gemini_prompt(file_path=image_path, text_prompt=prompt)
+        improved_text = handle_gemini_prompt(part=image, text_prompt=prompt)
         return jsonify(message='Response generated successfully!', improved_text=improved_text), 200
 
     except Exception as e:
@@ -272,6 +1320,257 @@ def writing_assistant():
         return jsonify(message='Error generating improved text!'), 500
 
 
+# --- Local spell-check (SymSpell-style symmetric deletes) ---
+
+SPELL_LETTERS = rf"[^\W\d_](?:[^\W\d_]|[{WORD_MARKS}])*"  # letters of any script, with their combining marks
+SPELL_WORD_RE = re.compile(rf"{SPELL_LETTERS}(?:['’]{SPELL_LETTERS})*")
+SPELL_INDEX = None
+SPELL_INDEX_LOCK = threading.Lock()
+SPELL_STATS = {"words": 0, "load_seconds": 0.0, "checked": 0, "misspelled": 0, "explained": 0}
+
+def prefix_deletes(word, max_edit=SPELL_MAX_EDIT):
+    """The word's prefix with 0..max_edit characters removed, one set per count."""
+    prefix = word[:SPELL_PREFIX_LENGTH]
+    levels = [{prefix}]
+    for k in range(1, max_edit + 1):
+        levels.append(set(map("".join, combinations(prefix, len(prefix) - k))) if len(prefix) > k else set())
+    return levels
+
+def delete_key(s):
+    return zlib.crc32(s.encode('utf-8'))
+
+SPELL_INDEX_ARRAYS = ("keys", "offsets", "postings")
+
+def load_spell_words(path=SPELL_DICTIONARY):
+    """(words, counts) of a "word count" frequency list."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    words, counts = [], []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                words.append(parts[0].lower())
+                counts.append(int(parts[1]))
+    return words, counts
+
+def spell_index_meta(path=SPELL_DICTIONARY):
+    """What a precomputed index was built from; it is only used when this still matches."""
+    return {
+        "dictionary_sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+        "max_edit": SPELL_MAX_EDIT,
+        "prefix_length": SPELL_PREFIX_LENGTH,
+    }
+
+def build_spell_arrays(words):
+    """
+    The symmetric-delete lookup, CSR-style as sorted unique crc32 keys in flat arrays:
+      postings[offsets[i]:offsets[i+1]] -> ids of the words with a prefix delete hashing to keys[i]
+    A key collision only adds candidates, which the distance check then rejects.
+    """
+    keys, per_word = [], []
+    for word in words:
+        deletes = set().union(*prefix_deletes(word))
+        keys.extend(map(delete_key, deletes))
+        per_word.append(len(deletes))
+    keys = np.array(keys, dtype=np.uint32)
+    postings = np.repeat(np.arange(len(words), dtype=np.uint32), per_word)
+    order = np.argsort(keys, kind="stable")
+    keys, starts = np.unique(keys[order], return_index=True)
+    return {
+        "keys": keys,
+        "offsets": np.append(starts, len(postings)).astype(np.uint32),
+        "postings": postings[order],
+    }
+
+def write_spell_index(directory=SPELL_INDEX_DIR, path=SPELL_DICTIONARY):
+    """Precompute the delete-key arrays for the dictionary at path into directory (one .npy per array)."""
+    words, _ = load_spell_words(path)
+    arrays = build_spell_arrays(words)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in SPELL_INDEX_ARRAYS:
+        np.save(directory / f"{name}.npy", arrays[name])
+    (directory / "meta.json").write_text(json.dumps(spell_index_meta(path), indent=2) + "\n")
+
+def load_spell_arrays(directory=SPELL_INDEX_DIR, path=SPELL_DICTIONARY):
+    """The precomputed arrays, memory-mapped read-only, or None if missing or built from something else."""
+    try:
+        meta = json.loads((directory / "meta.json").read_text())
+        if meta != spell_index_meta(path):
+            print(f"Spell index in {directory} is stale; building it in memory")
+            return None
+        return {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in SPELL_INDEX_ARRAYS}
+    except FileNotFoundError:
+        return None
+
+def build_spell_index(path=SPELL_DICTIONARY, directory=SPELL_INDEX_DIR):
+    """Word list and lookup arrays for spelling_suggestions; the arrays come precomputed when they match path."""
+    words, counts = load_spell_words(path)
+    arrays = load_spell_arrays(directory, path) or build_spell_arrays(words)
+    lengths = np.array([len(w) for w in words], dtype=np.int16)
+    return dict(
+        arrays,
+        words=words,
+        ids={w: i for i, w in enumerate(words)},
+        counts=np.array(counts, dtype=np.int64),
+        lengths=lengths,
+        prefix_lengths=np.minimum(lengths, SPELL_PREFIX_LENGTH),
+    )
+
+def spell_index():
+    """The process-wide spell index, loaded on first use."""
+    global SPELL_INDEX
+    with SPELL_INDEX_LOCK:
+        if SPELL_INDEX is None:
+            t0 = time.perf_counter()
+            SPELL_INDEX = build_spell_index()
+            SPELL_STATS["words"] = len(SPELL_INDEX["words"])
+            SPELL_STATS["load_seconds"] = round(time.perf_counter() - t0, 3)
+        return SPELL_INDEX
+
+def osa_distance(a, b, max_distance):
+    """Optimal string alignment distance (adjacent swaps count as one edit), capped at max_distance + 1."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # common prefix and suffix don't change the distance
+    s = 0
+    while s < len(a) and s < len(b) and a[s] == b[s]:
+        s += 1
+    e = 0
+    while e < len(a) - s and e < len(b) - s and a[-1 - e] == b[-1 - e]:
+        e += 1
+    a, b = a[s:len(a) - e], b[s:len(b) - e]
+    if not a or not b:
+        return min(len(a) + len(b), max_distance + 1)
+
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        cur = [i] * (len(b) + 1)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cb = b[j - 1]
+            v = prev[j - 1] if ca == cb else prev[j - 1] + 1
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j - 1] + 1 < v:
+                v = cur[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] + 1 < v:
+                v = prev2[j - 2] + 1
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return min(prev[-1], max_distance + 1)
+
+@lru_cache(maxsize=SPELL_MEMO_SIZE)
+def spelling_suggestions(word, max_edit=SPELL_MAX_EDIT):
+    """
+    Closest dictionary words to an unknown lowercase word, most frequent first.
+    Candidates share a prefix delete with the word; a pair of deletes k1/k2 characters
+    deep can't be closer than max(k1, k2) edits, so shallow pairs are checked first and
+    the search stops once nothing deeper can match the best distance found.
+    """
+    index = spell_index()
+    keys, offsets, postings = index["keys"], index["offsets"], index["postings"]
+    levels = prefix_deletes(word, max_edit)
+    deletes = [d for level in levels for d in level]
+    depth = np.repeat(np.arange(len(levels), dtype=np.int16), [len(level) for level in levels])
+
+    query = np.fromiter(map(delete_key, deletes), dtype=np.uint32, count=len(deletes))
+    slots = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    hit = keys[slots] == query
+    slots, depth = slots[hit], depth[hit]
+    if not len(slots):
+        return ()
+    candidates = np.concatenate([postings[offsets[s]:offsets[s + 1]] for s in slots.tolist()])
+    depth = np.repeat(depth, (offsets[slots + 1] - offsets[slots]).astype(np.int64))
+
+    prefix_length = min(len(word), SPELL_PREFIX_LENGTH)
+    bound = np.maximum(depth, index["prefix_lengths"][candidates] - (prefix_length - depth))
+    close = (bound <= max_edit) & (np.abs(index["lengths"][candidates] - len(word)) <= max_edit)
+    candidates, bound = candidates[close], bound[close]
+
+    words = index["words"]
+    best, closest, seen = max_edit + 1, [], set()
+    for level in range(max_edit + 1):
+        if level > best:
+            break
+        for wid in candidates[bound == level].tolist():
+            if wid in seen:
+                continue
+            seen.add(wid)
+            d = osa_distance(word, words[wid], min(best, max_edit))
+            if d < best:
+                best, closest = d, [wid]
+            elif d == best <= max_edit:
+                closest.append(wid)
+    counts = index["counts"]
+    closest.sort(key=lambda wid: (words[wid].replace("'", "") != word, -counts[wid]))  # "dont" -> "don't" first
+    return tuple(words[wid] for wid in closest[:SPELL_MAX_SUGGESTIONS])
+
+def at_sentence_start(text, pos):
+    before = text[max(0, pos - 8):pos].rstrip(" \t\"'(“‘")
+    return not before or before[-1] in ".!?:\n" or pos <= 8 and not text[:pos].strip()
+
+def check_spelling(text):
+    """
+    Misspelled words in text, in order of first appearance:
+      [{"word": "Recieve", "suggestions": ["receive", "relieve"], "count": 2, "start": char offset}, ...]
+    Each distinct word is looked up once. Single letters, ALL-CAPS acronyms and
+    capitalized words inside a sentence (names) are not checked, and neither are words
+    with non-ASCII letters the (English) dictionary doesn't know: "café" is not "caf".
+    """
+    ids = spell_index()["ids"]
+    findings = {}
+    checked = 0
+    for m in SPELL_WORD_RE.finditer(text):
+        token = m.group()
+        if len(token) < 2 or token.isupper():
+            continue
+        checked += 1
+        word = token.lower().replace("’", "'")
+        if word in ids or word.partition("'")[0] in ids:  # possessives and contractions: "dog's"
+            continue
+        if not word.isascii():
+            continue
+        if token[0].isupper() and not at_sentence_start(text, m.start()):
+            continue
+        if word in findings:
+            findings[word]["count"] += 1
+            continue
+        base, apostrophe, suffix = word.partition("'")
+        if apostrophe and base not in ids:
+            suggestions = [f"{s}'{suffix}" for s in spelling_suggestions(base)]  # "freind's" -> "friend's"
+        else:
+            suggestions = list(spelling_suggestions(word))
+        findings[word] = {"word": token, "suggestions": suggestions, "count": 1, "start": m.start()}
+    SPELL_STATS["checked"] += checked
+    SPELL_STATS["misspelled"] += sum(f["count"] for f in findings.values())
+    return list(findings.values())
+
+def spelling_report(findings):
+    """Short, easy-to-read list of the mistakes, as shown (and read aloud) by the writing assistant."""
+    if not findings:
+        return "No spelling mistakes found."
+    lines = []
+    for f in findings:
+        if f["suggestions"]:
+            lines.append(f"- {f['word']}: did you mean {' or '.join(f['suggestions'])}?")
+        else:
+            lines.append(f"- {f['word']}: not in the dictionary")
+    return "\n".join(lines)
+
+def spelling_explain_prompt(text, report):
+    return (
+        "A spell-checker found these mistakes in the text below, with suggested corrections:\n"
+        f"{report}\n\n"
+        "For each one, explain the correct spelling in one short, simple sentence for a dyslexic reader.\n\n"
+        f"Text:\n{text}"
+    )
+
+
 @app.route('/api/writing-assistant-spelling', methods=['POST'])
 def writing_assistant_spelling():
     user_text = request.form.get('text')
@@ -284,15 +1583,23 @@ def writing_assistant_spelling():
     )
 
     try:
+        if user_text and SPELLCHECK_MODE == "local":
+            findings = check_spelling(user_text)
+            report = spelling_report(findings)
+            if findings and form_flag(request.form.get('explain')):
+                SPELL_STATS["explained"] += 1
+                report = handle_gemini_prompt(text_prompt=spelling_explain_prompt(user_text, report))
+            return jsonify(message='Text analyzed successfully!', improved_text=report, misspellings=findings), 200
+
         if user_text:
             prompt = base_prompt + user_text
             improved_text = handle_gemini_prompt(text_prompt=prompt)
             return jsonify(message='Text analyzed successfully!', improved_text=improved_text), 200
 
         # image branch
-        image_path = save_file(image_file, 'user_image')
+        image = normalize_image(upload_part(image_file, 'user_image'))
         prompt = base_prompt + "Please extract the text from the image and then list the spelling and sentence formation mistakes."
-        improved_text = handle_gemini_prompt(file_path=image_path, text_prompt=prompt)
+        improved_text = handle_gemini_prompt(part=image, text_prompt=prompt)
         return jsonify(message='Response generated successfully!', improved_text=improved_text), 200
 
     except Exception as e:
@@ -304,44 +1611,327 @@ def writing_assistant_spelling():
 
 
 
+STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+def run_stages(stages, label="pipeline"):
+    """
+    Run a small task graph on the shared stage pool.
+    stages: {name: (fn, deps, fallback)} where fn(results) receives the results of finished
+    stages, deps names the stages it needs, and fallback(exc) supplies the value if fn raises
+    (or the stage's own deps failed without a fallback). Independent stages run concurrently.
+    Returns (results, timings_ms).
+    """
+    results, timings, failed = {}, {}, set()
+    pending = dict(stages)
+    running = {}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        try:
+            return fn(results)
+        finally:
+            seconds = time.perf_counter() - t0
+            timings[name] = round(seconds * 1000, 1)
+            observe_stage(name, seconds)
+
+    def fail(name, exc):
+        fallback = stages[name][2]
+        if fallback is None:
+            failed.add(name)
+            results[name] = None
+        else:
+            results[name] = fallback(exc)
+
+    while pending or running:
+        progressed = False
+        for name, (fn, deps, _) in list(pending.items()):
+            if any(d in pending or d in running.values() for d in deps):
+                continue
+            del pending[name]
+            progressed = True
+            if any(d in failed for d in deps):
+                fail(name, RuntimeError(f"dependency of {name} failed"))
+                continue
+            # each stage gets its own copy of the context so request-scoped state stays visible
+            ctx = contextvars.copy_context()
+            running[STAGE_EXECUTOR.submit(ctx.run, timed, name, fn)] = name
+        if not running:
+            if pending and not progressed:
+                raise ValueError(f"Unresolvable stage dependencies: {sorted(pending)}")
+            continue
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"{label} stage {name} error:", e)
+                fail(name, e)
+
+    return results, timings
+
+# Separate from STAGE_EXECUTOR: map steps are fanned out from inside stages, which must not
+# wait on their own pool.
+MAP_EXECUTOR = ThreadPoolExecutor(max_workers=MAP_WORKERS, thread_name_prefix="map")
+
+def section_spans(text, size=MAP_SECTION_CHARS):
+    """
+    Non-overlapping (start, end) spans of at most size characters that cover all of text.
+    Cut points depend on content rather than offsets, so an edit only moves the sections
+    around it: once a section is half full it ends at the next page/paragraph break, or
+    after a sentence whose hash selects it (SECTION_CUT_MASK). Sections never grow past
+    size; a sentence that would not fit starts the next one.
+    """
+    spans = []
+    start = pos = 0
+    L = len(text)
+
+    def emit(s, e):
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            spans.append((s, e))
+
+    for m in list(SENTENCE_END_RE.finditer(text)) + [None]:
+        unit_start, unit_end = pos, (m.end() if m else L)
+        if unit_end - start > size and pos > start:
+            emit(start, pos)
+            start = pos
+        while unit_end - start > size:  # one sentence longer than a section: split at spaces
+            cut = text.rfind(" ", start + size // 2, start + size)
+            cut = cut + 1 if cut != -1 else start + size
+            emit(start, cut)
+            start = cut
+        pos = unit_end
+        if m and pos - start >= size // 2:
+            sentence = " ".join(text[unit_start:m.start()].split())
+            if "\n" in m.group() or not zlib.crc32(sentence.encode('utf-8')) & SECTION_CUT_MASK:
+                emit(start, pos)
+                start = pos
+    emit(start, L)
+    return spans
+
+def map_sections(text, fn, size=MAP_SECTION_CHARS):
+    """
+    Run fn(section) for every section of text on the map pool and yield
+    (index, count, section, result) as each finishes; result is None if fn raised.
+    """
+    sections = [text[s:e] for s, e in section_spans(text, size)]
+    futures = {}
+    for i, section in enumerate(sections):
+        ctx = contextvars.copy_context()
+        futures[MAP_EXECUTOR.submit(ctx.run, fn, section)] = i
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"map section {i} error:", e)
+            result = None
+        yield i, len(sections), sections[i], result
+
+SECTION_MEMO_LOCK = threading.Lock()
+SECTION_MEMO_STATS = {"reused": 0, "recomputed": 0}
+
+def section_memo_key(task, section):
+    """Digest of the model, the map task and the whitespace-normalized section text."""
+    normalized = " ".join(section.split())
+    return hashlib.sha256(f"section\0{MODEL_NAME}\0{task}\0{normalized}".encode('utf-8')).hexdigest()
+
+def memo_section(task, fn, counts=None, dump=json.dumps, load=json.loads):
+    """
+    fn(section) behind the per-section memo, kept in the response cache tiers for
+    SECTION_MEMO_TTL. Re-uploads with small edits reuse every unchanged section and only
+    recompute the rest; None (a failed call) is never stored. counts, if given, collects
+    {task: {"reused": n, "recomputed": n}} for the response.
+    """
+    def run(section):
+        key = section_memo_key(task, section) if SECTION_MEMO_TTL > 0 else None
+        cached = llm_cache_get(key, SECTION_MEMO_TTL) if key else None
+        if cached is not None:
+            result, outcome = load(cached), "reused"
+        else:
+            result, outcome = fn(section), "recomputed"
+            if key and result is not None:
+                llm_cache_set(key, dump(result), SECTION_MEMO_TTL)
+        with SECTION_MEMO_LOCK:
+            SECTION_MEMO_STATS[outcome] += 1
+            if counts is not None:
+                counts.setdefault(task, {"reused": 0, "recomputed": 0})[outcome] += 1
+        return result
+    return run
+
+def map_document(text, fn, size=MAP_SECTION_CHARS):
+    """[(section, result)] for every section of text in document order, mapped in parallel."""
+    out = {i: (section, result) for i, _, section, result in map_sections(text, fn, size)}
+    return [out[i] for i in range(len(out))]
+
+def merge_words(word_lists, limit=50):
+    """Reduce per-section word lists: ranked by how many sections list a word, then first appearance."""
+    counts, first = Counter(), {}
+    for words in word_lists:
+        seen = set()
+        for w in words or ():
+            w = str(w).strip()
+            key = w.lower()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            counts[key] += 1
+            first.setdefault(key, (len(first), w))
+    ranked = sorted(counts, key=lambda k: (-counts[k], first[k][0]))
+    return [first[k][1] for k in ranked[:limit]]
+
+def reduce_key_points(point_lists, limit=KEY_POINTS):
+    """
+    Merge per-section mind-map points into `limit` points with one model call over the
+    points themselves; falls back to taking the sections' points in turn. A point repeated
+    (ignoring case and spacing) by several sections, or by the merge, is kept once.
+    """
+    seen = set()
+
+    def unique(pts):
+        kept = []
+        for p in pts or ():
+            p = " ".join(str(p).split())
+            key = p.casefold()
+            if key and key not in seen:
+                seen.add(key)
+                kept.append(p)
+        return kept
+
+    point_lists = [unique(pts) for pts in point_lists]
+    points = [p for pts in point_lists for p in pts]
+    if len(points) <= limit:
+        return points
+    prompt = (
+        f"These points come from consecutive sections of one document. Merge them into {limit} concise "
+        "points to create a mind map. Return the result as a JSON array of short strings.\n\n"
+        "Points:\n" + "\n".join(f"- {p}" for p in points)
+    )
+    resp = handle_gemini_prompt(text_prompt=prompt)
+    if resp and resp != GEMINI_ERROR_TEXT:
+        seen.clear()
+        merged = unique(parse_json_or_list_like(resp))
+        if merged:
+            return merged[:limit]
+    interleaved = [pts[i] for i in range(max(map(len, point_lists))) for pts in point_lists if i < len(pts)]
+    return interleaved[:limit]
+
+def simplify_section(section):
+    """Map step of /api/upload-pdf: one section rewritten for a dyslexic reader (None on error)."""
+    simp_prompt = f"Simplify the following text so a dyslexic learner can understand it. Keep short sentences.\n\nText:\n{section}"
+    resp = handle_gemini_prompt(text_prompt=simp_prompt)
+    return None if not resp or resp == GEMINI_ERROR_TEXT else resp
+
+def section_important_words(section):
+    imp_prompt = f"List the most important words (single words) from the text as a JSON array.\n\nText:\n{section}"
+    imp_resp = handle_gemini_prompt(text_prompt=imp_prompt) or '[]'
+    if imp_resp == GEMINI_ERROR_TEXT:
+        return None
+    words = re.findall(r'"([^\"]+)"|\'([^\']+)\'|\b(\w+)\b',
+imp_resp)[:50]
+    if isinstance(words, list) and words and isinstance(words[0], tuple):
+        words = [next((a for a in t if a), '') for t in words]
+    return words
+
+def important_words_of(text, counts=None):
+    mapped = map_document(text, memo_section("important_words", section_important_words, counts))
+    return merge_words(words for _, words in mapped)
+
+def join_sections(mapped):
+    """Reduce step for text: section outputs in document order, raw section text where a map step failed."""
+    return "\n\n".join(result or section for section, result in mapped)
+
+def upload_pdf_events(extracted_text):
+    """
+    Server-sent events for /api/upload-pdf with stream=true. Sections are simplified in
+    parallel and each one is sent as soon as it is ready (in completion order):
+      event: section  data: {index, sections, simplified_text}
+      event: done     data: {simplified_text, important_words, doc_id, timings_ms, sections}
+      event: error    data: {message}
+    """
+    t0 = time.perf_counter()
+    counts = {}
+    words = STAGE_EXECUTOR.submit(contextvars.copy_context().run, important_words_of, extracted_text, counts)
+    indexed = STAGE_EXECUTOR.submit(contextvars.copy_context().run, index_document, extracted_text, 'uploaded_pdf')
+    parts = {}
+    try:
+        for i, count, section, text in map_sections(extracted_text, memo_section("simplify", simplify_section, counts)):
+            parts[i] = (section, text)
+            yield sse_event("section", {"index": i, "sections": count, "simplified_text": text or section})
+        simplified = join_sections(parts[i] for i in range(len(parts)))
+        timings = {"simplify": round((time.perf_counter() - t0) * 1000, 1)}
+        try:
+            important_words = words.result()
+        except Exception as e:
+            print("upload_pdf important_words error:", e)
+            important_words = []
+        try:
+            doc_id = indexed.result()
+        except Exception as e:
+            print("upload_pdf index error:", e)
+            doc_id = None
+        timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+        yield sse_event("done", {
+            "simplified_text": simplified,
+            "important_words": important_words,
+            "doc_id": doc_id,
+            "timings_ms": timings,
+            "sections": counts,
+        })
+    except Exception as e:
+        print("upload_pdf stream error:", e)
+        traceback.print_exc()
+        yield sse_event("error", {"message": GEMINI_ERROR_TEXT})
+
 @app.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
     payload = request.get_json(force=True, silent=True) or {}
     extracted_text = payload.get('content', '')
     if not extracted_text or not extracted_text.strip():
         return jsonify(message='No content provided!'), 400
-    
-    try: 
-        simp_prompt =f"Simplify the following text so a dyslexic learner can understand it. Keep short sentences.\n\nText:\n{extracted_text[:4000]}"
-        simplified_text = handle_gemini_prompt(text_prompt=simp_prompt) or extracted_text[:4000]
-    except Exception as e:
-        print('Simplify error:', e)
-        simplified_text = extracted_text[:4000]
 
-    try:
-        imp_prompt = f"List the most important words (single words) from the text as a JSON array.\n\nText:\n{extracted_text[:4000]}"
-        imp_resp = handle_gemini_prompt(text_prompt=imp_prompt) or '[]'
-        imp_words = re.findall(r'"([^\"]+)"|\'([^\']+)\'|\b(\w+)\b',
-imp_resp)[:50]
-        if isinstance(imp_words, list) and imp_words and isinstance(imp_words[0], tuple):
-            imp_words = [next((a for a in t if a), '') for t in imp_words]
-    except Exception as e:
-        print('Imp words error:', e)
-        imp_words = []
+    if form_flag(payload.get('stream')):
+        return Response(
+            stream_with_context(upload_pdf_events(extracted_text)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+        )
+
+    # the whole document is simplified section by section on the map pool; unchanged
+    # sections of a re-upload come from the section memo
+    counts = {}
+    simplify = memo_section("simplify", simplify_section, counts)
+    results, timings = run_stages({
+        "simplify": (lambda _: join_sections(map_document(extracted_text, simplify)), (), lambda e: extracted_text),
+        "important_words": (lambda _: important_words_of(extracted_text, counts), (), lambda e: []),
+        "index": (lambda _: index_document(extracted_text, title='uploaded_pdf'), (), lambda e: None),
+    }, label="upload_pdf")
 
-    try:
-        doc_id = index_document(extracted_text, title='uploaded_pdf')
-    except Exception as e:
-        print('Indexing error:', e)
-        doc_id = None
-        
     return jsonify(
         message='PDF uploaded and simplified successfully!',
-        simplified_text=simplified_text,
-        important_words=imp_words,
-        doc_id=doc_id
+        simplified_text=results["simplify"],
+        important_words=results["important_words"],
+        doc_id=results["index"],
+        timings_ms=timings,
+        sections=counts
     ), 200
 
+@timed_stage("build_prompt")
+def ask_doc_prompt(question, selected):
+    if not selected:
+        return f"{_build_system_prompt()}\n\nUser question: {question} \n\nAnswer simply:"
+    context_text = '\n\n---\n\n'.join([s['chunk'] for s in selected])
+    MAX_CONTEXT = 3000
+    if len(context_text) > MAX_CONTEXT:
+        context_text = context_text[:MAX_CONTEXT] + '\n\n[contexttruncated]'
+    return (
+                f"{_build_system_prompt()} \n\nUse the following excerpts from the user's document to answer the question. If not present, be honest.\n\nDocument excerpts:\n{context_text} \n\nUser question: {question}\n\nAnswer succintly and simply:"
+    )
+
 @app.route('/api/ask-doc', methods=['POST'])
 def ask_doc():
     try:
@@ -354,85 +1944,146 @@ def ask_doc():
             return jsonify(message='doc_id and question are required'), 400
         
         selected = retrieve_top_k(doc_id, question, top_k=TOP_K)
-        if not selected:
-            prompt = f"{_build_system_prompt()}\n\nUser question: {question} \n\nAnswer simply:"
-        else:
-            context_text = '\n\n---\n\n'.join([s['chunk'] for s in selected])
-            MAX_CONTEXT = 3000
-            if len(context_text) > MAX_CONTEXT:
-                context_text = context_text[:MAX_CONTEXT] + '\n\n[contexttruncated]'
-            prompt = (
-                        f"{_build_system_prompt()} \n\nUse the following excerpts from the user's document to answer the question. If not present, be honest.\n\nDocument excerpts:\n{context_text} \n\nUser question: {question}\n\nAnswer succintly and simply:"
-            )
-            assistant_text = handle_gemini_prompt(text_prompt=prompt) or "Sorry, I couldn't generate an answer."
-            
-            audio_filename = None
-            if eleven and (voice_id or ELEVEN_VOICE_ID):
+        prompt = ask_doc_prompt(question, selected)
+        assistant_text = handle_gemini_prompt(text_prompt=prompt) or "Sorry, I couldn't generate an answer."
+
+        audio_filename = None
+        if eleven and (voice_id or ELEVEN_VOICE_ID):
+            if form_flag(data.get('stream')):
+                audio_filename = defer_tts(assistant_text, voice_id=voice_id)
+            else:
                 audio_filename = tts_generate_and_save(assistant_text, voice_id=voice_id)
-                return jsonify(response=assistant_text, audio_filename=audio_filename, evidence=selected), 200
+        return jsonify(response=assistant_text, audio_filename=audio_filename, evidence=selected), 200
     except Exception as e:
         print('ask-doc error:', e)
         traceback.print_exc()
         return jsonify(message='Error generating response'), 500
     
-def imp_words(text):
+def imp_words(text, counts=None):
     """
     Return a list of important single-word tokens from text.
     """
     if not text:
         return []
-    prompt = (
-        "List the single most important words from the text as a JSON array of words. "
-        "Return only the JSON array.\n\n"
-        f"Text:\n{text[:4000]}"
-    )
-    try:
+
+    def section_words(section):
+        prompt = (
+            "List the single most important words from the text as a JSON array of words. "
+            "Return only the JSON array.\n\n"
+            f"Text:\n{section}"
+        )
         resp = handle_gemini_prompt(text_prompt=prompt) or '[]'
-        return parse_json_or_list_like(resp)
+        return None if resp == GEMINI_ERROR_TEXT else parse_json_or_list_like(resp)
+
+    try:
+        mapped = map_document(text, memo_section("notes_words", section_words, counts))
+        return merge_words(words for _, words in mapped)
     except Exception as e:
         print("imp_words error:", e)
         return []
 
-def generate_notes(text):
+def generate_notes(text, counts=None):
     """
-    Return simplified notes (string).
+    Return simplified notes (string), one map call per section of the text.
     """
     if not text:
         return ""
-    prompt = (
-        "Generate short, dyslexic-friendly notes from the text. Use short sentences and headings where helpful. Return plain text.\n\n"
-        f"Text:\n{text[:8000]}"
-    )
     try:
-        resp = handle_gemini_prompt(text_prompt=prompt) or ""
-        # strip bold markers if any
-        resp = resp.replace('**', '').replace('*', '')
-        return resp
+        return join_sections(map_document(text, memo_section("notes", section_notes, counts)))
     except Exception as e:
         print("generate_notes error", e)
-        return text[:4000]
+        return text
+
+def section_notes(section):
+    prompt = (
+        "Generate short, dyslexic-friendly notes from the text. Use short sentences and headings where helpful. Return plain text.\n\n"
+        f"Text:\n{section}"
+    )
+    resp = handle_gemini_prompt(text_prompt=prompt) or ""
+    if resp == GEMINI_ERROR_TEXT:
+        return None
+    # strip bold markers if any
+    return resp.replace('**', '').replace('*', '')
 
-def extract_key_points_from_gemini(text):
+def extract_key_points_from_gemini(text, counts=None):
     """
     Return a list of concise key points suitable for a mind map.
-    The model is asked to return a JSON array; we parse it.
+    The model is asked to return a JSON array per section; the sections' points are merged
+    by reduce_key_points.
     """
     if not text:
         return []
-    prompt = (
-        "Provide 5 concise points to create a mind map. Return the result as a JSON array of short strings.\n\n"
-        f"Text:\n{text[:8000]}"
-    )
-    try:
+
+    def section_points(section):
+        prompt = (
+            f"Provide {KEY_POINTS} concise points to create a mind map. Return the result as a JSON array of short strings.\n\n"
+            f"Text:\n{section}"
+        )
         resp = handle_gemini_prompt(text_prompt=prompt) or "[]"
-        pts = parse_json_or_list_like(resp)
-        # ensure returned is list of strings
-        return [str(p).strip() for p in pts if str(p).strip()]
+        return None if resp == GEMINI_ERROR_TEXT else parse_json_or_list_like(resp)
+
+    try:
+        mapped = map_document(text, memo_section("key_points", section_points, counts))
+        return reduce_key_points([pts for _, pts in mapped])
     except Exception as e:
         print("extract_key_points_from_gemini error:", e)
         traceback.print_exc()
         return []
     
+class PdfNotes(BaseModel):
+    """Structured result of the consolidated notes call."""
+    notes: str
+    important_words: list[str]
+    important_points: list[str]
+
+def generate_structured_notes(text, counts=None):
+    """
+    Notes, important words and mind-map points from one Gemini call per section with a
+    declared response schema, reduced into a single PdfNotes. Returns None when every section
+    failed so callers can fall back to the one-call-per-field path; a section that fails on
+    its own contributes its plain notes.
+    """
+    if not text:
+        return None
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=PdfNotes,
+    )
+
+    def section_structured(section):
+        prompt = (
+            "From the text below, produce:\n"
+            "- notes: short, dyslexic-friendly notes. Use short sentences and headings where helpful. Plain text.\n"
+            "- important_words: the single most important words (one word each).\n"
+            f"- important_points: {KEY_POINTS} concise points to create a mind map.\n\n"
+            f"Text:\n{section}"
+        )
+        resp = gemini_generate_text([prompt], config=config, validate=PdfNotes.model_validate_json)
+        result = PdfNotes.model_validate_json(resp)
+        # strip bold markers if any, as generate_notes does
+        result.notes = result.notes.replace('**', '').replace('*', '')
+        return result
+
+    try:
+        mapped = map_document(text, memo_section(
+            "structured", section_structured, counts,
+            dump=lambda r: r.model_dump_json(), load=PdfNotes.model_validate_json,
+        ))
+    except Exception as e:
+        print("generate_structured_notes error:", e)
+        return None
+    parts = [result for _, result in mapped if result is not None]
+    if not parts:
+        return None
+    return PdfNotes(
+        notes=join_sections(
+            (section, result.notes if result else memo_section("notes", section_notes, counts)(section))
+            for section, result in mapped
+        ),
+        important_words=merge_words(p.important_words for p in parts),
+        important_points=reduce_key_points([p.important_points for p in parts]),
+    )
+
 def parse_json_or_list_like(resp_text):
     """
     Try to parse a response that may be:
@@ -479,9 +2130,30 @@ def upload_pdf_notes():
             print("No text extracted from PDF!")
             return jsonify(message='Failed to extract text from the PDF!'), 400
 
-        simplified_text = generate_notes(extracted_text)
-        important_words = imp_words(simplified_text)  # returns list
-        important_points = extract_key_points_from_gemini(simplified_text)  # returns list
+        mode = request.json.get('mode') or NOTES_MODE
+        structured = None
+        timings = {}
+        counts = {}
+        if mode == 'structured':
+            t0 = time.perf_counter()
+            structured = generate_structured_notes(extracted_text, counts)
+            timings["structured"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        if structured:
+            simplified_text = structured.notes
+            important_words = structured.important_words
+            important_points = structured.important_points
+        else:
+            # words and mind-map points only depend on the notes, so they run side by side
+            results, stage_timings = run_stages({
+                "notes": (lambda r: generate_notes(extracted_text, counts), (), None),
+                "important_words": (lambda r: imp_words(r["notes"], counts), ("notes",), lambda e: []),
+                "important_points": (lambda r: extract_key_points_from_gemini(r["notes"], counts), ("notes",), lambda e: []),
+            }, label="upload_pdf_notes")
+            timings.update(stage_timings)
+            simplified_text = results["notes"] or ""
+            important_words = results["important_words"]  # returns list
+            important_points = results["important_points"]  # returns list
 
         # final sanitize: ensure lists of strings
         important_words_list = [str(w).strip() for w in important_words if str(w).strip()]
@@ -491,7 +2163,9 @@ def upload_pdf_notes():
             message='PDF uploaded and simplified successfully!',
             simplified_text=simplified_text,
             important_words=important_words_list,
-            important_points=important_points_list
+            important_points=important_points_list,
+            timings_ms=timings,
+            sections=counts
         ), 200
 
     except Exception as e:
@@ -499,68 +2173,737 @@ def upload_pdf_notes():
         traceback.print_exc()
         return jsonify(message='Error processing PDF notes'), 500
     
-def save_file(file, prefix):
-    ensure_upload_dir()
-    filename = secure_filename(f"{prefix}_{file.filename}")
-    filepath = UPLOAD_FOLDER / filename
-    file.save(str(filepath))
+def sniff_mime(data, fallback="application/octet-stream"):
+    """Media type from the leading bytes of a file rather than its name."""
+    head = bytes(data[:16])
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "audio/mpeg"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "audio/webm"
+    if head[4:8] == b"ftyp":
+        return "audio/mp4"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    return fallback
+
+@timed_stage("persist_upload")
+def persist_upload(data, prefix, filename):
+    """Write an upload to the storage manager with a unique name; returns the path."""
+    name = secure_filename(f"{prefix}_{uuid4().hex[:12]}_{filename or 'upload'}")
+    filepath = storage_path(name, create=True)
+    with open(filepath, "wb") as f:
+        f.write(data)
+    storage_add(name, len(data))
     return str(filepath)
 
-def handle_gemini_prompt(file_path=None, text_prompt=None):
+def _ink_bbox(gray):
+    """(left, top, right, bottom) of the dark strokes in a grayscale image, or None if there is no clear ink."""
+    small = gray.copy()
+    small.thumbnail((IMAGE_ANALYSIS_SIDE, IMAGE_ANALYSIS_SIDE))
+    px = np.asarray(small, dtype=np.uint8)
+
+    # Otsu threshold, accepted only if it separates ink clearly darker than the paper
+    hist = np.bincount(px.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    m0 = np.cumsum(hist * levels)
+    w1 = w0[-1] - w0
+    between = np.zeros(256)
+    ok = (w0 > 0) & (w1 > 0)
+    between[ok] = (m0[ok] * w1[ok] - (m0[-1] - m0[ok]) * w0[ok]) ** 2 / (w0[ok] * w1[ok])
+    threshold = min(int(between.argmax()), int(np.percentile(px, 90)) - IMAGE_INK_CONTRAST)
+    ys, xs = np.nonzero(px <= threshold)
+    if len(ys) == 0:
+        return None
+
+    # ignore isolated specks at the edges of the ink
+    y0, y1 = np.percentile(ys, [0.5, 99.5])
+    x0, x1 = np.percentile(xs, [0.5, 99.5])
+    pad_y = (y1 - y0 + 1) * IMAGE_INK_MARGIN + 2
+    pad_x = (x1 - x0 + 1) * IMAGE_INK_MARGIN + 2
+    sx, sy = gray.width / small.width, gray.height / small.height
+    return (
+        max(0, int((x0 - pad_x) * sx)), max(0, int((y0 - pad_y) * sy)),
+        min(gray.width, int(math.ceil((x1 + 1 + pad_x) * sx))), min(gray.height, int(math.ceil((y1 + 1 + pad_y) * sy))),
+    )
+
+@timed_stage("normalize_image")
+def normalize_image(part):
+    """
+    Shrink a (bytes, mime_type) photo or drawing of writing before OCR: grayscale on white,
+    cropped to the ink, at most IMAGE_MAX_SIDE on the longest side, re-encoded as JPEG (or PNG
+    for non-JPEG sources when that is smaller). Returns the part unchanged if it isn't a readable image.
+    """
+    data, mime = part
+    if not IMAGE_NORMALIZE or not mime.startswith("image/"):
+        return part
     try:
-        parts = []
+        img = Image.open(io.BytesIO(data))
+        # JPEGs can decode at a reduced scale; keep twice the target so a crop still has detail
+        img.draft("L", (IMAGE_MAX_SIDE * 2, IMAGE_MAX_SIDE * 2))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+            # canvas drawings are often transparent: put the strokes on white paper
+            rgba = img.convert("RGBA")
+            img = Image.new("RGBA", rgba.size, "white")
+            img.alpha_composite(rgba)
+        gray = img.convert("L")
+
+        bbox = _ink_bbox(gray)
+        if bbox:
+            gray = gray.crop(bbox)
+        gray = ImageOps.autocontrast(gray, cutoff=1)
+        gray.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+
+        jpeg = io.BytesIO()
+        gray.save(jpeg, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        if mime == "image/jpeg":
+            return jpeg.getvalue(), "image/jpeg"
+        # drawings and scans are often smaller (and sharper) as lossless PNG
+        png = io.BytesIO()
+        gray.save(png, "PNG")
+        if png.tell() <= jpeg.tell():
+            return png.getvalue(), "image/png"
+        return jpeg.getvalue(), "image/jpeg"
+    except Exception as e:
+        print("Image normalization error:", e)
+        traceback.print_exc()
+        return part
 
-        # Attach file if provided
-        if file_path:
-            with open(file_path, "rb") as f:
-                data = f.read()
-
-            if file_path.lower().endswith((".png", ".jpg", ".jpeg")):
-                mime = "image/jpeg"
-            elif file_path.lower().endswith(".wav"):
-                mime = "audio/wav"
-            elif file_path.lower().endswith(".mp3"):
-                mime = "audio/mpeg"
-            else:
-                mime = "application/octet-stream"
+@timed_stage("read_upload")
+def upload_part(file, prefix):
+    """
+    (bytes, mime_type) for a request upload, read straight from its spooled stream.
+    Written to disk as well only when UPLOAD_PERSIST is set.
+    """
+    file.stream.seek(0)
+    data = file.stream.read()
+    mime = sniff_mime(data, file.mimetype or "application/octet-stream")
+    if UPLOAD_PERSIST:
+        persist_upload(data, prefix, file.filename)
+    return data, mime
+
+class MemoryResponseCache:
+    """Bounded LRU of (expires_at, text) entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, text, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, text)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskResponseCache:
+    """
+    One small JSON file per key, shared by every worker pointing at the same directory.
+    A file's mtime is its expiry time, so the sweep (in the background every sweep_seconds,
+    or as soon as the directory may be over max_bytes) needs no reads: it deletes expired
+    files, then the ones expiring soonest down to STORAGE_LOW_WATER of max_bytes.
+    """
 
-            parts.append(
-                types.Part.from_bytes(
-                    data=data,
-                    mime_type=mime
-                )
+    def __init__(self, directory, max_bytes, sweep_seconds):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.sweep_seconds = sweep_seconds
+        self.lock = threading.Lock()
+        self.written = 0  # bytes stored since the last sweep
+        self.last_sweep = float("-inf")
+        self.sweeping = False
+        self.stats = {"files": 0, "bytes": 0, "sweeps": 0, "evicted_expired": 0, "evicted_quota": 0}
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return None
+        return entry.get("text")
+
+    def set(self, key, text, ttl):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{uuid4().hex}.tmp")
+        expires_at = time.time() + ttl
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": expires_at, "text": text}, f)
+            size = f.tell()
+        os.utime(tmp, (expires_at, expires_at))
+        os.replace(tmp, path)
+        self._maybe_sweep(size)
+
+    def _maybe_sweep(self, size):
+        with self.lock:
+            self.written += size
+            due = (
+                time.monotonic() - self.last_sweep >= self.sweep_seconds
+                or self.stats["bytes"] + self.written > self.max_bytes
             )
+            if self.sweeping or not due:
+                return
+            self.sweeping = True
+        threading.Thread(target=self.sweep, name="llm-cache-sweeper", daemon=True).start()
+
+    def sweep(self, now=None):
+        """Delete expired entries (and stale temp files), then the soonest-expiring ones while over max_bytes."""
+        now = time.time() if now is None else now
+        try:
+            with self.lock:
+                self.written = 0
+            entries, removed = [], []
+            for shard in (os.scandir(self.directory) if self.directory.is_dir() else ()):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(".tmp"):
+                        if now - st.st_ctime > STORAGE_TTLS["partial"]:
+                            removed.append((entry.path, "evicted_expired"))
+                    elif st.st_mtime < now:
+                        removed.append((entry.path, "evicted_expired"))
+                    else:
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+            files, total = len(entries), sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes * STORAGE_LOW_WATER:
+                        break
+                    removed.append((path, "evicted_quota"))
+                    files -= 1
+                    total -= size
+            for path, reason in removed:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                self.stats[reason] += 1
+            with self.lock:
+                self.stats["files"], self.stats["bytes"] = files, total
+            return [path for path, _ in removed]
+        except Exception as e:
+            print("LLM cache sweep error:", e)
+            traceback.print_exc()
+            return []
+        finally:
+            with self.lock:
+                self.sweeping = False
+                self.last_sweep = time.monotonic()
+                self.stats["sweeps"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, max_bytes=self.max_bytes)
+
+
+LLM_CACHE_TIERS = [MemoryResponseCache(LLM_CACHE_MAX_ENTRIES)]
+if LLM_CACHE_DIR:
+    LLM_CACHE_TIERS.append(DiskResponseCache(LLM_CACHE_DIR, LLM_CACHE_DIR_MAX_BYTES, LLM_CACHE_SWEEP_SECONDS))
+LLM_CACHE_STATS = {"hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one. The first caller runs fn; callers
+    arriving while it is in flight wait up to timeout seconds for the same result, or get
+    the same exception. Nothing is kept once the call finishes (caching is the caller's job).
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.calls = {}  # key -> [done event, result, exception]
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = [threading.Event(), None, None]
+            self.stats["calls" if leader else "coalesced"] += 1
+        if not leader:
+            if not call[0].wait(self.timeout):
+                with self.lock:
+                    self.stats["timeouts"] += 1
+                raise TimeoutError(f"in-flight call still running after {self.timeout} s")
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            with self.lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, in_flight=len(self.calls))
+
+
+GEMINI_FLIGHTS = SingleFlight(SINGLE_FLIGHT_TIMEOUT)
+TTS_FLIGHTS = SingleFlight(SINGLE_FLIGHT_TIMEOUT)
+
+
+def error_status(exc):
+    """HTTP status carried by a vendor SDK error (genai: .code, ElevenLabs/httpx: .status_code), else None."""
+    for obj in (exc, getattr(exc, "response", None)):
+        for attr in ("code", "status_code"):
+            status = getattr(obj, attr, None)
+            if isinstance(status, int):
+                return status
+    return None
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the error's response, if there is one."""
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def outbound_priority():
+    if has_request_context() and request.endpoint:
+        return OUTBOUND_PRIORITIES.get(request.endpoint, OUTBOUND_DEFAULT_PRIORITY)
+    return OUTBOUND_DEFAULT_PRIORITY
+
+
+class OutboundScheduler:
+    """
+    Gate for one vendor's calls: at most `limit` in flight and a token bucket of `rate`
+    calls per second. Waiting calls are admitted by priority, then arrival. A 429 halves
+    the limit and empties the bucket; the limit grows back by one after `limit` successes
+    in a row. Throttling, 5xx and connection errors are retried with full-jitter
+    exponential backoff, sleeping outside the gate.
+    """
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    # the SDKs' own connection/timeout errors don't derive from the builtins:
+    # google-genai raises requests', ElevenLabs (sync and async) httpx's
+    RETRY_ERRORS = (
+        ConnectionError, TimeoutError,
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+        httpx.TransportError,
+    )
+
+    def __init__(self, name, concurrency, rate, retries=OUTBOUND_RETRIES, backoff_base=OUTBOUND_BACKOFF_BASE,
+                 backoff_max=OUTBOUND_BACKOFF_MAX, queue_timeout=OUTBOUND_QUEUE_TIMEOUT):
+        self.name = name
+        self.max_limit = self.limit = max(1, concurrency)
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.successes = 0
+        self.waiting = []  # heap of (priority, arrival)
+        self.arrivals = count()
+        self.cond = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "queue_timeouts": 0, "wait_ms": 0.0}
+
+    def acquire(self, priority=OUTBOUND_DEFAULT_PRIORITY):
+        ticket = (priority, next(self.arrivals))
+        t0 = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.rate > 0:
+                        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+                    self.refilled = now
+                    wait = None
+                    if self.waiting[0] == ticket and self.in_flight < self.limit:
+                        if self.rate <= 0 or self.tokens >= 1:
+                            break
+                        wait = (1 - self.tokens) / self.rate
+                    remaining = t0 + self.queue_timeout - now
+                    if remaining <= 0:
+                        self.stats["queue_timeouts"] += 1
+                        raise TimeoutError(f"{self.name}: no outbound slot within {self.queue_timeout} s")
+                    self.cond.wait(remaining if wait is None else min(wait, remaining))
+                if self.rate > 0:
+                    self.tokens -= 1
+                self.in_flight += 1
+                self.stats["calls"] += 1
+                self.stats["wait_ms"] += (time.monotonic() - t0) * 1000
+                observe_stage(f"{self.name}_queue", time.monotonic() - t0)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+
+    def release(self, ok, status=None):
+        with self.cond:
+            self.in_flight -= 1
+            if status == 429:
+                self.stats["throttled"] += 1
+                self.limit = max(1, self.limit // 2)
+                self.tokens = 0.0
+                self.successes = 0
+            elif ok:
+                self.successes += 1
+                if self.limit < self.max_limit and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+    def retry_delay(self, exc, attempt):
+        """Backoff before the next attempt; re-raises exc when it is not retryable or attempts are used up."""
+        status = error_status(exc)
+        retryable = status in self.RETRY_STATUSES or isinstance(exc, self.RETRY_ERRORS)
+        with self.cond:
+            if not retryable or attempt >= self.retries:
+                self.stats["failures"] += 1
+                raise exc
+            self.stats["retries"] += 1
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return max(retry_after(exc), random.uniform(0, ceiling))
+
+    def call(self, fn, priority=None):
+        """fn() once a slot is free, retried as above."""
+        if priority is None:
+            priority = outbound_priority()
+        for attempt in count():
+            self.acquire(priority)
+            t0 = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(False, error_status(e))
+                delay = self.retry_delay(e, attempt)
+            else:
+                self.release(True)
+                return result
+            finally:
+                observe_stage(self.name, time.perf_counter() - t0)
+            time.sleep(delay)
+
+    def stream(self, make_iter, priority=None):
+        """
+        Yield from make_iter() holding a slot until the stream ends. Failures before the first
+        item (where vendors report throttling) are retried; later ones propagate.
+        """
+        if priority is None:
+            priority = outbound_priority()
+        for attempt in count():
+            self.acquire(priority)
+            t0 = time.perf_counter()
+            try:
+                it = iter(make_iter())
+                first = next(it, None)
+            except Exception as e:
+                self.release(False, error_status(e))
+                observe_stage(f"{self.name}_first_chunk", time.perf_counter() - t0)
+                delay = self.retry_delay(e, attempt)
+                time.sleep(delay)
+                continue
+            observe_stage(f"{self.name}_first_chunk", time.perf_counter() - t0)
+            try:
+                if first is not None:
+                    yield first
+                    yield from it
+            finally:
+                self.release(True)
+                observe_stage(f"{self.name}_stream", time.perf_counter() - t0)
+            return
+
+    def snapshot(self):
+        with self.cond:
+            return dict(self.stats, wait_ms=round(self.stats["wait_ms"], 1), limit=self.limit,
+                        in_flight=self.in_flight, queued=len(self.waiting))
+
+
+OUTBOUND = {
+    "gemini": OutboundScheduler("gemini", GEMINI_CONCURRENCY, GEMINI_RATE),
+    "eleven": OutboundScheduler("eleven", ELEVEN_CONCURRENCY, ELEVEN_RATE),
+}
+
+def llm_cache_ttl():
+    """TTL for the current endpoint, falling back to LLM_CACHE_DEFAULT_TTL outside a request."""
+    if has_request_context() and request.endpoint:
+        return LLM_CACHE_TTLS.get(request.endpoint, LLM_CACHE_DEFAULT_TTL)
+    return LLM_CACHE_DEFAULT_TTL
+
+def llm_cache_key(model, contents):
+    """Digest of the model name, prompt text and the bytes/MIME type of any attached file."""
+    h = hashlib.sha256(model.encode('utf-8'))
+    for item in contents:
+        if isinstance(item, tuple):
+            data, mime = item
+            h.update(b"\0file\0" + mime.encode('utf-8') + b"\0" + hashlib.sha256(data).digest())
+        else:
+            h.update(b"\0text\0" + str(item).encode('utf-8'))
+    return h.hexdigest()
+
+def llm_cache_get(key, ttl):
+    for i, tier in enumerate(LLM_CACHE_TIERS):
+        try:
+            text = tier.get(key)
+        except Exception as e:
+            print("LLM cache read error:", e)
+            continue
+        if text is not None:
+            # promote disk hits into the faster tiers
+            for upper in LLM_CACHE_TIERS[:i]:
+                upper.set(key, text, ttl)
+            return text
+    return None
+
+def llm_cache_set(key, text, ttl):
+    for tier in LLM_CACHE_TIERS:
+        try:
+            tier.set(key, text, ttl)
+        except Exception as e:
+            print("LLM cache write error:", e)
+
+def llm_cache_lookup(model, contents, cache_ttl=None, config=None):
+    """
+    Resolve the TTL and cache key for a Gemini call and check the cache.
+    Returns (key, ttl, cached_text); key is None when caching is off for this call.
+    """
+    if cache_ttl is None:
+        cache_ttl = llm_cache_ttl()
+    if cache_ttl <= 0:
+        LLM_CACHE_STATS["bypassed"] += 1
+        return None, cache_ttl, None
+    key = llm_cache_key(model, contents + [repr(config)] if config else contents)
+    cached = llm_cache_get(key, cache_ttl)
+    LLM_CACHE_STATS["hits" if cached is not None else "misses"] += 1
+    return key, cache_ttl, cached
+
+def llm_cache_store(key, text, ttl):
+    """Cache a successful answer; error replies and empty text are never stored."""
+    if key and text and text != GEMINI_ERROR_TEXT:
+        llm_cache_set(key, text, ttl)
+        LLM_CACHE_STATS["stores"] += 1
+
+def gemini_parts(contents):
+    return [
+        types.Part.from_bytes(data=item[0], mime_type=item[1]) if isinstance(item, tuple) else item
+        for item in contents
+    ]
+
+def gemini_request_bytes(contents):
+    return sum(len(item[0]) if isinstance(item, tuple) else len(str(item).encode('utf-8')) for item in contents)
+
+def gemini_generate_content(contents, model=MODEL_NAME, config=None, key=None):
+    """
+    client.models.generate_content for contents as used by gemini_generate_text. Concurrent
+    identical requests (same model, contents and config) share one upstream call and response.
+    """
+    if key is None:
+        key = llm_cache_key(model, contents + [repr(config)] if config else contents)
+
+    def upstream():
+        response = OUTBOUND["gemini"].call(lambda: client.models.generate_content(
+            model=model,
+            contents=gemini_parts(contents),
+            config=config,
+        ))
+        count_upstream("gemini", gemini_request_bytes(contents), len((response.text or "").encode('utf-8')))
+        return response
+
+    return GEMINI_FLIGHTS.do(key, upstream)
+
+def gemini_generate_text(contents, model=MODEL_NAME, cache_ttl=None, config=None, validate=None):
+    """
+    Call Gemini and return the stripped response text, serving repeats from the response cache.
+    contents items are prompt strings or (bytes, mime_type) tuples for attached files.
+    cache_ttl=None uses the current endpoint's TTL; 0 skips the cache. Errors propagate and are never cached.
+    config is passed through to generate_content; validate(text), if given, must pass before caching.
+    """
+    key, ttl, cached = llm_cache_lookup(model, contents, cache_ttl, config)
+    if cached is not None:
+        return cached
+
+    response = gemini_generate_content(contents, model=model, config=config, key=key)
+    text = (response.text or "").strip()
+    if validate:
+        validate(text)
+
+    llm_cache_store(key, text, ttl)
+    return text
+
+def gemini_stream_text(contents, model=MODEL_NAME, cache_ttl=None):
+    """
+    Streaming counterpart of gemini_generate_text: yields text pieces as Gemini produces them.
+    A cached answer is yielded in one piece; a completed stream is cached like a normal call.
+    """
+    key, ttl, cached = llm_cache_lookup(model, contents, cache_ttl)
+    if cached is not None:
+        yield cached
+        return
+
+    pieces = []
+    chunks = OUTBOUND["gemini"].stream(
+        lambda: client.models.generate_content_stream(model=model, contents=gemini_parts(contents))
+    )
+    try:
+        for chunk in chunks:
+            piece = chunk.text or ""
+            if piece:
+                pieces.append(piece)
+                yield piece
+    finally:
+        count_upstream("gemini", gemini_request_bytes(contents), sum(len(p.encode('utf-8')) for p in pieces))
+
+    llm_cache_store(key, "".join(pieces).strip(), ttl)
+
+def file_part(file_path):
+    """(bytes, mime_type) for a file on disk, ready for gemini_generate_text."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return data, sniff_mime(data)
+
+def handle_gemini_prompt(file_path=None, text_prompt=None, cache_ttl=None, part=None):
+    """part is an in-memory (bytes, mime_type) attachment, e.g. from upload_part."""
+    try:
+        contents = []
+
+        # Attach file if provided
+        if part:
+            contents.append(part)
+        elif file_path:
+            contents.append(file_part(file_path))
 
         # Add text prompt
         if text_prompt:
-            parts.append(text_prompt)
-
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=parts,
-        )
+            contents.append(text_prompt)
 
-        return response.text.strip()
+        return gemini_generate_text(contents, cache_ttl=cache_ttl)
 
     except Exception as e:
         print("Gemini Error:", e)
         traceback.print_exc()
-        return "Sorry, I couldn't process that request."
+        return GEMINI_ERROR_TEXT
+
+
+AUDIO_ETAGS = OrderedDict()  # (name, size, inode) -> sha256 hex
+AUDIO_ETAGS_LOCK = threading.Lock()
+
+def audio_etag(name, path):
+    """Content hash of a stored file, computed once per version of it (files are replaced, never rewritten)."""
+    st = path.stat()
+    key = (name, st.st_size, st.st_ino)
+    with AUDIO_ETAGS_LOCK:
+        tag = AUDIO_ETAGS.get(key)
+        if tag is not None:
+            AUDIO_ETAGS.move_to_end(key)
+            return tag
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    tag = digest.hexdigest()[:32]
+    with AUDIO_ETAGS_LOCK:
+        AUDIO_ETAGS[key] = tag
+        while len(AUDIO_ETAGS) > AUDIO_ETAG_MEMO:
+            AUDIO_ETAGS.popitem(last=False)
+    return tag
 
-    
 @app.route("/api/audio/<path:filename>", methods=["GET"])
 def serve_audio(filename):
-    """Serve audio files from uploads safely."""
-    # Prevent path traversal
-    safe_path = safe_join(str(UPLOAD_FOLDER), filename)
-    if not safe_path:
-        abort(404)
-    full_path = Path(safe_path)
-    if not full_path.exists():
+    """
+    Serve audio files from uploads safely, with content-hash ETags (If-None-Match -> 304)
+    and byte ranges for seeking. TTS files are immutable; anything else is revalidated.
+    """
+    # Prevent path traversal: only plain names, resolved to their storage shard
+    if not filename or secure_filename(filename) != filename or filename.endswith(".pending"):
         abort(404)
-    # Use send_file with proper mimetype
-    return send_file(str(full_path), mimetype="audio/mpeg")
+    full_path = storage_path(filename)
+    if not storage_touch(filename):
+        pending = pending_tts(filename)
+        if not pending:
+            abort(404)
+        try:
+            return stream_audio_response(tts_stream(*pending), filename)
+        except Exception as e:
+            print("ElevenLabs TTS stream error:", e)
+            traceback.print_exc()
+            abort(502)
+    immutable = filename.startswith("tts_")
+    response = send_file(
+        full_path,
+        mimetype=mimetypes.guess_type(filename)[0] or "audio/mpeg",
+        conditional=True,
+        etag=audio_etag(filename, full_path),
+        max_age=AUDIO_MAX_AGE if immutable else 0,
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
     
+def ask_inputs(user_text, user_image, user_audio):
+    """(upload to attach, its filename prefix, prompt) for /api/ask; prompt is None for no input."""
+    if user_text and user_image:
+        return user_image, "user_image", f"Answer clearly and simply for a dyslexic person: '{user_text}'"
+    if user_text:
+        return None, None, f"Answer clearly and simply for a dyslexic person: '{user_text}'"
+    if user_image:
+        return user_image, "user_image", "Describe the image and answer simply for a dyslexic person."
+    if user_audio:
+        return user_audio, "user_audio", "Transcribe or answer the question asked in this audio, keep the reply short and dyslexic-friendly."
+    return None, None, None
+
 @app.route("/api/ask", methods=["POST"])
 def ask():
     """
@@ -568,6 +2911,8 @@ def ask():
     - text (optional)
     - image (optional file)
     - audio (optional file)  <-- will be sent to Gemini as a file (Gemini can accept uploaded audio)
+    - stream (optional)  <-- "true" to return before synthesis; /api/audio/<name> then streams it
+    - pipeline (optional)  <-- "true" for a text/event-stream of per-sentence audio (see pipelined_speech_response)
     Returns JSON: {response: text, audio_filename: "<name>.mp3"}
     """
     try:
@@ -575,24 +2920,24 @@ def ask():
         user_image = request.files.get("image") if "image" in request.files else None
         user_audio = request.files.get("audio") if "audio" in request.files else None
 
-        # Build prompt / call Gemini
-        if user_text and user_image:
-            image_path = save_file(user_image, "user_image")
-            prompt = f"Answer clearly and simply for a dyslexic person: '{user_text}'"
-            g_response = handle_gemini_prompt(file_path=image_path, text_prompt=prompt)
-        elif user_text:
-            prompt = f"Answer clearly and simply for a dyslexic person: '{user_text}'"
-            g_response = handle_gemini_prompt(text_prompt=prompt)
-        elif user_image:
-            image_path = save_file(user_image, "user_image")
-            prompt = "Describe the image and answer simply for a dyslexic person."
-            g_response = handle_gemini_prompt(file_path=image_path, text_prompt=prompt)
-        elif user_audio:
-            audio_path = save_file(user_audio, "user_audio")
-            prompt = "Transcribe or answer the question asked in this audio, keep the reply short and dyslexic-friendly."
-            g_response = handle_gemini_prompt(file_path=audio_path, text_prompt=prompt)
-        else:
+        # Build prompt
+        upload, prefix, prompt = ask_inputs(user_text, user_image, user_audio)
+        if prompt is None:
             return jsonify(message="No valid input provided!"), 400
+        part = upload_part(upload, prefix) if upload else None
+
+        # Pipelined mode: speak each sentence while Gemini is still generating the rest
+        if form_flag(request.form.get("pipeline")):
+            contents = ([part] if part else []) + [prompt]
+            return pipelined_speech_response(contents)
+
+        # Call Gemini
+        g_response = handle_gemini_prompt(part=part, text_prompt=prompt)
+
+        # Streaming mode: hand out the filename now, audio is synthesized while /api/audio streams it
+        if form_flag(request.form.get("stream")):
+            return jsonify(message="Response generated", response=g_response,
+                           audio_filename=defer_tts(g_response), audio_streaming=True), 200
 
         # Generate TTS for the bot reply
         audio_filename = tts_generate_and_save(g_response)
@@ -607,50 +2952,117 @@ def ask():
         traceback.print_exc()
         return jsonify(message="Error generating response"), 500
     
-total_questions = 0
-correct_answers = 0
+class MemoryScoreStore:
+    """session_id -> [total, correct, updated_at] in this process only."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def record(self, session_id, correct):
+        with self.lock:
+            entry = self.sessions.setdefault(session_id, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += int(correct)
+            entry[2] = time.time()
+
+    def finish(self, session_id):
+        """(total, correct) for the session, which is then cleared."""
+        with self.lock:
+            cutoff = time.time() - self.ttl
+            for sid in [sid for sid, e in self.sessions.items() if e[2] < cutoff]:
+                del self.sessions[sid]
+            total, correct, _ = self.sessions.pop(session_id, (0, 0, 0.0))
+            return total, correct
+
+
+class SqliteScoreStore:
+    """
+    Scores in a SQLite database in WAL mode, so every worker process on the host sees
+    the same sessions. Each update is one UPSERT (atomic, no read-modify-write); the
+    busy timeout absorbs writer contention.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        self.write_lock = threading.Lock()  # threads queue here instead of in SQLite's sleeping busy handler
+
+    def _conn(self):
+        if getattr(self.local, "pid", None) != os.getpid():  # one connection per thread, never across a fork
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "session_id TEXT PRIMARY KEY, total INTEGER NOT NULL, correct INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return self.local.conn
+
+    def record(self, session_id, correct):
+        conn = self._conn()
+        with self.write_lock:
+            conn.execute(
+                "INSERT INTO scores (session_id, total, correct, updated_at) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET "
+                "total = total + 1, correct = correct + excluded.correct, updated_at = excluded.updated_at",
+                (session_id, int(correct), time.time()),
+            )
+
+    def finish(self, session_id):
+        """(total, correct) for the session, which is then cleared."""
+        conn = self._conn()
+        with self.write_lock:
+            # SELECT then DELETE in one write transaction (DELETE ... RETURNING needs SQLite 3.35+)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT total, correct FROM scores WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                conn.execute("DELETE FROM scores WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM scores WHERE updated_at < ?", (time.time() - self.ttl,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return tuple(row) if row else (0, 0)
+
+
+SCORES = SqliteScoreStore(SCORE_DB, SCORE_SESSION_TTL) if SCORE_STORE == "sqlite" else MemoryScoreStore(SCORE_SESSION_TTL)
+
+def score_session_id():
+    """Test session of the request (form, JSON or X-Session-Id), or None: callers answer 400 rather than mix learners."""
+    payload = request.get_json(silent=True) if request.is_json else None
+    session_id = (
+        request.form.get("session_id")
+        or (payload or {}).get("session_id")
+        or request.headers.get("X-Session-Id")
+    )
+    return str(session_id)[:128] if session_id else None
 
 def allowed_file(filename):
     """Check if the uploaded file has a valid extension."""
     allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def check_spelling_from_image(img_path, word):
-    global correct_answers
-    global total_questions
-
+def check_spelling_from_image(image, word):
+    """image is a (bytes, mime_type) pair from upload_part."""
     try:
-        # Read image bytes
-        with open(img_path, "rb") as f:
-            image_bytes = f.read()
-
-        # Build image part correctly
-        image_part = types.Part.from_bytes(
-            data=image_bytes,
-            mime_type="image/png"
-        )
-
         prompt = (
             "Read the handwritten word in this image. "
             "Reply with ONLY the word, no explanation."
         )
 
-        # Call Gemini
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                image_part,
-                prompt
-            ]
-        )
+        # Call Gemini (identical images in flight at once share one call)
+        response = gemini_generate_content([image, prompt], model="gemini-2.5-flash")
 
         result = (response.text or "").strip()
         print("Gemini OCR result:", result)
 
-        total_questions += 1
-
         if result.lower() == word.lower():
-            correct_answers += 1
             return "Correct"
 
         return "Incorrect"
@@ -661,30 +3073,265 @@ def check_spelling_from_image(img_path, word):
         raise
 
 
-def tts_generate_and_save(text, voice_id=ELEVEN_VOICE_ID, output_format=ELEVEN_OUTPUT_FORMAT):
-    """Call ElevenLabs to synthesize text and save MP3 file. Returns filename."""
-    ensure_upload_dir()
-    filename = f"bot_resp_{uuid.uuid4().hex}.mp3"
-    filepath = UPLOAD_FOLDER / filename
+def tts_cache_key(text, voice_id, model_id, output_format):
+    payload = json.dumps([text, voice_id, model_id, output_format], ensure_ascii=False)
+    return f"tts_{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:40]}.mp3"
+
+def tts_cache_lookup(filename):
+    """Return True (and bump LRU order) if filename is a cached, still-present synthesis."""
+    hit = storage_touch(filename)
+    with TTS_CACHE_LOCK:
+        TTS_CACHE_STATS["hits" if hit else "misses"] += 1
+    return hit
+
+def tts_claim_part(part):
+    """Open the in-progress file for writing if no live synthesis owns it, else None."""
+    for _ in range(2):
+        try:
+            return os.open(part, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            try:
+                if time.time() - part.stat().st_mtime <= SINGLE_FLIGHT_TIMEOUT:
+                    return None
+                part.unlink()  # its writer died: take over
+            except FileNotFoundError:
+                pass
+    return None
 
+def tts_follow_part(part, filename):
+    """Yield the audio another request (in any worker) is writing to part, until it is renamed to filename."""
+    with TTS_CACHE_LOCK:
+        TTS_CACHE_STATS["joined"] += 1
+    try:
+        f = open(part, "rb")
+    except FileNotFoundError:  # finished (or failed) before we got here
+        if not storage_touch(filename):
+            raise RuntimeError(f"synthesis of {filename} failed in another request")
+        f = open(storage_path(filename), "rb")
+    with f:
+        idle_since = time.monotonic()
+        while True:
+            chunk = f.read(TTS_STREAM_CHUNK)
+            if chunk:
+                idle_since = time.monotonic()
+                yield chunk
+                continue
+            if not part.exists():
+                final = storage_path(filename)
+                if not (final.exists() and os.path.samestat(os.fstat(f.fileno()), final.stat())):
+                    raise RuntimeError(f"synthesis of {filename} failed in another request")
+                while chunk := f.read(TTS_STREAM_CHUNK):  # renamed: drain what was written after our last read
+                    yield chunk
+                return
+            if time.monotonic() - idle_since > SINGLE_FLIGHT_TIMEOUT:
+                raise TimeoutError(f"synthesis of {filename} stalled in another request")
+            time.sleep(TTS_FOLLOW_POLL)
+
+def tts_tee_chunks(text, voice_id, output_format, filename):
+    """
+    Yield ElevenLabs audio chunks as they arrive while teeing them into the cache file.
+    The tee goes through a fixed .<filename>.part file, so a request for the same audio
+    arriving meanwhile (from any worker on the host) follows it instead of synthesizing again.
+    """
+    filepath = storage_path(filename, create=True)
+    part = storage_path(f".{filename}.part", create=True)
+    fd = tts_claim_part(part)
+    if fd is None:
+        yield from tts_follow_part(part, filename)
+        return
+    complete = False
+    size = 0
     try:
-        audio_generator = eleven.text_to_speech.convert(
+        audio_generator = OUTBOUND["eleven"].stream(lambda: eleven.text_to_speech.convert_as_stream(
             text=text,
             voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
+            model_id=ELEVEN_MODEL_ID,
             output_format=output_format,
-        )
-        # write chunks
-        with open(filepath, "wb") as f:
+        ))
+        with open(fd, "wb", buffering=0) as f:  # unbuffered: followers read what we have so far
             for chunk in audio_generator:
                 if chunk:
                     f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+        os.replace(part, filepath)
+        storage_add(filename, size)
+        complete = True
+    finally:
+        count_upstream("eleven", len(text.encode('utf-8')), size)
+        if complete:
+            storage_remove(f"{filename}.pending")
+        else:
+            try:
+                part.unlink()
+            except FileNotFoundError:
+                pass
+
+def tts_generate_and_save(text, voice_id=ELEVEN_VOICE_ID, output_format=ELEVEN_OUTPUT_FORMAT):
+    """
+    Call ElevenLabs to synthesize text and save MP3 file. Returns filename.
+    Identical (text, voice, model, format) requests reuse the cached file without a network call,
+    and ones that arrive while it is being synthesized wait for that synthesis.
+    """
+    ensure_upload_dir()
+    filename = tts_cache_key(text, voice_id, ELEVEN_MODEL_ID, output_format)
+    if tts_cache_lookup(filename):
         return filename
+
+    def synthesize():
+        if storage_touch(filename):  # finished by a call that left the flight just before this one
+            return filename
+        for _ in tts_tee_chunks(text, voice_id, output_format, filename):
+            pass
+        return filename
+
+    try:
+        return TTS_FLIGHTS.do(filename, synthesize)
     except Exception as e:
         print("ElevenLabs TTS error:", e)
         traceback.print_exc()
         return None
 
+def tts_stream(text, voice_id=ELEVEN_VOICE_ID, output_format=ELEVEN_OUTPUT_FORMAT):
+    """Yield audio for text as soon as it is synthesized; cached files are replayed from disk."""
+    ensure_upload_dir()
+    filename = tts_cache_key(text, voice_id, ELEVEN_MODEL_ID, output_format)
+    if tts_cache_lookup(filename):
+        with open(storage_path(filename), "rb") as f:
+            while True:
+                chunk = f.read(TTS_STREAM_CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+    yield from tts_tee_chunks(text, voice_id, output_format, filename)
+
+def defer_tts(text, voice_id=ELEVEN_VOICE_ID, output_format=ELEVEN_OUTPUT_FORMAT):
+    """
+    Reserve the cache filename for text without synthesizing yet. The client fetches
+    /api/audio/<filename> right away and serve_audio streams the synthesis as it happens.
+    The reservation is a small record in storage, so whichever worker gets the fetch can start it.
+    """
+    filename = tts_cache_key(text, voice_id, ELEVEN_MODEL_ID, output_format)
+    if storage_touch(filename):
+        return filename
+    record = json.dumps({"text": text, "voice_id": voice_id, "output_format": output_format}).encode('utf-8')
+    name = f"{filename}.pending"
+    tmp = storage_path(f".{name}.{uuid4().hex}.tmp", create=True)
+    tmp.write_bytes(record)
+    os.replace(tmp, storage_path(name, create=True))
+    storage_add(name, len(record))
+    return filename
+
+def pending_tts(filename):
+    """(text, voice_id, output_format) reserved by defer_tts under filename, or None."""
+    name = f"{filename}.pending"
+    if not storage_touch(name):
+        return None
+    try:
+        record = json.loads(storage_path(name).read_bytes())
+    except (OSError, ValueError):
+        return None
+    return record["text"], record["voice_id"], record["output_format"]
+
+def stream_audio_response(chunks, filename):
+    """
+    Chunked audio/mpeg response. The first chunk is pulled before responding so upstream
+    failures still surface as an error status instead of a truncated 200.
+    """
+    first = next(chunks, b"")
+
+    def body():
+        if first:
+            yield first
+        yield from chunks
+
+    return Response(
+        stream_with_context(body()),
+        mimetype="audio/mpeg",
+        headers={"X-Audio-Filename": filename, "Cache-Control": "no-store"},
+    )
+
+def iter_sentences(pieces, min_chars=SENTENCE_MIN_CHARS):
+    """
+    Incrementally split streamed text into sentences. Boundaries closer than min_chars
+    to the start are skipped so very short fragments are merged into the next sentence.
+    """
+    buf = ""
+    for piece in pieces:
+        buf += piece
+        while True:
+            m = SENTENCE_END_RE.search(buf, min(min_chars, len(buf)))
+            if not m:
+                break
+            sentence, buf = buf[:m.end()].strip(), buf[m.end():]
+            if sentence:
+                yield sentence
+    if buf.strip():
+        yield buf.strip()
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# Its own small pool: PDF stages hold STAGE_EXECUTOR threads for a whole document, and must
+# not keep the first sentence of an interactive answer waiting for a thread.
+SPEECH_EXECUTOR = ThreadPoolExecutor(max_workers=SPEECH_WORKERS, thread_name_prefix="speech")
+
+def pipelined_speech_events(contents, voice_id=ELEVEN_VOICE_ID):
+    """
+    Server-sent events that overlap generation and synthesis. Gemini's stream is split into
+    sentences; each sentence is sent to TTS on the speech pool as soon as it is complete, and
+    the audio segments are emitted in order as they finish:
+      event: segment  data: {index, text, audio_filename}
+      event: done     data: {response, segments}
+      event: error    data: {message}
+    """
+    futures = []
+    sent = 0
+    texts = []
+    pieces = []
+
+    def generated():
+        for piece in gemini_stream_text(contents):
+            pieces.append(piece)
+            yield piece
+
+    def ready_segments(block):
+        nonlocal sent
+        while sent < len(futures) and (block or futures[sent].done()):
+            yield sse_event("segment", {
+                "index": sent,
+                "text": texts[sent],
+                "audio_filename": futures[sent].result(),
+            })
+            sent += 1
+
+    try:
+        for sentence in iter_sentences(generated()):
+            texts.append(sentence)
+            ctx = contextvars.copy_context()
+            futures.append(SPEECH_EXECUTOR.submit(ctx.run, tts_generate_and_save, sentence, voice_id))
+            yield from ready_segments(block=False)
+        yield from ready_segments(block=True)
+        yield sse_event("done", {"response": "".join(pieces).strip(), "segments": len(texts)})
+    except Exception as e:
+        print("Pipelined speech error:", e)
+        traceback.print_exc()
+        yield sse_event("error", {"message": GEMINI_ERROR_TEXT})
+
+def pipelined_speech_response(contents, voice_id=ELEVEN_VOICE_ID):
+    """text/event-stream response over pipelined_speech_events."""
+    return Response(
+        stream_with_context(pipelined_speech_events(contents, voice_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+def form_flag(value):
+    """Interpret an opt-in flag from JSON or form data."""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUTHY
+    return bool(value)
+
 
 @app.route('/api/upload_image', methods=['POST'])
 def upload_image():
@@ -702,11 +3349,12 @@ def upload_image():
         if not word:
             return jsonify({'error': 'No word provided'}), 400
 
-        filename = secure_filename(f'{word}.png')
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        image_file.save(filepath)
+        session_id = score_session_id()
+        if not session_id:
+            return jsonify({'error': 'No session_id provided'}), 400
 
-        result = check_spelling_from_image(filepath.replace('\\','/'), word)
+        result = check_spelling_from_image(normalize_image(upload_part(image_file, f'spelling_{word}')), word)
+        SCORES.record(session_id, result == "Correct")
 
         return jsonify({'result': result, 'word': word})
 
@@ -717,17 +3365,16 @@ def upload_image():
 
 @app.route('/api/submit_results', methods=['POST'])
 def submit_results():
-    """Handle submission of results and calculate score."""
-    global total_questions
-    global correct_answers
-
+    """Handle submission of results and calculate score; the session's counters are cleared."""
     try:
+        session_id = score_session_id()
+        if not session_id:
+            return jsonify({'error': 'No session_id provided'}), 400
+        total_questions, correct_answers = SCORES.finish(session_id)
         if total_questions == 0:
             return jsonify({'score': 0, 'total_questions': 0, 'correct_answers': 0})
 
         score_percentage = (correct_answers / total_questions) * 100
-        total_questions = 0
-        correct_answers = 0
 
         return jsonify({
             'score': score_percentage,
@@ -767,8 +3414,9 @@ def _build_prompt_from_history(history_messages, context=None):
 @app.route("/api/tts", methods=["POST"])
 def tts_endpoint():
     """
-    Body: { text: "<text to synthesize>", voice_id: "<optional voice id>" }
+    Body: { text: "<text to synthesize>", voice_id: "<optional voice id>", stream: <optional bool> }
     Returns: { audio_filename: "<mp3>" } or 500 on failure.
+    With stream=true the MP3 itself is streamed back as it is synthesized (filename in X-Audio-Filename).
     """
     try:
         data = request.get_json(force=True, silent=True) or {}
@@ -778,6 +3426,10 @@ def tts_endpoint():
         if not text:
             return jsonify(message="No text provided"), 400
 
+        if form_flag(data.get("stream")):
+            filename = tts_cache_key(text, voice_id, ELEVEN_MODEL_ID, ELEVEN_OUTPUT_FORMAT)
+            return stream_audio_response(tts_stream(text, voice_id=voice_id), filename)
+
         filename = tts_generate_and_save(text, voice_id=voice_id, output_format=ELEVEN_OUTPUT_FORMAT)
         if not filename:
             return jsonify(message="TTS failed"), 500
@@ -788,16 +3440,266 @@ def tts_endpoint():
         traceback.print_exc()
         return jsonify(message="Error synthesizing audio"), 500
 
-@app.route("/api/verify-object", methods=["POST"])
-def verify_object():
-    data = request.get_json()
-    user_answer = (data.get("answer") or "").lower().strip()
-    correct_word = (data.get("correct") or "").lower().strip()
+@app.route("/api/stats", methods=["GET"])
+def stats():
+    """Cache occupancy and hit/miss counters, upload-folder usage and evictions, how many answers /api/verify-object resolved locally, spell-check totals, section memo reuse, coalesced upstream calls and outbound scheduler state."""
+    with DOC_STORE_LOCK:
+        documents = dict(DOC_STORE_STATS, cached=len(DOCUMENT_STORE))
+    storage = storage_stats()
+    with TTS_CACHE_LOCK:
+        tts_cache = dict(TTS_CACHE_STATS, **storage["categories"].get("tts", {"files": 0, "bytes": 0}))
+    llm_cache = dict(LLM_CACHE_STATS, entries=len(LLM_CACHE_TIERS[0]))
+    if len(LLM_CACHE_TIERS) > 1:
+        llm_cache["disk"] = LLM_CACHE_TIERS[1].snapshot()
+    lookups = llm_cache["hits"] + llm_cache["misses"]
+    llm_cache["hit_rate"] = llm_cache["hits"] / lookups if lookups else 0.0
+    verify = dict(VERIFY_STATS)
+    answered = sum(verify.values())
+    verify["local_share"] = (verify["local_yes"] + verify["local_no"]) / answered if answered else 0.0
+    spelling = dict(SPELL_STATS, memo_entries=spelling_suggestions.cache_info().currsize)
+    with SECTION_MEMO_LOCK:
+        sections = dict(SECTION_MEMO_STATS)
+    single_flight = {"gemini": GEMINI_FLIGHTS.snapshot(), "tts": TTS_FLIGHTS.snapshot()}
+    outbound = {name: scheduler.snapshot() for name, scheduler in OUTBOUND.items()}
+    return jsonify(
+        documents=documents, tts_cache=tts_cache, llm_cache=llm_cache, storage=storage,
+        verify_object=verify, spelling=spelling, sections=sections, single_flight=single_flight,
+        outbound=outbound,
+    ), 200
 
-    if not user_answer:
-        return jsonify({"ok": False, "message": "Please say something."}), 400
+def prometheus_labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
 
-    prompt = f"""
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus text exposition: per-endpoint/stage latency histograms, request counts by
+    status, upstream bytes per vendor, and outbound scheduler / single-flight state.
+    """
+    with METRICS_LOCK:
+        histograms = {key: (list(hist[0]), hist[1]) for key, hist in STAGE_HISTOGRAMS.items()}
+        requests_seen = dict(REQUEST_COUNTS)
+        upstream = dict(UPSTREAM_BYTES)
+    bounds = [f"{b:g}" for b in METRIC_BUCKETS] + ["+Inf"]
+    lines = [
+        "# HELP lexi_stage_seconds Time spent in each stage of a request (model calls, TTS, retrieval, I/O, ...).",
+        "# TYPE lexi_stage_seconds histogram",
+    ]
+    for (endpoint, stage), (buckets, total) in sorted(histograms.items()):
+        cumulative = 0
+        for le, n in zip(bounds, buckets):
+            cumulative += n
+            lines.append(f"lexi_stage_seconds_bucket{prometheus_labels(endpoint=endpoint, stage=stage, le=le)} {cumulative}")
+        labels = prometheus_labels(endpoint=endpoint, stage=stage)
+        lines.append(f"lexi_stage_seconds_sum{labels} {total:.6f}")
+        lines.append(f"lexi_stage_seconds_count{labels} {cumulative}")
+    lines += ["# HELP lexi_requests_total Requests answered, by endpoint and status.", "# TYPE lexi_requests_total counter"]
+    for (endpoint, status), n in sorted(requests_seen.items()):
+        lines.append(f"lexi_requests_total{prometheus_labels(endpoint=endpoint, status=status)} {n}")
+    lines += ["# HELP lexi_upstream_bytes_total Bytes sent to and received from model/TTS vendors.",
+              "# TYPE lexi_upstream_bytes_total counter"]
+    for (vendor, direction), n in sorted(upstream.items()):
+        lines.append(f"lexi_upstream_bytes_total{prometheus_labels(vendor=vendor, direction=direction)} {n}")
+    outbound = {name: scheduler.snapshot() for name, scheduler in OUTBOUND.items()}
+    for metric, field, kind, help_text in (
+        ("lexi_outbound_calls_total", "calls", "counter", "Upstream calls admitted by the outbound scheduler."),
+        ("lexi_outbound_retries_total", "retries", "counter", "Upstream calls retried after throttling or errors."),
+        ("lexi_outbound_throttled_total", "throttled", "counter", "429 responses from the vendor."),
+        ("lexi_outbound_limit", "limit", "gauge", "Current adaptive concurrency limit."),
+        ("lexi_outbound_in_flight", "in_flight", "gauge", "Upstream calls in flight."),
+        ("lexi_outbound_queued", "queued", "gauge", "Calls waiting for an outbound slot."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f"{metric}{prometheus_labels(vendor=name)} {snap[field]}" for name, snap in outbound.items()]
+    lines += ["# HELP lexi_coalesced_total Calls that shared an identical in-flight call.",
+              "# TYPE lexi_coalesced_total counter"]
+    for name, flight in (("gemini", GEMINI_FLIGHTS), ("tts", TTS_FLIGHTS)):
+        lines.append(f"lexi_coalesced_total{prometheus_labels(flight=name)} {flight.snapshot()['coalesced']}")
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+VERIFY_FEEDBACK_CORRECT = "Yes, that is correct. Now spell the word."
+VERIFY_FEEDBACK_INCORRECT = "Not quite. Look again and try saying the word."
+
+# Local matcher for spoken answers; Gemini only sees the ones it can't decide
+VERIFY_SYNONYMS = {  # keep in step with frontend/src/utils/puzzles.js
+    "dog": {"puppy", "pup", "doggy", "doggie", "hound"},
+    "cat": {"kitty", "kitten", "kitty cat", "pussycat", "pussy cat"},
+    "rat": {"ratty"},
+    "fox": {"foxy", "vixen", "fox cub"},
+}
+VERIFY_FILLER = frozenset("""
+a an the it its is this that thats theres there i think see guess um uh er erm hmm like
+my answer oh okay ok so well maybe
+""".split())
+VERIFY_NEGATIONS = frozenset("not no nope never isnt arent wasnt dont doesnt aint nothing".split())
+VERIFY_STATS = {"local_yes": 0, "local_no": 0, "model": 0}
+
+def normalize_spoken(text):
+    """Lowercase letters-only words: "It's a Dog!" -> "its a dog"."""
+    return " ".join(re.sub(r"[^a-z]+", " ", (text or "").lower().replace("'", "")).split())
+
+def singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("xes", "ses", "shes", "ches", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(("", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"), 0) for c in letters}
+
+def soundex(word):
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    code, last = [word[0].upper()], SOUNDEX_CODES.get(word[0], "")
+    for c in word[1:]:
+        d = SOUNDEX_CODES.get(c, "")
+        if d and d != last:
+            code.append(d)
+        if c not in "hw":  # h and w don't separate equal codes, vowels do
+            last = d
+    return ("".join(code) + "000")[:4]
+
+def metaphone(word):
+    """Original Metaphone key (Philips 1990), e.g. "phone" -> "FN", "knight" -> "NT"."""
+    w = re.sub(r"[^a-z]", "", word.lower())
+    if w[:2] in ("ae", "gn", "kn", "pn", "wr"):
+        w = w[1:]
+    elif w[:1] == "x":
+        w = "s" + w[1:]
+    elif w[:2] == "wh":
+        w = "w" + w[2:]
+    vowels = "aeiou"
+    key = []
+    for i, c in enumerate(w):
+        prev = w[i - 1] if i else ""
+        nxt = w[i + 1] if i + 1 < len(w) else ""
+        nxt2 = w[i + 2] if i + 2 < len(w) else ""
+        if c == prev and c != "c":
+            continue
+        if c in vowels:
+            if i == 0:
+                key.append(c.upper())
+        elif c == "b":
+            if not (prev == "m" and i == len(w) - 1):
+                key.append("B")
+        elif c == "c":
+            if nxt == "h":
+                key.append("K" if prev == "s" else "X")
+            elif nxt == "i" and nxt2 == "a":
+                key.append("X")
+            elif nxt in ("e", "i", "y"):
+                if prev != "s":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif c == "d":
+            key.append("J" if nxt == "g" and nxt2 in ("e", "i", "y") else "T")
+        elif c == "g":
+            if nxt == "h" and (not nxt2 or nxt2 not in vowels):
+                continue
+            if nxt == "n" and (not nxt2 or w[i + 1:] == "ned"):
+                continue
+            if prev == "d" and nxt in ("e", "i", "y"):
+                continue  # "dge" is already J
+            key.append("J" if nxt in ("e", "i", "y") and prev != "g" else "K")
+        elif c == "h":
+            if prev not in ("c", "g", "p", "s", "t") and nxt in vowels and (not prev or prev not in vowels):
+                key.append("H")
+        elif c == "k":
+            if prev != "c":
+                key.append("K")
+        elif c == "p":
+            key.append("F" if nxt == "h" else "P")
+        elif c == "q":
+            key.append("K")
+        elif c == "s":
+            key.append("X" if nxt == "h" or (nxt == "i" and nxt2 in ("o", "a")) else "S")
+        elif c == "t":
+            if nxt == "i" and nxt2 in ("o", "a"):
+                key.append("X")
+            elif nxt == "h":
+                key.append("0")
+            elif not (nxt == "c" and nxt2 == "h"):
+                key.append("T")
+        elif c == "v":
+            key.append("F")
+        elif c in ("w", "y"):
+            if nxt and nxt in vowels:
+                key.append(c.upper())
+        elif c == "x":
+            key.append("KS")
+        elif c == "z":
+            key.append("S")
+        else:
+            key.append(c.upper())
+    return "".join(key)
+
+def vowel_skeleton(word):
+    return re.sub(r"(.)\1+", r"\1", re.sub(r"[^aeiouy]", "", word[1:]))
+
+def verify_object_local(correct_word, user_answer):
+    """
+    True when the whole spoken answer names the target word (exact, synonym, plural, or
+    a sound-alike spelling), False when it names another picture-game object instead,
+    None when Gemini should decide: negations ("not a dog"), answers with words beyond
+    the name ("a big dog", descriptions) and any other word, which may be a synonym.
+    """
+    target = normalize_spoken(correct_word)
+    spoken = normalize_spoken(user_answer).split()
+    words = [w for w in spoken if w not in VERIFY_FILLER]
+    if not target or not words or VERIFY_NEGATIONS.intersection(spoken):
+        return None
+
+    phrase = " ".join(words)
+    candidates = {phrase, singular(phrase), " ".join(singular(w) for w in words)}
+    accepted = {target} | VERIFY_SYNONYMS.get(target, set())
+    if candidates & accepted:
+        return True
+
+    near = False
+    for cand in candidates:
+        for word in accepted:
+            cand_key, word_key = metaphone(cand), metaphone(word)
+            if cand_key == word_key and vowel_skeleton(cand) == vowel_skeleton(word):
+                return True  # same sounds, different spelling: "kat", "dogg", "foks"
+            if (
+                edit_distance(cand, word) <= max(1, len(word) // 4)
+                or edit_distance(cand_key, word_key) <= 1
+                or soundex(cand) == soundex(word)
+            ):
+                near = True  # "cut", "duck", "folks": could be a mishearing
+    if near:
+        return None
+    for other, synonyms in VERIFY_SYNONYMS.items():
+        if other != target and candidates & (({other} | synonyms) - accepted):
+            return False  # another animal of the game: "a cat" for the dog picture
+    return None
+
+def verify_object_verdict(correct_word, user_answer):
+    """Local verdict if there is one (counted in VERIFY_STATS), else None."""
+    verdict = verify_object_local(correct_word, user_answer)
+    if verdict is None:
+        VERIFY_STATS["model"] += 1
+    else:
+        VERIFY_STATS["local_yes" if verdict else "local_no"] += 1
+    return verdict
+
+def verify_object_prompt(correct_word, user_answer):
+    return f"""
 You are checking if a child correctly named an object.
 
 Correct word: "{correct_word}"
@@ -808,27 +3710,35 @@ YES  → if the meaning or pronunciation matches
 NO   → if it does not match
 """
 
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=[prompt]
-        )
+@app.route("/api/verify-object", methods=["POST"])
+def verify_object():
+    data = request.get_json()
+    user_answer = (data.get("answer") or "").lower().strip()
+    correct_word = (data.get("correct") or "").lower().strip()
 
-        result = (response.text or "").strip().upper()
+    if not user_answer:
+        return jsonify({"ok": False, "message": "Please say something."}), 400
 
-        is_correct = "YES" in result
+    try:
+        is_correct = verify_object_verdict(correct_word, user_answer)
+        resolved_by = "local"
+        if is_correct is None:
+            result = gemini_generate_text([verify_object_prompt(correct_word, user_answer)]).upper()
+            is_correct = "YES" in result
+            resolved_by = "gemini"
 
         if is_correct:
-            feedback = "Yes, that is correct. Now spell the word."
+            feedback = VERIFY_FEEDBACK_CORRECT
         else:
-            feedback = "Not quite. Look again and try saying the word."
+            feedback = VERIFY_FEEDBACK_INCORRECT
 
         audio_file = tts_generate_and_save(feedback)
 
         return jsonify(
             correct=is_correct,
             feedback=feedback,
-            audio_filename=audio_file
+            audio_filename=audio_file,
+            resolved_by=resolved_by
         )
 
     except Exception as e:
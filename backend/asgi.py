@@ -0,0 +1,357 @@
+"""
+Async serving mode for the LexiEase backend.
+
+The latency-bound endpoints (/api/ask, /api/ask-doc, /api/tts, /api/verify-object)
+are served by coroutine views that await Gemini and ElevenLabs instead of holding a
+worker for the whole round trip. Every other route, and CORS preflights, fall
+through to the regular Flask app in api/app.py, so behaviour is unchanged.
+
+Run with:
+    pip install -r requirements-async.txt
+    uvicorn asgi:asgi_app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from elevenlabs.client import AsyncElevenLabs
+from quart import Quart, request, jsonify
+
+from api import app as lexi
+
+OUTBOUND_POOL_SIZE = int(os.getenv("OUTBOUND_POOL_SIZE", "100"))  # keep-alive connections / blocking-call threads
+
+quart_app = Quart(__name__)
+
+# pooled keep-alive connections for ElevenLabs
+eleven_http = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=OUTBOUND_POOL_SIZE,
+        max_keepalive_connections=OUTBOUND_POOL_SIZE,
+        keepalive_expiry=30,
+    ),
+    timeout=60,
+)
+eleven_async = AsyncElevenLabs(
+    api_key=lexi.ELEVENLABS_API_KEY,
+    base_url=lexi.ELEVENLABS_BASE_URL,
+    httpx_client=eleven_http,
+)
+
+
+@quart_app.before_serving
+async def configure_executor():
+    # genai's aio client and file I/O run on the default executor; size it for the pool
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=OUTBOUND_POOL_SIZE, thread_name_prefix="outbound")
+    )
+
+
+@quart_app.after_serving
+async def close_pools():
+    await eleven_http.aclose()
+
+
+@quart_app.before_request
+async def begin_trace():
+    if lexi.METRICS_ENABLED:
+        lexi.start_trace(request.endpoint, request.headers.get("X-Request-Id"))
+
+
+@quart_app.after_request
+async def add_cors_headers(response):
+    """Mirror the Flask-CORS settings of api/app.py (any origin, credentials allowed)."""
+    origin = request.headers.get("Origin")
+    if origin:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Access-Control-Expose-Headers"] = "X-Audio-Filename, X-Trace-Id"
+        response.headers.add("Vary", "Origin")
+    return response
+
+
+@quart_app.after_request
+async def finish_trace(response):
+    return lexi.finish_trace(response)
+
+
+FLIGHT_TASKS = {}  # (flight name, key) -> task of the call in flight on this event loop
+
+
+async def coalesce(flight, name, key, make_coro):
+    """
+    Event-loop counterpart of lexi.SingleFlight.do, counted in the same stats: concurrent
+    identical calls await one task. Followers give up after flight.timeout; a cancelled
+    caller does not cancel the shared call.
+    """
+    task = FLIGHT_TASKS.get((name, key))
+    leader = task is None
+    if leader:
+        task = FLIGHT_TASKS[(name, key)] = asyncio.ensure_future(make_coro())
+
+        def finished(t):
+            FLIGHT_TASKS.pop((name, key), None)
+            if not t.cancelled() and t.exception() is not None:
+                with flight.lock:
+                    flight.stats["errors"] += 1
+
+        task.add_done_callback(finished)
+    with flight.lock:
+        flight.stats["calls" if leader else "coalesced"] += 1
+    if leader:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), flight.timeout)
+    except asyncio.TimeoutError:
+        with flight.lock:
+            flight.stats["timeouts"] += 1
+        raise
+
+
+async def scheduled(vendor, make_coro):
+    """
+    Async lexi.OutboundScheduler.call: waits for a slot of the vendor's scheduler (on a
+    worker thread), awaits make_coro() and retries with the scheduler's backoff on the loop.
+    """
+    scheduler = lexi.OUTBOUND[vendor]
+    priority = lexi.OUTBOUND_PRIORITIES.get(request.endpoint, lexi.OUTBOUND_DEFAULT_PRIORITY)
+    attempt = 0
+    while True:
+        await asyncio.to_thread(scheduler.acquire, priority)
+        t0 = time.perf_counter()
+        try:
+            result = await make_coro()
+        except Exception as e:
+            scheduler.release(False, lexi.error_status(e))
+            delay = scheduler.retry_delay(e, attempt)
+        else:
+            scheduler.release(True)
+            return result
+        finally:
+            lexi.observe_stage(vendor, time.perf_counter() - t0)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def endpoint_cache_ttl():
+    return lexi.LLM_CACHE_TTLS.get(request.endpoint, lexi.LLM_CACHE_DEFAULT_TTL)
+
+
+async def gemini_generate_text_async(contents, model=lexi.MODEL_NAME, cache_ttl=None):
+    """Async counterpart of lexi.gemini_generate_text, sharing its response cache."""
+    if cache_ttl is None:
+        cache_ttl = endpoint_cache_ttl()
+    key, ttl, cached = lexi.llm_cache_lookup(model, contents, cache_ttl)
+    if cached is not None:
+        return cached
+
+    async def upstream():
+        response = await scheduled("gemini", lambda: lexi.client.aio.models.generate_content(
+            model=model, contents=lexi.gemini_parts(contents)))
+        lexi.count_upstream("gemini", lexi.gemini_request_bytes(contents), len((response.text or "").encode("utf-8")))
+        return response
+
+    response = await coalesce(lexi.GEMINI_FLIGHTS, "gemini", key or lexi.llm_cache_key(model, contents), upstream)
+    text = (response.text or "").strip()
+    lexi.llm_cache_store(key, text, ttl)
+    return text
+
+
+async def handle_gemini_prompt_async(contents):
+    try:
+        return await gemini_generate_text_async(contents)
+    except Exception as e:
+        print("Gemini Error:", e)
+        traceback.print_exc()
+        return lexi.GEMINI_ERROR_TEXT
+
+
+def write_cached_audio(filename, data):
+    tmp_path = lexi.storage_path(f".{filename}.{uuid.uuid4().hex}.part", create=True)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, lexi.storage_path(filename, create=True))
+    lexi.storage_add(filename, len(data))
+
+
+async def tts_generate_and_save_async(text, voice_id=lexi.ELEVEN_VOICE_ID, output_format=lexi.ELEVEN_OUTPUT_FORMAT):
+    """Async counterpart of lexi.tts_generate_and_save, sharing its content-addressed cache."""
+    filename = lexi.tts_cache_key(text, voice_id, lexi.ELEVEN_MODEL_ID, output_format)
+    if lexi.tts_cache_lookup(filename):
+        return filename
+
+    async def synthesize():
+        audio = bytearray()
+        async for chunk in eleven_async.text_to_speech.convert_as_stream(
+            text=text,
+            voice_id=voice_id,
+            model_id=lexi.ELEVEN_MODEL_ID,
+            output_format=output_format,
+        ):
+            if chunk:
+                audio += chunk
+        lexi.count_upstream("eleven", len(text.encode("utf-8")), len(audio))
+        await asyncio.to_thread(write_cached_audio, filename, bytes(audio))
+        return filename
+
+    try:
+        return await coalesce(lexi.TTS_FLIGHTS, "tts", filename, lambda: scheduled("eleven", synthesize))
+    except Exception as e:
+        print("ElevenLabs TTS error:", e)
+        traceback.print_exc()
+        return None
+
+
+async def iterate_in_thread(iterator):
+    """Drive a blocking iterator from the event loop, one item per executor hop."""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+@quart_app.route("/api/ask", methods=["POST"])
+async def ask():
+    """Async /api/ask; same form fields and modes as the Flask view in api/app.py."""
+    try:
+        form = await request.form
+        files = await request.files
+        upload, prefix, prompt = lexi.ask_inputs(form.get("text"), files.get("image"), files.get("audio"))
+        if prompt is None:
+            return jsonify(message="No valid input provided!"), 400
+
+        contents = [prompt]
+        if upload:
+            contents.insert(0, await asyncio.to_thread(lexi.upload_part, upload, prefix))
+
+        if lexi.form_flag(form.get("pipeline")):
+            events = iterate_in_thread(lexi.pipelined_speech_events(contents))
+            return events, 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+
+        g_response = await handle_gemini_prompt_async(contents)
+
+        if lexi.form_flag(form.get("stream")):
+            return jsonify(message="Response generated", response=g_response,
+                           audio_filename=lexi.defer_tts(g_response), audio_streaming=True), 200
+
+        audio_filename = await tts_generate_and_save_async(g_response)
+        return jsonify(message="Response generated", response=g_response, audio_filename=audio_filename), 200
+    except Exception as e:
+        print("Error in /api/ask:", e)
+        traceback.print_exc()
+        return jsonify(message="Error generating response"), 500
+
+
+@quart_app.route("/api/ask-doc", methods=["POST"])
+async def ask_doc():
+    try:
+        data = await request.get_json(force=True) or {}
+        doc_id = data.get("doc_id")
+        question = (data.get("question") or "").strip()
+        voice_id = data.get("voice_id") or lexi.ELEVEN_VOICE_ID
+
+        if not doc_id or not question:
+            return jsonify(message="doc_id and question are required"), 400
+
+        # retrieval may memory-map an index from disk: keep it off the event loop
+        loop = asyncio.get_running_loop()
+        selected = await loop.run_in_executor(lexi.STAGE_EXECUTOR, lexi.retrieve_top_k, doc_id, question, lexi.TOP_K)
+        prompt = lexi.ask_doc_prompt(question, selected)
+        assistant_text = await handle_gemini_prompt_async([prompt]) or "Sorry, I couldn't generate an answer."
+
+        if lexi.form_flag(data.get("stream")):
+            audio_filename = lexi.defer_tts(assistant_text, voice_id=voice_id)
+        else:
+            audio_filename = await tts_generate_and_save_async(assistant_text, voice_id=voice_id)
+        return jsonify(response=assistant_text, audio_filename=audio_filename, evidence=selected), 200
+    except Exception as e:
+        print("ask-doc error:", e)
+        traceback.print_exc()
+        return jsonify(message="Error generating response"), 500
+
+
+@quart_app.route("/api/tts", methods=["POST"])
+async def tts_endpoint():
+    try:
+        data = await request.get_json(force=True, silent=True) or {}
+        text = (data.get("text") or "").strip()
+        voice_id = data.get("voice_id") or lexi.ELEVEN_VOICE_ID
+
+        if not text:
+            return jsonify(message="No text provided"), 400
+
+        if lexi.form_flag(data.get("stream")):
+            filename = lexi.tts_cache_key(text, voice_id, lexi.ELEVEN_MODEL_ID, lexi.ELEVEN_OUTPUT_FORMAT)
+            chunks = lexi.tts_stream(text, voice_id=voice_id)
+            first = await asyncio.to_thread(next, chunks, b"")
+
+            async def body():
+                if first:
+                    yield first
+                async for chunk in iterate_in_thread(chunks):
+                    yield chunk
+
+            return body(), 200, {"Content-Type": "audio/mpeg", "X-Audio-Filename": filename, "Cache-Control": "no-store"}
+
+        filename = await tts_generate_and_save_async(text, voice_id=voice_id)
+        if not filename:
+            return jsonify(message="TTS failed"), 500
+        return jsonify(audio_filename=filename), 200
+    except Exception as e:
+        print("TTS endpoint error:", e)
+        traceback.print_exc()
+        return jsonify(message="Error synthesizing audio"), 500
+
+
+@quart_app.route("/api/verify-object", methods=["POST"])
+async def verify_object():
+    data = await request.get_json() or {}
+    user_answer = (data.get("answer") or "").lower().strip()
+    correct_word = (data.get("correct") or "").lower().strip()
+
+    if not user_answer:
+        return jsonify({"ok": False, "message": "Please say something."}), 400
+
+    try:
+        is_correct = lexi.verify_object_verdict(correct_word, user_answer)
+        resolved_by = "local"
+        if is_correct is None:
+            result = (await gemini_generate_text_async([lexi.verify_object_prompt(correct_word, user_answer)])).upper()
+            is_correct = "YES" in result
+            resolved_by = "gemini"
+        feedback = lexi.VERIFY_FEEDBACK_CORRECT if is_correct else lexi.VERIFY_FEEDBACK_INCORRECT
+        audio_file = await tts_generate_and_save_async(feedback)
+        return jsonify(correct=is_correct, feedback=feedback, audio_filename=audio_file, resolved_by=resolved_by)
+    except Exception as e:
+        print("verify_object error:", e)
+        traceback.print_exc()
+        return jsonify(
+            correct=False,
+            feedback="Something went wrong. Please try again.",
+            audio_filename=None
+        ), 500
+
+
+wsgi_fallback = WsgiToAsgi(lexi.app)
+
+
+def is_async_route(scope):
+    if scope["method"] != "POST":
+        return False
+    adapter = quart_app.url_map.bind("")
+    return adapter.test(scope["path"], method="POST")
+
+
+async def asgi_app(scope, receive, send):
+    """Route the async endpoints to Quart and everything else to the Flask app."""
+    if scope["type"] == "lifespan" or (scope["type"] == "http" and is_async_route(scope)):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
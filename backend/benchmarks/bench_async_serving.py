@@ -0,0 +1,149 @@
+"""
+Concurrent-request throughput of the WSGI deployment (a fixed number of sync
+workers, like gunicorn -w 4) vs the async serving mode in asgi.py, with local
+HTTP stand-ins for the Gemini and ElevenLabs APIs.
+
+    pip install -r requirements-async.txt
+    python benchmarks/bench_async_serving.py
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+GEMINI_LATENCY = 0.6   # seconds per generateContent call
+TTS_LATENCY = 0.4      # seconds per text-to-speech call
+WSGI_WORKERS = 4
+CONCURRENCY = 64
+REQUESTS = 256
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if ":generateContent" in self.path:
+            time.sleep(GEMINI_LATENCY)
+            body = json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": "Plants use light to make food."}]}}]}).encode()
+            ctype = "application/json"
+        else:
+            time.sleep(TTS_LATENCY)
+            body, ctype = b"\xff\xfb" * 4096, "audio/mpeg"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stand_in():
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+vendor = start_stand_in()
+os.environ.update({
+    "GEMINI_API_KEY": "benchmark", "ELEVENLABS_API_KEY": "benchmark",
+    "GEMINI_BASE_URL": vendor + "/", "ELEVENLABS_BASE_URL": vendor,
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import asgi  # noqa: E402
+
+lexi = asgi.lexi
+lexi.UPLOAD_FOLDER = Path(tempfile.mkdtemp(prefix="lexi_bench_"))
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+
+def sync_workers(wsgi_app, workers):
+    """Admit at most `workers` requests at a time, like a pool of sync workers."""
+    gate = threading.BoundedSemaphore(workers)
+
+    def app(environ, start_response):
+        with gate:
+            return [b"".join(wsgi_app(environ, start_response))]
+    return app
+
+
+def serve_wsgi():
+    port = free_port()
+    server = make_server("127.0.0.1", port, sync_workers(lexi.app, WSGI_WORKERS), threaded=True)
+    server.socket.listen(1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}", server.shutdown
+
+
+def serve_asgi():
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi.asgi_app, host="127.0.0.1", port=port, log_level="warning", backlog=1024))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{port}", stop
+
+
+async def load(base, tag):
+    sem = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=600) as client:
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                # unique questions so neither response cache short-circuits the upstream calls
+                resp = await client.post("/api/ask", data={"text": f"{tag} question {i}"})
+                assert resp.status_code == 200 and resp.json()["audio_filename"], resp.text
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return (
+        f"{REQUESTS / elapsed:.1f}",
+        f"{statistics.median(latencies) * 1e3:.0f}",
+        f"{latencies[int(len(latencies) * 0.95) - 1] * 1e3:.0f}",
+    )
+
+
+def main():
+    rows = []
+    for name, serve in ((f"wsgi ({WSGI_WORKERS} sync workers)", serve_wsgi), ("asgi (1 process)", serve_asgi)):
+        base, stop = serve()
+        rows.append((name,) + asyncio.run(load(base, name)))
+        stop()
+    widths = [max(len(r[i]) for r in rows + [("mode", "req/s", "p50 ms", "p95 ms")]) for i in range(4)]
+    for r in [("mode", "req/s", "p50 ms", "p95 ms")] + rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Bytes sent to Gemini and end-to-end latency of /api/upload-audio with and
+without the audio preprocessing stage (mono, 16 kHz, trimmed, 16-bit WAV),
+plus the cost of the local fluency metrics.
+
+The corpus is synthetic reading-test recordings in the formats browsers
+produce (44.1/48 kHz, stereo, 16-bit or float). Extra WAV files can be passed
+on the command line. Gemini is a stub whose latency is a fixed round trip
+plus upload time at UPLINK_MBPS.
+
+    python benchmarks/bench_audio.py [extra.wav ...]
+"""
+import io
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import app, report, timeit
+
+ROUND_TRIP = 0.8       # seconds of model time per call
+UPLINK_MBPS = 10.0     # client-to-Gemini upload bandwidth
+
+CORPUS = [  # (name, seconds, rate, channels, sample format)
+    ("read-30s-48k-stereo-i16", 30, 48000, 2, "i16"),
+    ("read-60s-48k-stereo-i16", 60, 48000, 2, "i16"),
+    ("read-60s-44k-stereo-f32", 60, 44100, 2, "f32"),
+    ("read-60s-44k-mono-i16", 60, 44100, 1, "i16"),
+]
+
+
+def speech_like(seconds, rate, seed=0):
+    """Syllable bursts (harmonics of a wandering pitch) with pauses, plus lead-in/out silence and hiss."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    x = rng.normal(0, 0.002, n)
+    t = rng.uniform(1.0, 2.5)
+    end = seconds - rng.uniform(1.0, 3.0)
+    while t < end:
+        dur = rng.uniform(0.12, 0.3)
+        i, j = int(t * rate), int(min(t + dur, end) * rate)
+        tt = np.arange(j - i) / rate
+        f0 = rng.uniform(110, 220)
+        burst = sum(np.sin(2 * np.pi * f0 * h * tt) / h for h in range(1, 6))
+        x[i:j] += 0.2 * burst * np.hanning(j - i)
+        t += dur + (rng.uniform(0.4, 1.2) if rng.random() < 0.15 else rng.uniform(0.02, 0.08))
+    return np.clip(x, -1, 1).astype(np.float32)
+
+
+def wav_bytes(x, rate, channels, sample_format):
+    frames = np.repeat(x[:, None], channels, axis=1)
+    if sample_format == "f32":
+        raw, code, bits = frames.astype("<f4").tobytes(), 3, 32
+    else:
+        raw, code, bits = (frames * 32767).astype("<i2").tobytes(), 1, 16
+    block = channels * bits // 8
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(raw), b"WAVE", b"fmt ", 16,
+        code, channels, rate, rate * block, block, bits, b"data", len(raw),
+    )
+    return header + raw
+
+
+class StubResponse:
+    text = "82. You read with a steady voice. Try to pause a little at each full stop."
+
+
+class StubModels:
+    def __init__(self):
+        self.sent = 0
+
+    def generate_content(self, model, contents, config=None):
+        size = sum(len(c.inline_data.data) for c in contents if getattr(c, "inline_data", None))
+        self.sent = size
+        time.sleep(ROUND_TRIP + size * 8 / (UPLINK_MBPS * 1e6))
+        return StubResponse()
+
+
+class StubClient:
+    def __init__(self):
+        self.models = StubModels()
+
+
+def run(name, data, mode):
+    app.AUDIO_PREPROCESS = mode != "raw"
+    t0 = time.perf_counter()
+    app.preprocess_audio((data, "audio/wav"))
+    prep = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    resp = app.app.test_client().post("/api/upload-audio", data={
+        "audio": (io.BytesIO(data), "reading.wav"), "readingSpeed": "95", "timeTaken": "60",
+    })
+    assert resp.status_code == 200, resp.get_json()
+    elapsed = time.perf_counter() - t0
+    sent = app.client.models.sent
+    return (name, mode, f"{len(data):,}", f"{sent:,}", f"{len(data) / sent:.1f}x",
+            f"{prep * 1e3:.0f}", f"{elapsed * 1e3:.0f}")
+
+
+def main():
+    app.client = StubClient()
+    app.tts_generate_and_save = lambda text, *a, **k: "feedback.mp3"
+    samples = [(name, wav_bytes(speech_like(sec, rate, i), rate, ch, fmt))
+               for i, (name, sec, rate, ch, fmt) in enumerate(CORPUS)]
+    samples += [(Path(p).name, Path(p).read_bytes()) for p in sys.argv[1:]]
+
+    rows = [run(name, data, mode) for name, data in samples for mode in ("raw", "wav")]
+    report(rows, ("sample", "mode", "upload B", "sent B", "ratio", "prep ms", "end-to-end ms"))
+    print(f"\nstub Gemini: {ROUND_TRIP * 1e3:.0f} ms round trip + upload at {UPLINK_MBPS:g} Mbit/s\n")
+
+    rows = []
+    for name, data in samples:
+        conditioned = app.condition_audio(data)
+        if conditioned is None:
+            continue
+        metrics = app.fluency_metrics(*conditioned, reading_speed=95)
+        rows.append((
+            name, f"{timeit(lambda: app.condition_audio(data), repeat=3) * 1e3:.0f}",
+            f"{timeit(lambda: app.fluency_metrics(*conditioned, reading_speed=95)) * 1e3:.1f}",
+            metrics["score"], metrics["articulation_rate"], metrics["pause_count"],
+        ))
+    report(rows, ("sample", "decode ms", "metrics ms", "local score", "syll/s", "pauses"))
+
+
+if __name__ == "__main__":
+    main()
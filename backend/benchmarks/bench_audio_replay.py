@@ -0,0 +1,137 @@
+"""
+Replay-heavy load on /api/audio/<filename>: bytes on the wire, requests and
+learner wait time for the previous serve_audio (plain send_file) and the
+current one (content-hash ETag, immutable Cache-Control, byte ranges).
+
+Each learner plays a handful of TTS answers, then replays each of them and
+seeks inside them a few times, the way AudioPlayer is used. Learners are
+threads with their own browser cache: responses with a freshness lifetime are
+reused locally, anything else is revalidated with If-None-Match, and seeks
+send Range requests when the file isn't cached. The app runs in werkzeug's
+threaded server on loopback; wait time adds RTT and DOWNLINK_MBPS per request.
+(Under gunicorn the full-file responses go out through wsgi.file_wrapper,
+i.e. sendfile; set AUDIO_X_SENDFILE behind Apache/lighttpd.)
+
+    python benchmarks/bench_audio_replay.py
+"""
+import http.client
+import logging
+import random
+import statistics
+import threading
+import time
+
+from flask import send_file
+from werkzeug.serving import make_server
+
+from common import app, report
+
+LEARNERS = 16
+FILES = 24                # distinct TTS answers
+PLAYS_PER_LEARNER = 6
+REPLAYS = 5
+SEEKS = 2
+RTT = 0.05                # seconds
+DOWNLINK_MBPS = 10.0
+
+
+@app.app.route("/bench/previous-audio/<path:filename>")
+def previous_serve_audio(filename):
+    return send_file(str(app.storage_path(filename)), mimetype="audio/mpeg")
+
+
+class Browser:
+    """Minimal HTTP cache: fresh entries are reused, stale ones revalidated by ETag."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port)
+        self.cache = {}  # url -> (etag, fresh_until)
+        self.requests = self.bytes = 0
+        self.wait = 0.0
+        self.latencies = []
+
+    def fetch(self, url, headers):
+        t0 = time.perf_counter()
+        self.conn.request("GET", url, headers=headers)
+        resp = self.conn.getresponse()
+        body = resp.read()
+        self.latencies.append(time.perf_counter() - t0)
+        self.requests += 1
+        self.bytes += len(body)
+        self.wait += RTT + len(body) * 8 / (DOWNLINK_MBPS * 1e6)
+        return resp, body
+
+    def play(self, url, offset=0):
+        entry = self.cache.get(url)
+        if entry and entry[1] > time.time():
+            return
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if entry:
+                headers["If-Range"] = entry[0]
+        elif entry:
+            headers["If-None-Match"] = entry[0]
+        resp, _ = self.fetch(url, headers)
+        if resp.status == 200 and resp.getheader("ETag"):
+            cc = resp.getheader("Cache-Control") or ""
+            max_age = next((int(d.split("=")[1]) for d in cc.split(", ") if d.startswith("max-age=")), 0)
+            self.cache[url] = (resp.getheader("ETag"), time.time() + max_age)
+
+
+def learner(port, prefix, names, seed, out):
+    rng = random.Random(seed)
+    browser = Browser(port)
+    for name in rng.sample(names, PLAYS_PER_LEARNER):
+        url = f"{prefix}/{name}"
+        browser.play(url)
+        for _ in range(REPLAYS):
+            browser.play(url)
+            for _ in range(SEEKS):
+                browser.play(url, offset=rng.randrange(1, 200_000))
+    out.append(browser)
+
+
+def run(port, prefix, names):
+    browsers, threads = [], []
+    for i in range(LEARNERS):
+        threads.append(threading.Thread(target=learner, args=(port, prefix, names, i, browsers)))
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies = [x for b in browsers for x in b.latencies]
+    return (
+        sum(b.requests for b in browsers),
+        sum(b.bytes for b in browsers),
+        statistics.median(latencies) * 1e3 if latencies else 0.0,
+        sum(b.wait for b in browsers) / LEARNERS,
+        elapsed,
+    )
+
+
+def main():
+    rng = random.Random(0)
+    names = []
+    for i in range(FILES):
+        name = f"tts_bench{i:04d}.mp3"
+        data = rng.randbytes(rng.randrange(200_000, 480_000))  # 12-30 s at 128 kbps
+        app.storage_path(name, create=True).write_bytes(data)
+        app.storage_add(name, len(data))
+        names.append(name)
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rows = []
+    for label, prefix in (("previous", "/bench/previous-audio"), ("current", "/api/audio")):
+        requests, nbytes, p50, wait, elapsed = run(server.port, prefix, names)
+        rows.append((label, requests, f"{nbytes / 1e6:.1f} MB", f"{p50:.2f} ms", f"{wait:.1f} s", f"{elapsed:.2f} s"))
+    server.shutdown()
+    report(rows, ("serve_audio", "requests", "bytes sent", "p50 server", "wait/learner", "wall"))
+
+
+if __name__ == "__main__":
+    main()
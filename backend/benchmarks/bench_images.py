@@ -0,0 +1,135 @@
+"""
+Payload size and model latency of the handwriting OCR calls (/api/upload_image,
+/api/writing-assistant) with and without image normalization.
+
+The sample set is synthetic: phone photos of handwriting (12 MP JPEG, uneven
+lighting), a scanned page, and signature-pad drawings (transparent and white
+PNG canvases). Extra images can be passed on the command line. Gemini is a
+stub whose latency is a fixed round trip, upload time at UPLINK_MBPS, and a
+prefill cost per image token (258 tokens per 768x768 tile).
+
+    python benchmarks/bench_images.py [extra.jpg ...]
+"""
+import io
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from common import app, report, timeit
+
+ROUND_TRIP = 0.6          # seconds of fixed model time per call
+UPLINK_MBPS = 10.0        # client-to-Gemini upload bandwidth
+TOKEN_PREFILL = 0.0004    # seconds per image token
+TILE, TILE_TOKENS = 768, 258
+WORDS = "the quick brown fox jumps over a lazy dog while reading is fun every day".split()
+
+
+def handwriting(draw, box, size, rng, fill):
+    x0, y0, x1, y1 = box
+    font = ImageFont.load_default(size=size)
+    y = y0
+    while y + size < y1:
+        line = " ".join(rng.choice(WORDS, rng.integers(3, 7)))
+        draw.text((x0 + int(rng.integers(0, size)), y), line, font=font, fill=fill)
+        y += int(size * 1.6)
+
+
+def phone_photo(seed):
+    rng = np.random.default_rng(seed)
+    w, h = 4032, 3024
+    # paper with a lighting gradient and sensor noise
+    yy, xx = np.mgrid[0:h, 0:w]
+    paper = 215 + 25 * (xx / w) - 20 * (yy / h) + rng.normal(0, 4, (h, w))
+    img = Image.fromarray(np.clip(np.stack([paper, paper * 0.98, paper * 0.93], -1), 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    handwriting(draw, (900, 800, 3000, 2100), 110, rng, (40, 40, 70))
+    img = img.filter(ImageFilter.GaussianBlur(1.2))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def scanned_page(seed):
+    rng = np.random.default_rng(seed)
+    img = Image.new("L", (2480, 3508), 250)
+    handwriting(ImageDraw.Draw(img), (200, 250, 2280, 3200), 70, rng, 30)
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def canvas(seed, transparent):
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGBA", (800, 400), (0, 0, 0, 0) if transparent else (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    points = [(150 + i * 12, 200 + 60 * math.sin(i / 3 + seed)) for i in range(40)]
+    draw.line(points, fill=(0, 0, 0, 255), width=6, joint="curve")
+    handwriting(draw, (180, 120, 700, 260), 60, rng, (0, 0, 0, 255))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def image_tokens(data):
+    w, h = Image.open(io.BytesIO(data)).size
+    if w <= 384 and h <= 384:
+        return TILE_TOKENS
+    return math.ceil(w / TILE) * math.ceil(h / TILE) * TILE_TOKENS
+
+
+class StubResponse:
+    text = "cat"
+
+
+class StubModels:
+    def __init__(self):
+        self.sent = self.tokens = 0
+
+    def generate_content(self, model, contents, config=None):
+        data = next(c.inline_data.data for c in contents if getattr(c, "inline_data", None))
+        self.sent, self.tokens = len(data), image_tokens(data)
+        time.sleep(ROUND_TRIP + len(data) * 8 / (UPLINK_MBPS * 1e6) + self.tokens * TOKEN_PREFILL)
+        return StubResponse()
+
+
+class StubClient:
+    def __init__(self):
+        self.models = StubModels()
+
+
+def run(name, data, normalize):
+    app.IMAGE_NORMALIZE = normalize
+    prep = timeit(lambda: app.normalize_image((data, app.sniff_mime(data))), repeat=3) if normalize else 0.0
+    t0 = time.perf_counter()
+    resp = app.app.test_client().post("/api/upload_image", data={
+        "image": (io.BytesIO(data), "writing.png"), "word": "cat",
+    })
+    assert resp.status_code == 200, resp.get_json()
+    elapsed = time.perf_counter() - t0
+    m = app.client.models
+    return (name, "normalized" if normalize else "raw", f"{len(data):,}", f"{m.sent:,}",
+            m.tokens, f"{prep * 1e3:.0f}", f"{elapsed * 1e3:.0f}")
+
+
+def main():
+    app.client = StubClient()
+    samples = [
+        ("phone-photo-1", phone_photo(1)),
+        ("phone-photo-2", phone_photo(2)),
+        ("scanned-page", scanned_page(3)),
+        ("canvas-transparent", canvas(4, True)),
+        ("canvas-white", canvas(5, False)),
+    ]
+    samples += [(Path(p).name, Path(p).read_bytes()) for p in sys.argv[1:]]
+    rows = [run(name, data, normalize) for name, data in samples for normalize in (False, True)]
+    report(rows, ("sample", "mode", "upload B", "sent B", "img tokens", "prep ms", "end-to-end ms"))
+    print(f"\nstub Gemini: {ROUND_TRIP * 1e3:.0f} ms + upload at {UPLINK_MBPS:g} Mbit/s"
+          f" + {TOKEN_PREFILL * 1e3:.1f} ms per image token")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold-load cost of the persisted document index vs re-indexing, and the
+resident memory of the in-memory LRU after reloading documents from disk.
+
+    python benchmarks/bench_index_store.py
+"""
+import gc
+import os
+import resource
+import time
+import tracemalloc
+
+from common import app, synthetic_text, timeit, report
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main():
+    rows = []
+    for n_chars in (20_000, 200_000, 1_000_000, 4_000_000):
+        text = synthetic_text(n_chars)
+        doc_id = app.make_doc_id(text)
+
+        def build_fresh():
+            # index_document skips content that is already indexed
+            app.DOCUMENT_STORE.pop(doc_id, None)
+            app.storage_remove(app.doc_index_path(doc_id).name)
+            app.index_document(text)
+
+        build = timeit(build_fresh, repeat=3)
+        size = app.doc_index_path(doc_id).stat().st_size
+
+        def cold_load():
+            app.DOCUMENT_STORE.clear()
+            app.get_document(doc_id)
+
+        load = timeit(cold_load, repeat=5)
+        app.DOCUMENT_STORE.clear()
+        t0 = time.perf_counter()
+        app.retrieve_top_k(doc_id, "How does the plant use light and water?")
+        first_query = time.perf_counter() - t0
+        rows.append((
+            f"{n_chars:,}", f"{size:,}", f"{build * 1e3:.1f}",
+            f"{load * 1e3:.2f}", f"{first_query * 1e3:.2f}",
+        ))
+    report(rows, ("chars", "file bytes", "index ms", "cold load ms", "load+query ms"))
+    print()
+
+    # resident memory: reload many documents from disk through the LRU
+    n_docs, n_chars = 40, 200_000
+    ids = [app.index_document(synthetic_text(n_chars, seed=i)) for i in range(n_docs)]
+    app.DOCUMENT_STORE.clear()
+    gc.collect()
+    rss0 = rss_bytes()
+    tracemalloc.start()
+    for doc_id in ids:
+        app.retrieve_top_k(doc_id, "orbit of the moon")
+    heap, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss1 = rss_bytes()
+    report([(
+        n_docs, f"{n_chars:,}", len(app.DOCUMENT_STORE),
+        f"{heap / n_docs:,.0f}", f"{(rss1 - rss0) / n_docs:,.0f}",
+        f"{sum(d['nbytes'] for d in app.DOCUMENT_STORE.values()) / len(app.DOCUMENT_STORE):,.0f}",
+    )], ("docs", "chars/doc", "cached", "heap B/doc", "RSS B/doc", "mapped B/doc"))
+
+
+if __name__ == "__main__":
+    main()
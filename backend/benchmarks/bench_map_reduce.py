@@ -0,0 +1,114 @@
+"""
+Coverage and wall time of /api/upload-pdf on long documents: the previous
+handler (one simplify call and one word call over the first 4,000 characters)
+vs the map-reduce pipeline (every section simplified on the map pool, words
+merged locally), for several document lengths and MAP_WORKERS sizes, against
+a stubbed Gemini client (fixed per-call latency plus a per-token cost).
+
+Coverage is the share of the document's characters that reached a simplify
+prompt. "first section" is when the streamed response (stream=true) delivers
+its first simplified section.
+
+    python benchmarks/bench_map_reduce.py
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import app, report, synthetic_text
+
+CALL_LATENCY = 0.25        # seconds of fixed overhead per round trip
+TOKEN_LATENCY = 0.00002    # seconds per prompt/response token
+CHARS_PER_TOKEN = 4
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self, document):
+        self.document = document
+        self.covered = bytearray(len(document))
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        prompt = "".join(c for c in contents if isinstance(c, str))
+        section = prompt.split("Text:\n", 1)[-1]
+        if prompt.startswith("Simplify"):
+            start = self.document.find(section)
+            if start != -1:
+                self.covered[start:start + len(section)] = b"\x01" * len(section)
+            text = " ".join(section.split()[:len(section) // 12]) + "."
+        else:
+            text = '["' + '", "'.join(sorted(set(re.findall(r"[a-z]{5,}", section)))[:20]) + '"]'
+        with self.lock:
+            self.calls += 1
+        time.sleep(CALL_LATENCY + (len(prompt) + len(text)) / CHARS_PER_TOKEN * TOKEN_LATENCY)
+        return StubResponse(text)
+
+
+class StubClient:
+    def __init__(self, document):
+        self.models = StubModels(document)
+
+
+def previous_upload(text):
+    """The handler before map-reduce: both prompts see text[:4000], side by side."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        simplified = pool.submit(app.simplify_section, text[:4000])
+        words = pool.submit(app.section_important_words, text[:4000])
+        return simplified.result(), words.result()
+
+
+def first_section_seconds(test_client, text):
+    t0 = time.perf_counter()
+    resp = test_client.post("/api/upload-pdf", json={"content": text, "stream": True}, buffered=False)
+    try:
+        for chunk in resp.response:
+            if b"event: section" in chunk:
+                return time.perf_counter() - t0
+    finally:
+        resp.close()
+
+
+def run(label, text, workers, fn):
+    app.client = StubClient(text)
+    app.MAP_EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="map")
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    m = app.client.models
+    return label, workers, m.calls, f"{sum(m.covered) / len(text):.0%}", f"{elapsed:.2f} s"
+
+
+def main():
+    # stand-in vendors have no rate limits; keep the outbound scheduler out of the way
+    app.OUTBOUND = {name: app.OutboundScheduler(name, 1000, 0) for name in app.OUTBOUND}
+    # measure the upstream calls themselves, not the response cache
+    app.LLM_CACHE_TTLS = {}
+    app.LLM_CACHE_DEFAULT_TTL = 0
+    app.SECTION_MEMO_TTL = 0
+    test_client = app.app.test_client()
+    rows, streamed = [], []
+    for n_chars in (20_000, 80_000, 320_000):
+        text = synthetic_text(n_chars, seed=n_chars)
+        sections = len(app.section_spans(text))
+        rows.append((f"{n_chars:,}", sections) + run("previous", text, 1, lambda: previous_upload(text)))
+        for workers in (1, 8, 32):
+            def upload():
+                resp = test_client.post("/api/upload-pdf", json={"content": text})
+                assert resp.status_code == 200, resp.get_json()
+            rows.append((f"{n_chars:,}", sections) + run("map-reduce", text, workers, upload))
+        app.client = StubClient(text)
+        streamed.append((f"{n_chars:,}", sections, f"{first_section_seconds(test_client, text):.2f} s"))
+    report(rows, ("chars", "sections", "handler", "MAP_WORKERS", "calls", "coverage", "wall"))
+    print()
+    report(streamed, ("chars", "sections", "first section (stream, MAP_WORKERS=32)"))
+
+
+if __name__ == "__main__":
+    main()
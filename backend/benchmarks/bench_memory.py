@@ -0,0 +1,64 @@
+"""
+Bytes per indexed document: the original layout (full text, a copy of every
+overlapping chunk string and a Counter per chunk) vs the compact offset/array
+layout in DOCUMENT_STORE.
+
+    python benchmarks/bench_memory.py
+"""
+import gc
+import tracemalloc
+from collections import Counter
+
+from common import app, synthetic_text, report
+
+
+def legacy_index(text):
+    chunks = app.chunk_text(text)
+    return {
+        "chunks": chunks,
+        "chunk_vectors": [Counter(c.lower().split()) for c in chunks],
+        "text": text,
+    }
+
+
+def measure(build, texts):
+    """Bytes retained after building one entry per text (the caller's str is not counted)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build(t) for t in texts]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del kept
+    return total / len(texts)
+
+
+def main():
+    rows = []
+    for n_chars in (20_000, 200_000, 1_000_000):
+        texts = [synthetic_text(n_chars, seed=i) for i in range(5)]
+        text_bytes = sum(len(t) for t in texts) / len(texts)
+        # warm the term interning table so it is not attributed to the first document
+        app.index_document(texts[0], doc_id="warmup")
+        app.DOCUMENT_STORE.clear()
+
+        legacy = measure(legacy_index, texts)
+
+        def compact(t):
+            doc_id = app.index_document(t)
+            return app.DOCUMENT_STORE[doc_id]
+
+        current = measure(compact, texts)
+        app.DOCUMENT_STORE.clear()
+        rows.append((
+            f"{n_chars:,}", f"{text_bytes:,.0f}",
+            f"{legacy:,.0f}", f"{current:,.0f}", f"{legacy / current:.1f}x",
+        ))
+
+    report(rows, ("chars", "text bytes", "legacy B/doc", "compact B/doc", "ratio"))
+
+
+if __name__ == "__main__":
+    main()
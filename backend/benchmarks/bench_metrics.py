@@ -0,0 +1,90 @@
+"""
+Per-stage instrumentation: the breakdown of one /api/ask-doc request (stand-in
+Gemini and ElevenLabs clients with fixed latencies), the cost of recording a
+stage, the per-request overhead with METRICS_ENABLED on vs off, and the cost
+of a /api/metrics scrape.
+
+    python benchmarks/bench_metrics.py
+"""
+import time
+
+from common import app, report, synthetic_text, timeit
+
+GEMINI_LATENCY = 0.4
+TTS_LATENCY = 0.3
+REQUESTS = 2000
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def generate_content(self, model, contents, config=None):
+        time.sleep(GEMINI_LATENCY)
+        return StubResponse("Plants use light from the sun to make food.")
+
+
+class StubClient:
+    models = StubModels()
+
+
+class StubTTS:
+    def convert_as_stream(self, text, voice_id, model_id, output_format):
+        time.sleep(TTS_LATENCY)
+        yield b"\xff" * 16384
+
+
+class StubEleven:
+    text_to_speech = StubTTS()
+
+
+def main():
+    app.client, app.eleven = StubClient(), StubEleven()
+    app.LLM_CACHE_TTLS = {}
+    app.LLM_CACHE_DEFAULT_TTL = 0
+    test_client = app.app.test_client()
+
+    doc_id = app.index_document(synthetic_text(200_000), title="bench")
+    app.DOCUMENT_STORE.clear()  # first question loads the index from disk
+    resp = test_client.post("/api/ask-doc", json={"doc_id": doc_id, "question": "How do plants use light?"},
+                            headers={"X-Request-Id": "bench-ask-doc-1"})
+    print(f"/api/ask-doc  X-Trace-Id: {resp.headers['X-Trace-Id']}")
+    print(f"Server-Timing: {resp.headers['Server-Timing']}\n")
+
+    record = timeit(lambda: app.observe_stage("bench", 0.0123), number=100_000)
+    noop = app.timed_stage("bench_noop")(lambda: None)
+    decorated = timeit(noop, number=100_000) - timeit(lambda: None, number=100_000)
+
+    # a request answered locally: verify-object match with its feedback audio already cached
+    payload = {"correct": "dog", "answer": "dog"}
+    test_client.post("/api/verify-object", json=payload)
+    per_request = {}
+    for enabled in (False, True, False, True):
+        app.METRICS_ENABLED = enabled
+        t0 = time.perf_counter()
+        for _ in range(REQUESTS):
+            test_client.post("/api/verify-object", json=payload)
+        elapsed = (time.perf_counter() - t0) / REQUESTS
+        per_request[enabled] = min(per_request.get(enabled, elapsed), elapsed)
+
+    scrape = timeit(lambda: test_client.get("/api/metrics"), number=20)
+    body = test_client.get("/api/metrics").get_data(as_text=True)
+    series = sum(1 for line in body.splitlines() if line and not line.startswith("#"))
+    report([
+        ("observe_stage", f"{record * 1e6:.2f} us"),
+        ("timed_stage decorator", f"{decorated * 1e6:.2f} us"),
+        ("request, metrics off", f"{per_request[False] * 1e6:.0f} us"),
+        ("request, metrics on", f"{per_request[True] * 1e6:.0f} us"),
+        ("overhead per request", f"{(per_request[True] - per_request[False]) * 1e6:.0f} us"),
+        (f"/api/metrics scrape ({series} series, {len(body):,} bytes)", f"{scrape * 1e3:.2f} ms"),
+    ], ("measure", "time"))
+    print()
+    print("\n".join(line for line in body.splitlines()
+                    if line.startswith("lexi_stage_seconds_sum") and "ask_doc" in line))
+    print("\n".join(line for line in body.splitlines() if line.startswith("lexi_upstream_bytes_total")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Round trips, prompt/response size and latency of /api/upload-pdf-notes in the
+structured mode (one schema call per section, plus one call merging the
+mind-map points) vs the original three-calls-per-section path, against a
+stubbed Gemini client (fixed per-call latency plus a per-token cost).
+
+    python benchmarks/bench_notes.py
+"""
+import json
+import time
+
+from common import app, synthetic_text, report
+
+CALL_LATENCY = 0.25        # seconds of fixed overhead per round trip
+TOKEN_LATENCY = 0.00002    # seconds per prompt/response token
+CHARS_PER_TOKEN = 4
+NOTES = "Plants need light.\nPlants need water.\nRoots take up water.\n" * 20
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+
+    def generate_content(self, model, contents, config=None):
+        prompt = "".join(c for c in contents if isinstance(c, str))
+        if config is not None and config.response_schema is not None:
+            text = json.dumps({
+                "notes": NOTES,
+                "important_words": ["plant", "light", "water", "root"],
+                "important_points": ["Light", "Water", "Roots", "Leaves", "Growth"],
+            })
+        elif "mind map" in prompt:
+            text = '["Light", "Water", "Roots", "Leaves", "Growth"]'
+        elif "JSON array" in prompt:
+            text = '["plant", "light", "water", "root"]'
+        else:
+            text = NOTES
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        self.response_chars += len(text)
+        time.sleep(CALL_LATENCY + (len(prompt) + len(text)) / CHARS_PER_TOKEN * TOKEN_LATENCY)
+        return StubResponse(text)
+
+
+class StubClient:
+    def __init__(self):
+        self.models = StubModels()
+
+
+def run(mode, text, uploads=5):
+    app.client = StubClient()
+    test_client = app.app.test_client()
+    t0 = time.perf_counter()
+    for i in range(uploads):
+        resp = test_client.post("/api/upload-pdf-notes", json={"content": f"{i} {text}", "mode": mode})
+        assert resp.status_code == 200, resp.get_json()
+    elapsed = (time.perf_counter() - t0) / uploads
+    m = app.client.models
+    return (
+        mode, f"{m.calls / uploads:.1f}",
+        f"{m.prompt_chars / uploads / CHARS_PER_TOKEN:,.0f}",
+        f"{m.response_chars / uploads / CHARS_PER_TOKEN:,.0f}",
+        f"{elapsed * 1e3:.0f}",
+    )
+
+
+def main():
+    # stand-in vendors have no rate limits; keep the outbound scheduler out of the way
+    app.OUTBOUND = {name: app.OutboundScheduler(name, 1000, 0) for name in app.OUTBOUND}
+    # measure the upstream calls themselves, not the response cache
+    app.LLM_CACHE_TTLS = {}
+    app.LLM_CACHE_DEFAULT_TTL = 0
+    app.SECTION_MEMO_TTL = 0
+    text = synthetic_text(12_000)
+    report(
+        [run("multi", text), run("structured", text)],
+        ("mode", "calls/upload", "prompt tok", "response tok", "ms/upload"),
+    )
+
+
+if __name__ == "__main__":
+    main()
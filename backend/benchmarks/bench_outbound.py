@@ -0,0 +1,130 @@
+"""
+Outbound scheduler against a fake Gemini that throttles: it accepts at most
+VENDOR_CONCURRENCY calls at once and VENDOR_RATE calls per second and answers
+anything over that with a 429. A bulk job (uploads of long PDFs, mapped
+section by section) starts a burst of calls while learners keep asking
+interactive questions. Reported per mode: calls that succeeded, 429s
+returned by the vendor, interactive latency and when the bulk job finished.
+"previous" calls the vendor directly, as app.py did; "scheduler" uses the
+default per-vendor limits, which are set above what this vendor allows, so
+the 429-driven adaptation does the work.
+
+    python benchmarks/bench_outbound.py
+"""
+import random
+import statistics
+import threading
+import time
+
+from common import app, report
+
+VENDOR_CONCURRENCY = 4
+VENDOR_RATE = 8.0          # calls per second
+LATENCY = 0.3              # seconds per accepted call
+BULK_WORKERS = 24          # map-pool threads of several uploads
+BULK_CALLS = 3             # sections per bulk worker
+LEARNERS = 12
+LEARNER_WINDOW = 3.0       # seconds over which learners ask
+
+
+class VendorError(Exception):
+    def __init__(self, code):
+        super().__init__(f"{code} RESOURCE_EXHAUSTED")
+        self.code = code
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class ThrottlingModels:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.tokens = VENDOR_RATE
+        self.refilled = time.monotonic()
+        self.rejected = 0
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(VENDOR_RATE, self.tokens + (now - self.refilled) * VENDOR_RATE)
+            self.refilled = now
+            throttled = self.active >= VENDOR_CONCURRENCY or self.tokens < 1
+            if throttled:
+                self.rejected += 1
+            else:
+                self.active += 1
+                self.tokens -= 1
+        if throttled:
+            time.sleep(0.02)
+            raise VendorError(429)
+        try:
+            time.sleep(LATENCY)
+            return StubResponse("ok")
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class StubClient:
+    def __init__(self):
+        self.models = ThrottlingModels()
+
+
+def call(endpoint, prompt, out):
+    t0 = time.perf_counter()
+    with app.app.test_request_context(endpoint, method="POST"):
+        try:
+            app.gemini_generate_text([prompt], cache_ttl=0)
+            ok = True
+        except Exception:
+            ok = False
+    out.append((ok, time.perf_counter() - t0, time.perf_counter()))
+
+
+def run(label, scheduled):
+    app.client = StubClient()
+    app.OUTBOUND["gemini"] = app.OutboundScheduler("gemini", app.GEMINI_CONCURRENCY, app.GEMINI_RATE)
+    if not scheduled:
+        app.OUTBOUND["gemini"].call = lambda fn, priority=None: fn()
+    rng = random.Random(0)
+    bulk, interactive = [], []
+
+    def bulk_worker(w):
+        for i in range(BULK_CALLS):
+            call("/api/upload-pdf-notes", f"bulk {label} {w} {i}", bulk)
+
+    def learner(i, delay):
+        time.sleep(delay)
+        call("/api/ask", f"question {label} {i}", interactive)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=bulk_worker, args=(w,)) for w in range(BULK_WORKERS)]
+    threads += [threading.Thread(target=learner, args=(i, rng.uniform(0.1, LEARNER_WINDOW))) for i in range(LEARNERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies = sorted(lat for ok, lat, _ in interactive if ok) or [float("nan")]
+    snap = app.OUTBOUND["gemini"].snapshot()
+    return (
+        label,
+        f"{sum(ok for ok, _, _ in interactive)}/{LEARNERS}",
+        f"{sum(ok for ok, _, _ in bulk)}/{BULK_WORKERS * BULK_CALLS}",
+        app.client.models.rejected,
+        f"{statistics.median(latencies):.2f} s", f"{latencies[-1]:.2f} s",
+        f"{max(end for _, _, end in bulk) - t0:.1f} s",
+        snap["limit"] if scheduled else "-",
+    )
+
+
+def main():
+    rows = [run("previous", scheduled=False), run("scheduler", scheduled=True)]
+    report(rows, ("mode", "interactive ok", "bulk ok", "429s", "interactive p50", "interactive max",
+                  "bulk done", "final limit"))
+
+
+if __name__ == "__main__":
+    main()
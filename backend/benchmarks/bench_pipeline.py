@@ -0,0 +1,96 @@
+"""
+Time to first audible word for /api/ask: the sequential path (full Gemini
+answer, then full synthesis) vs the sentence-pipelined SSE mode, against
+stand-in Gemini (streamed at a fixed token rate) and ElevenLabs (fixed
+overhead plus per-character synthesis time) clients.
+
+    python benchmarks/bench_pipeline.py
+"""
+import json
+import time
+
+from common import app, report
+
+ANSWER = (
+    "A plant makes its own food. It uses light from the sun. "
+    "The leaves catch the light and take in air. The roots drink water from the soil. "
+    "All of this helps the plant grow big and strong. Can you name a plant near you?"
+)
+FIRST_TOKEN = 0.35      # seconds before Gemini's first token
+PER_WORD = 0.03         # seconds per generated word
+TTS_OVERHEAD = 0.25     # seconds per ElevenLabs request
+TTS_PER_CHAR = 0.004    # seconds of synthesis per character
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def generate_content(self, model, contents, config=None):
+        time.sleep(FIRST_TOKEN + PER_WORD * len(ANSWER.split()))
+        return Chunk(ANSWER)
+
+    def generate_content_stream(self, model, contents):
+        time.sleep(FIRST_TOKEN)
+        for word in ANSWER.split(" "):
+            time.sleep(PER_WORD)
+            yield Chunk(word + " ")
+
+
+class StubClient:
+    models = StubModels()
+
+
+class StubTTS:
+    def convert_as_stream(self, text, voice_id, model_id, output_format):
+        time.sleep(TTS_OVERHEAD)
+        for i in range(0, len(text), 20):
+            time.sleep(TTS_PER_CHAR * 20)
+            yield b"\xff" * 200
+
+
+class StubEleven:
+    text_to_speech = StubTTS()
+
+
+def fresh_caches():
+    app.LLM_CACHE_TIERS[0].entries.clear()
+    for name in [n for n in list(app.STORAGE) if n.startswith("tts_")]:
+        app.storage_remove(name)
+
+
+def sequential(client):
+    t0 = time.perf_counter()
+    resp = client.post("/api/ask", data={"text": "How do plants grow?"})
+    assert resp.get_json()["audio_filename"]
+    return time.perf_counter() - t0, time.perf_counter() - t0
+
+
+def pipelined(client):
+    t0 = time.perf_counter()
+    resp = client.post("/api/ask", data={"text": "How do plants grow?", "pipeline": "true"}, buffered=False)
+    first = None
+    for raw in resp.response:
+        for block in raw.decode().split("\n\n"):
+            if block.startswith("event: segment") and first is None:
+                assert json.loads(block.split("data: ", 1)[1])["audio_filename"]
+                first = time.perf_counter() - t0
+    return first, time.perf_counter() - t0
+
+
+def main():
+    app.client = StubClient()
+    app.eleven = StubEleven()
+    client = app.app.test_client()
+    rows = []
+    for name, fn in (("sequential", sequential), ("pipelined", pipelined)):
+        fresh_caches()
+        first, total = fn(client)
+        rows.append((name, f"{first * 1e3:.0f}", f"{total * 1e3:.0f}"))
+    report(rows, ("mode", "first audio ms", "complete ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Re-uploading edited handouts to /api/upload-pdf: sections reused from the
+section memo vs recomputed, Gemini calls and wall time, against a stubbed
+Gemini client (fixed per-call latency). The "fixed windows" column is how
+many sections would change if sections were cut every 4,000 characters
+instead of at content-defined points.
+
+    python benchmarks/bench_resimplify.py
+"""
+import random
+import threading
+import time
+
+from common import app, report, synthetic_text
+
+CALL_LATENCY = 0.25  # seconds per round trip
+N_CHARS = 80_000
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        prompt = "".join(c for c in contents if isinstance(c, str))
+        section = prompt.split("Text:\n", 1)[-1]
+        with self.lock:
+            self.calls += 1
+        time.sleep(CALL_LATENCY)
+        if prompt.startswith("Simplify"):
+            return StubResponse(" ".join(section.split()[:len(section) // 12]) + ".")
+        return StubResponse('["plant", "light", "water"]')
+
+
+class StubClient:
+    def __init__(self):
+        self.models = StubModels()
+
+
+def edit(text, n, seed, insert=False):
+    """n sentence-level edits: a word swapped in a sentence, or a new sentence inserted."""
+    rng = random.Random(seed)
+    for _ in range(n):
+        at = text.find(". ", rng.randrange(len(text))) + 2
+        if insert:
+            text = text[:at] + "This new sentence explains the idea again. " + text[at:]
+        else:
+            end = text.find(" ", at) if at > 1 else -1
+            if end != -1:
+                text = text[:at] + "Plants" + text[end:]
+    return text
+
+
+def fixed_windows(text):
+    return {" ".join(text[s:e].split()) for s, e in app.chunk_spans(text, app.MAP_SECTION_CHARS, 0)}
+
+
+def upload(test_client, text):
+    app.client = StubClient()
+    t0 = time.perf_counter()
+    resp = test_client.post("/api/upload-pdf", json={"content": text})
+    elapsed = time.perf_counter() - t0
+    assert resp.status_code == 200, resp.get_json()
+    counts = resp.get_json()["sections"]["simplify"]
+    return counts["reused"], counts["recomputed"], app.client.models.calls, elapsed
+
+
+def main():
+    # stand-in vendors have no rate limits; keep the outbound scheduler out of the way
+    app.OUTBOUND = {name: app.OutboundScheduler(name, 1000, 0) for name in app.OUTBOUND}
+    # measure the section memo, not the prompt-level response cache
+    app.LLM_CACHE_TTLS = {}
+    app.LLM_CACHE_DEFAULT_TTL = 0
+    test_client = app.app.test_client()
+    original = synthetic_text(N_CHARS, seed=7)
+    near_start = original.find(". ", 300) + 2
+    versions = [
+        ("first upload", original),
+        ("same file again", original),
+        ("1 word corrected", edit(original, 1, seed=1)),
+        ("5 words corrected", edit(original, 5, seed=2)),
+        ("sentence added near start",
+         original[:near_start] + "This new sentence explains the idea again. " + original[near_start:]),
+        ("3 sentences added", edit(original, 3, seed=4, insert=True)),
+    ]
+    rows, before = [], fixed_windows(original)
+    for label, text in versions:
+        reused, recomputed, calls, elapsed = upload(test_client, text)
+        windows = fixed_windows(text)
+        changed = len(windows - before) if label != "first upload" else len(windows)
+        rows.append((label, reused + recomputed, reused, recomputed, changed, calls, f"{elapsed:.2f} s"))
+    report(rows, ("upload", "sections", "reused", "recomputed", "fixed windows", "gemini calls", "wall"))
+
+
+if __name__ == "__main__":
+    main()
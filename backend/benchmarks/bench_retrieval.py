@@ -0,0 +1,58 @@
+"""
+Compare BM25 inverted-index retrieval with the previous linear cosine scan.
+
+    python benchmarks/bench_retrieval.py
+"""
+import math
+from collections import Counter
+
+from common import app, synthetic_text, timeit, report
+
+QUESTIONS = [
+    "How does the plant use light and water?",
+    "What is the orbit of the moon?",
+    "Why did the empire trade with the city?",
+    "How do you find the area of a triangle?",
+]
+
+
+def legacy_cosine(a, b):
+    common = set(a.keys()) & set(b.keys())
+    numerator = sum(a[x] * b[x] for x in common)
+    denominator = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return numerator / denominator if denominator else 0.0
+
+
+def legacy_retrieve(chunks, vectors, question, top_k=app.TOP_K):
+    q = Counter(question.lower().split())
+    scored = []
+    for idx, vec in enumerate(vectors):
+        score = legacy_cosine(q, vec)
+        if score > 0:
+            scored.append({"chunk": chunks[idx], "score": score, "index": idx})
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:top_k]
+
+
+def main():
+    rows = []
+    for n_chars in (20_000, 200_000, 1_000_000, 4_000_000):
+        text = synthetic_text(n_chars)
+        doc_id = app.index_document(text, title="bench")
+        chunks = app.chunk_text(text)
+        vectors = [Counter(c.lower().split()) for c in chunks]
+
+        legacy = timeit(lambda: [legacy_retrieve(chunks, vectors, q) for q in QUESTIONS], repeat=3)
+        bm25 = timeit(lambda: [app.retrieve_top_k(doc_id, q) for q in QUESTIONS], repeat=3)
+        n = len(QUESTIONS)
+        rows.append((
+            f"{n_chars:,}", len(chunks),
+            f"{legacy / n * 1e3:.2f}", f"{bm25 / n * 1e3:.2f}", f"{legacy / bm25:.1f}x",
+        ))
+        app.DOCUMENT_STORE.clear()
+
+    report(rows, ("chars", "chunks", "scan ms/q", "bm25 ms/q", "speedup"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Concurrency check and throughput of the spelling-test score store.
+
+Several worker processes (like gunicorn -w N), each with several threads,
+record answers for a shared set of test sessions at the same time. Every
+session's totals must come out exact when the test is submitted. The SQLite
+store is shared by all processes; the memory stand-in can only be checked
+within one process.
+
+    python benchmarks/bench_scores.py
+"""
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("SPELLCHECK_MODE", "llm")  # keep the spell index build off the CPU in the workers
+
+from common import app, report  # noqa: E402
+
+PROCESSES = 4
+THREADS = 8
+SESSIONS = 16
+ANSWERS = 250  # per thread
+
+
+def hammer(store, worker):
+    def run(thread):
+        for i in range(ANSWERS):
+            store.record(f"s{(worker * THREADS + thread + i) % SESSIONS}", i % 3 == 0)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def sqlite_worker(path, worker, ready, start, spans):
+    store = app.SqliteScoreStore(path, app.SCORE_SESSION_TTL)
+    store.finish("warm-up")  # open the connection before the clock starts
+    ready.release()
+    start.wait()
+    t0 = time.time()
+    hammer(store, worker)
+    spans.put((t0, time.time()))
+
+
+def expected(workers):
+    totals = {}
+    for worker in range(workers):
+        for thread in range(THREADS):
+            for i in range(ANSWERS):
+                t = totals.setdefault(f"s{(worker * THREADS + thread + i) % SESSIONS}", [0, 0])
+                t[0] += 1
+                t[1] += i % 3 == 0
+    return totals
+
+
+def check(store, workers):
+    want = expected(workers)
+    got = {sid: list(store.finish(sid)) for sid in want}
+    assert got == want, f"lost updates: {sum(w[0] for w in want.values()) - sum(g[0] for g in got.values())}"
+    assert all(store.finish(sid) == (0, 0) for sid in want), "sessions not cleared after submit"
+
+
+def main():
+    rows = []
+    path = os.path.join(tempfile.mkdtemp(prefix="lexi_scores_"), "scores.sqlite3")
+    ctx = mp.get_context("spawn")
+    ready, start, spans = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=sqlite_worker, args=(path, w, ready, start, spans)) for w in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    start.set()
+    spans = [spans.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = max(end for _, end in spans) - min(begin for begin, _ in spans)
+    check(app.SqliteScoreStore(path, app.SCORE_SESSION_TTL), PROCESSES)
+    n = PROCESSES * THREADS * ANSWERS
+    rows.append(("sqlite (WAL)", f"{PROCESSES} x {THREADS}", n, f"{n / elapsed:,.0f}", "exact"))
+
+    store = app.MemoryScoreStore(app.SCORE_SESSION_TTL)
+    t0 = time.perf_counter()
+    hammer(store, 0)
+    elapsed = time.perf_counter() - t0
+    check(store, 1)
+    n = THREADS * ANSWERS
+    rows.append(("memory", f"1 x {THREADS}", n, f"{n / elapsed:,.0f}", "exact"))
+    report(rows, ("store", "procs x threads", "answers", "answers/s", "totals"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Multi-process lookup latency and hit rate of the shared document index.
+
+One process uploads the documents (index_document) into DOC_INDEX_DIR; spawned
+worker processes (like gunicorn -w N or separate serverless instances) then
+answer /api/ask-doc style lookups for random doc_ids with a small per-process
+LRU in front. Reported per worker count: lookups found, LRU hits vs reads from
+the shared files, and lookup latency. The "per-process" row is what a doc_id
+from /api/upload-pdf found before, when each worker only had its own
+in-memory store. Re-uploading the same documents is timed against indexing.
+
+    python benchmarks/bench_shared_index.py
+"""
+import multiprocessing as mp
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DOC_INDEX_DIR", tempfile.mkdtemp(prefix="lexi_shared_index_"))
+os.environ.setdefault("DOC_CACHE_MAX_DOCS", "8")
+os.environ.setdefault("SPELLCHECK_MODE", "llm")  # keep the spell index build off the CPU in the workers
+
+from common import app, report, synthetic_text  # noqa: E402
+
+DOCS = 48
+CHARS = 200_000
+LOOKUPS = 400  # per worker
+QUESTION = "How does the plant use light and water?"
+
+
+def worker(ids, seed, ready, start, results):
+    rng = random.Random(seed)
+    ready.release()
+    start.wait()
+    latencies, found = [], 0
+    for _ in range(LOOKUPS):
+        t0 = time.perf_counter()
+        found += bool(app.retrieve_top_k(rng.choice(ids), QUESTION))
+        latencies.append(time.perf_counter() - t0)
+    results.put((found, latencies, dict(app.DOC_STORE_STATS)))
+
+
+def run(ids, processes):
+    ctx = mp.get_context("spawn")
+    ready, start, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(ids, p, ready, start, results)) for p in range(processes)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    start.set()
+    out = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return out
+
+
+def main():
+    texts = [synthetic_text(CHARS, seed=i) for i in range(DOCS)]
+    t0 = time.perf_counter()
+    ids = [app.index_document(t) for t in texts]
+    upload = (time.perf_counter() - t0) / DOCS
+    t0 = time.perf_counter()
+    assert [app.index_document(t) for t in texts] == ids
+    reupload = (time.perf_counter() - t0) / DOCS
+    print(f"{DOCS} docs of {CHARS:,} chars in {app.DOC_INDEX_DIR}: index {upload * 1e3:.1f} ms/doc, "
+          f"re-upload {reupload * 1e3:.3f} ms/doc (deduplicated {app.DOC_STORE_STATS['deduplicated']})\n")
+
+    rows = []
+    for processes in (1, 4, 8):
+        out = run(ids, processes)
+        lookups = processes * LOOKUPS
+        found = sum(f for f, _, _ in out)
+        latencies = sorted(x for _, lat, _ in out for x in lat)
+        hits = sum(s["hits"] for _, _, s in out)
+        loads = sum(s["disk_loads"] for _, _, s in out)
+        rows.append((
+            processes, f"{found / lookups:.0%}", f"{1 / processes:.0%}", f"{hits / lookups:.0%}",
+            f"{loads / lookups:.0%}", f"{statistics.median(latencies) * 1e3:.2f} ms",
+            f"{latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms",
+        ))
+    report(rows, ("workers", "found", "per-process", "LRU hits", "shared reads", "p50", "p99"))
+
+
+if __name__ == "__main__":
+    main()
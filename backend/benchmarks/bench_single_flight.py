@@ -0,0 +1,136 @@
+"""
+A class of learners sending the same request at once (a projected exercise):
+upstream Gemini/ElevenLabs calls and learner latency with and without
+single-flight coalescing, against stand-in clients with a fixed round trip.
+Every learner starts within the same 50 ms, so the response caches (cleared
+between runs) are still empty when the requests arrive. The last row makes
+the stand-in Gemini fail, to check that every waiting learner gets the error.
+"previous" turns the flights off; /api/tts still makes one synthesis there,
+because concurrent syntheses of one file also join its in-progress .part file.
+
+    python benchmarks/bench_single_flight.py
+"""
+import random
+import statistics
+import threading
+import time
+
+from common import app, report
+
+LEARNERS = 30
+GEMINI_LATENCY = 0.6   # seconds per call
+TTS_LATENCY = 0.5      # seconds per synthesis
+STAGGER = 0.05         # learners arrive within this window
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModels:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(GEMINI_LATENCY)
+        if self.fail:
+            raise RuntimeError("503 UNAVAILABLE")
+        return StubResponse("NO" if "Answer YES or NO" in str(contents) else "A short, clear sentence.")
+
+
+class StubClient:
+    def __init__(self, fail=False):
+        self.models = StubModels(fail)
+
+
+class StubTTS:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def convert_as_stream(self, text, voice_id, model_id, output_format):
+        with self.lock:
+            self.calls += 1
+        time.sleep(TTS_LATENCY)
+        yield b"\xff" * 4096
+
+
+class StubEleven:
+    def __init__(self):
+        self.text_to_speech = StubTTS()
+
+
+REQUESTS = {
+    "/api/tts": lambda c: c.post("/api/tts", json={"text": "Find the animal that says woof."}),
+    "/api/verify-object": lambda c: c.post(
+        "/api/verify-object", json={"correct": "rat", "answer": "the little grey animal that eats cheese"}),
+    "/api/writing-assistant": lambda c: c.post(
+        "/api/writing-assistant", data={"text": "the dog runned fast becaus it was hapy"}),
+}
+
+
+def fresh_caches():
+    app.LLM_CACHE_TIERS[0].entries.clear()
+    for name in [n for n in list(app.STORAGE) if n.startswith("tts_")]:
+        app.storage_remove(name)
+
+
+def classroom(send):
+    rng = random.Random(0)
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def learner(delay):
+        client = app.app.test_client()
+        time.sleep(delay)
+        t0 = time.perf_counter()
+        resp = send(client)
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+            statuses.append(resp.status_code)
+
+    threads = [threading.Thread(target=learner, args=(rng.uniform(0, STAGGER),)) for _ in range(LEARNERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, statuses
+
+
+def run(label, path, coalesce, fail=False):
+    fresh_caches()
+    app.client, app.eleven = StubClient(fail), StubEleven()
+    flights = {"gemini": app.GEMINI_FLIGHTS, "tts": app.TTS_FLIGHTS}
+    if not coalesce:
+        for flight in flights.values():
+            flight.do = lambda key, fn: fn()
+    before = {k: f.snapshot()["coalesced"] for k, f in flights.items()}
+    latencies, statuses = classroom(REQUESTS[path])
+    for flight in flights.values():
+        flight.__dict__.pop("do", None)
+    coalesced = sum(f.snapshot()["coalesced"] - before[k] for k, f in flights.items())
+    return (
+        path, label, app.client.models.calls, app.eleven.text_to_speech.calls, coalesced,
+        f"{statistics.median(latencies):.2f} s", f"{max(latencies):.2f} s",
+        ",".join(f"{s}x{statuses.count(s)}" for s in sorted(set(statuses))),
+    )
+
+
+def main():
+    # stand-in vendors have no rate limits; keep the outbound scheduler out of the way
+    app.OUTBOUND = {name: app.OutboundScheduler(name, 1000, 0) for name in app.OUTBOUND}
+    rows = []
+    for path in REQUESTS:
+        rows.append(run("previous", path, coalesce=False))
+        rows.append(run("single-flight", path, coalesce=True))
+    rows.append(run("single-flight, Gemini down", "/api/writing-assistant", coalesce=True, fail=True))
+    report(rows, ("endpoint", "mode", "gemini calls", "tts calls", "coalesced", "p50", "max", "statuses"))
+
+
+if __name__ == "__main__":
+    main()
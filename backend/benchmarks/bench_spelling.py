@@ -0,0 +1,81 @@
+"""
+Throughput of the local spell-check behind /api/writing-assistant-spelling.
+
+The texts are synthetic school writing with a share of the words misspelled the
+way dyslexic writers often do (swapped, dropped, doubled or sound-alike
+letters). Reported: index load time, per-word suggestion latency (cold and
+memoized), whole-document words per second, and how many misspellings get the
+intended word among their suggestions. Gemini, which the endpoint used for every
+text before, is charged a fixed round trip.
+
+    python benchmarks/bench_spelling.py
+"""
+import random
+import time
+
+from common import app, report, synthetic_text, timeit
+
+ROUND_TRIP = 1.2  # seconds of model time per call
+TYPO_RATE = 0.08
+
+
+def misspell(word, rng):
+    i = rng.randrange(len(word))
+    kind = rng.randrange(4)
+    if kind == 0 and len(word) > 2:
+        i = min(i, len(word) - 2)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == 1 and len(word) > 3:
+        return word[:i] + word[i + 1:]
+    if kind == 2:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + rng.choice("aeiou" if word[i] in "aeiou" else "bcdfgklmnprstvz") + word[i + 1:]
+
+
+def corrupt(text, seed=0):
+    rng = random.Random(seed)
+    out, typos = [], []
+    for word in text.split(" "):
+        core = word.rstrip(".")
+        if len(core) > 3 and rng.random() < TYPO_RATE:
+            bad = misspell(core.lower(), rng)
+            if bad not in app.spell_index()["ids"]:
+                typos.append((bad, core.lower()))
+                word = bad + word[len(core):]
+        out.append(word)
+    return " ".join(out), typos
+
+
+def main():
+    t0 = time.perf_counter()
+    index = app.spell_index()
+    print(f"index: {len(index['words'])} words, {len(index['keys'])} delete keys, "
+          f"{sum(index[k].nbytes for k in ('keys', 'offsets', 'postings'))/1e6:.1f} MB arrays, "
+          f"ready in {time.perf_counter() - t0:.2f} s\n")
+
+    rows = []
+    for n_chars in (2_000, 20_000, 200_000):
+        text, typos = corrupt(synthetic_text(n_chars, seed=n_chars), seed=n_chars)
+        n_words = len(text.split())
+        app.spelling_suggestions.cache_clear()
+        cold = timeit(lambda: app.check_spelling(text), repeat=1)
+        warm = timeit(lambda: app.check_spelling(text), repeat=3)
+        found = {f["word"].lower(): f["suggestions"] for f in app.check_spelling(text)}
+        fixed = sum(good in found.get(bad, ()) for bad, good in typos)
+        rows.append((n_words, len(typos), f"{fixed}/{len(typos)}",
+                     f"{n_words / cold:,.0f}", f"{n_words / warm:,.0f}", f"{ROUND_TRIP * 1e3:.0f} ms"))
+    report(rows, ("words", "typos", "suggested", "words/s cold", "words/s warm", "gemini"))
+
+    app.spelling_suggestions.cache_clear()
+    _, typos = corrupt(synthetic_text(50_000, seed=1), seed=1)
+    t0 = time.perf_counter()
+    for bad, _ in typos:
+        app.spelling_suggestions(bad)
+    cold = (time.perf_counter() - t0) / len(typos)
+    memo = timeit(lambda: [app.spelling_suggestions(bad) for bad, _ in typos]) / len(typos)
+    known = timeit(lambda: app.check_spelling("the plant needs light and water"), number=1000) / 6
+    print(f"\nper word: known {known * 1e6:.1f} us, unknown {cold * 1e6:.0f} us cold / {memo * 1e6:.2f} us memoized")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Latency of /api/verify-object answers and the share resolved without Gemini.
+
+The answers are the kinds of things children say in the picture game: the
+word itself, a synonym or plural, a sound-alike transcription, a wrong animal,
+a near miss, a negation, an unlisted synonym and a description. Answers left
+to Gemini are charged a fixed round trip.
+
+    python benchmarks/bench_verify.py
+"""
+from common import app, report, timeit
+
+ROUND_TRIP = 0.6  # seconds of model time per call
+
+ANSWERS = [  # (target, spoken answer)
+    ("dog", "dog"), ("dog", "It's a dog!"), ("dog", "puppies"), ("dog", "dogg"),
+    ("cat", "cat"), ("cat", "kitty"), ("cat", "kat"), ("cat", "a cut"),
+    ("fox", "fox"), ("fox", "foks"), ("fox", "folks"), ("fox", "a dog"),
+    ("rat", "rat"), ("rat", "rats"), ("rat", "elephant"), ("rat", "kitten"),
+    ("dog", "it is not a dog"), ("dog", "not a dog it's a cat"), ("dog", "a big dog"), ("dog", "canine"),
+    ("rat", "the little grey animal that eats cheese"),
+]
+
+
+def main():
+    rows, local = [], 0
+    for target, answer in ANSWERS:
+        verdict = app.verify_object_local(target, answer)
+        local += verdict is not None
+        seconds = timeit(lambda: app.verify_object_local(target, answer), number=200)
+        rows.append((target, repr(answer), {True: "yes", False: "no", None: "gemini"}[verdict],
+                     f"{seconds * 1e6:.0f} us" if verdict is not None else f"{ROUND_TRIP * 1e3:.0f} ms"))
+    report(rows, ("target", "answer", "verdict", "latency"))
+    print(f"\nresolved locally: {local}/{len(ANSWERS)} ({local / len(ANSWERS):.0%}); "
+          f"model calls before: {len(ANSWERS)}, after: {len(ANSWERS) - local}")
+
+
+if __name__ == "__main__":
+    main()
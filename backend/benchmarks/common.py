@@ -0,0 +1,62 @@
+"""
+Shared helpers for the backend benchmarks.
+
+The benchmarks import api/app.py directly, so they set placeholder API keys
+before the import and point UPLOAD_FOLDER at a scratch directory. Nothing here talks to Gemini or ElevenLabs; benchmarks
+that exercise model/TTS paths swap in local stand-ins.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("ELEVENLABS_API_KEY", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import app  # noqa: E402
+
+# keep persisted indexes and generated files out of the real uploads folder
+app.UPLOAD_FOLDER = Path(tempfile.mkdtemp(prefix="lexi_bench_"))
+
+VOCAB = (
+    "plant cell energy light water sun leaf root stem soil seed flower growth "
+    "animal habitat food chain predator prey river ocean cloud rain weather "
+    "earth planet moon star orbit gravity force motion speed mass volume "
+    "history king war empire trade city river map border law vote people "
+    "number fraction decimal angle triangle circle area graph data chart"
+).split()
+FILLER = "the a of and to in is it that for on with as was are by this".split()
+
+
+def synthetic_text(n_chars, seed=0):
+    """Textbook-like prose of roughly n_chars characters."""
+    rng = random.Random(seed)
+    out, size = [], 0
+    while size < n_chars:
+        words = [rng.choice(VOCAB if rng.random() < 0.6 else FILLER)
+                 for _ in range(rng.randint(6, 18))]
+        sentence = " ".join(words).capitalize() + ". "
+        out.append(sentence)
+        size += len(sentence)
+    return "".join(out)
+
+
+def timeit(fn, repeat=5, number=1):
+    """Best-of-`repeat` seconds per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def report(rows, headers):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for r in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(r, widths)))
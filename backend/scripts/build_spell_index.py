@@ -0,0 +1,27 @@
+"""
+Precompute the local spell-check's delete-key arrays into api/data/spell_index/.
+Re-run after changing the dictionary, SPELL_MAX_EDIT or SPELL_PREFIX_LENGTH; the
+app builds the arrays in memory (slowly, per process) while they don't match.
+
+    python scripts/build_spell_index.py
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "build")
+os.environ.setdefault("ELEVENLABS_API_KEY", "build")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import app  # noqa: E402
+
+
+def main():
+    t0 = time.perf_counter()
+    app.write_spell_index()
+    size = sum(p.stat().st_size for p in app.SPELL_INDEX_DIR.iterdir())
+    print(f"{app.SPELL_INDEX_DIR.resolve()}: {size / 1e6:.1f} MB in {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Local spell-check regressions.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("ELEVENLABS_API_KEY", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import app  # noqa: E402
+
+
+def flagged(text):
+    return [f["word"] for f in app.check_spelling(text)]
+
+
+def test_accented_words_are_not_split_into_fragments():
+    assert flagged("The café is nice") == []
+    assert flagged("A naïve plan for Gemüse") == []
+
+
+def test_other_scripts_are_not_flagged():
+    assert flagged("नमस्ते दुनिया, hello world") == []
+
+
+def test_ascii_misspellings_still_flagged():
+    findings = app.check_spelling("I will recieve the café order from my freind's shop")
+    assert [f["word"] for f in findings] == ["recieve", "freind's"]
+    assert findings[0]["suggestions"][0] == "receive"
+    assert findings[1]["suggestions"][0] == "friend's"
@@ -14,12 +14,24 @@ const nonsenseWords = {
 
 const difficulties = ['easy', 'medium', 'hard'];
 
+// crypto.randomUUID only exists in secure contexts (and newer browsers)
+const newSessionId = () => {
+  if (typeof crypto !== 'undefined') {
+    if (typeof crypto.randomUUID === 'function') return crypto.randomUUID();
+    if (typeof crypto.getRandomValues === 'function') {
+      return Array.from(crypto.getRandomValues(new Uint8Array(16)), (b) => b.toString(16).padStart(2, '0')).join('');
+    }
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
 const Test1 = () => {
   const [currentWordIndex, setCurrentWordIndex] = useState(0);
   const [currentDifficultyIndex, setCurrentDifficultyIndex] = useState(0);
   const [isFinished, setIsFinished] = useState(false);
   const [results, setResults] = useState({});
   const [score, setScore] = useState(0);
+  const [sessionId] = useState(newSessionId); // lazy: generated once per test, not on every render
 
   const signatureRef = useRef(null);
   const ttsAudioRef = useRef(null);
@@ -117,8 +129,9 @@ const Test1 = () => {
       const formData = new FormData();
       formData.append('image', blob, 'writing.png');
       formData.append('word', currentWord);
+      formData.append('session_id', sessionId);
 
-      const res = await fetch('https://lexi-ease-ai-l753.vercel.app/api/upload_image', {
+      const res = await fetch(`${API_BASE}/api/upload_image`, {
         method: 'POST',
         body: formData,
       });
@@ -160,10 +173,10 @@ const Test1 = () => {
 
     const submitResults = async () => {
       try {
-        const res = await fetch('http://65.20.88.229/api/submit_results', {
+        const res = await fetch(`${API_BASE}/api/submit_results`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ results }),
+          body: JSON.stringify({ results, session_id: sessionId }),
         });
 
         const data = await res.json();